@@ -0,0 +1,167 @@
+"""Renders/sec of the buy-alert templates vs building the text per buy.
+
+"naive" is what post_buy_message used to do for every buy: build the
+custom-emoji tags, the strength bar and both layouts with f-strings.
+"templates" renders the same messages from templates.BuyAlertTemplates
+(tags, bars and links prepared once). Both variants must produce the same
+text; the run aborts if they differ.
+
+  python bench/bench_compose.py --n 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from templates import BuyAlertTemplates  # noqa: E402
+
+ICON_IDS = {name: str(5368324170671202286 + i) for i, name in enumerate(BuyAlertTemplates.ICONS)}
+SPY_ICON_ID = "5388985427651493637"
+LISTING_URL = "https://t.me/TonProjectListing"
+TRENDING_URL = "https://t.me/SpyTonTrending"
+
+
+def _tag(emoji_id: str, fallback: str) -> str:
+    emoji_id = (emoji_id or "").strip()
+    if not emoji_id.isdigit():
+        return fallback
+    return f"<tg-emoji emoji-id=\"{emoji_id}\">{fallback}</tg-emoji>"
+
+
+def naive_compose(b: Dict[str, Any]) -> Dict[str, str]:
+    icons = {name: _tag(ICON_IDS.get(name, ""), fb) for name, fb in BuyAlertTemplates.ICONS.items()}
+    n = max(1, min(28, int(b["ton_amt"] // 2) + 1))
+    spy = _tag(SPY_ICON_ID, "🟢")
+    line1 = spy * min(n, 14)
+    line2 = spy * max(0, n - 14)
+    bar = f"{line1}\n{line2}\n" if line2 else f"{line1}\n"
+
+    sym = b["sym"]
+    core = f"{b['badge']} {sym} Buy! — {b['lbl']}"
+    title = f"<a href='{b['tg_url']}'><b>{core}</b></a>" if b["tg_url"] else f"<b>{core}</b>"
+    usd_part = f" (${b['usd_val']:,.2f})" if b["usd_val"] else ""
+    lines = [title, bar]
+    lines.append(f"{icons['swap']} <b>{b['ton_amt']:.2f} TON</b>{usd_part}")
+    lines.append(f"{icons['swap']} <b>{b['token_amt']:,.6f} {sym}</b>")
+    lines.append(f"{icons['wallet']} <a href='{b['buyer_url']}'>{b['buyer_short']}</a> | {icons['txn']} <a href='{b['tx_url']}'>Txn</a>")
+    lines.append(f"{icons['pos']} Position: <b>{b['pos_txt']}</b>")
+    lines.append(f"{icons['holders']} Holders <b>{b['holders_count']}</b>")
+    lines.append(f"{icons['mcap']} Market Cap <b>{b['mc_txt']}</b>")
+    lines.append(f"{icons['liq']} Liquidity <b>{b['liq_txt']}</b>\n")
+    lines.append(f"{icons['pin']} <a href='{LISTING_URL}'>Ton Listing</a>")
+    lines.append(
+        f"{icons['chart']} <a href='{b['chart_url']}'>Chart</a> | "
+        f"{icons['trend']} <a href='{TRENDING_URL}'>Trending</a> | "
+        f"{icons['pools']} <a href='{b['pools_url']}'>Pools</a>"
+    )
+    master = "\n".join(lines)
+    if b["rank"]:
+        master += f"\n\n🟢 <b>#{b['rank']}</b> On <a href='{TRENDING_URL}'>SpyTON Trending</a>"
+
+    price = b["price_usd"]
+    group = (
+        f"🚀 {sym} TOKEN Buy! — {b['lbl']}\n"
+        f"✅ LISTED!\n\n"
+        f"{'💡' * 10}\n\n"
+        f"💰 {b['ton_amt']:.2f} TON (${b['usd_val']:,.2f})\n"
+        f"📦 {b['token_amt']:,.2f} {sym}\n"
+        f"👤 {b['buyer_short']} | {'New!' if 'new' in b['pos_txt'].lower() else 'Old!'}\n"
+        f"💵 Price: ${f'{price:.6f}'.rstrip('0').rstrip('.')}\n"
+        f"🏦 MarketCap: ${b['mc_usd']:,.0f}\n\n"
+        f"❤️ <a href='{LISTING_URL}'>TonListing</a> | 📊 <a href='{b['chart_url']}'>Chart</a>"
+    )
+    return {"master": master, "group": group}
+
+
+def template_compose(t: BuyAlertTemplates, b: Dict[str, Any]) -> Dict[str, str]:
+    master = t.render_master(
+        sym=b["sym"], badge=b["badge"], lbl=b["lbl"], tg_url=b["tg_url"],
+        ton_amt=b["ton_amt"], usd_val=b["usd_val"], token_amt=b["token_amt"],
+        buyer_url=b["buyer_url"], buyer_short=b["buyer_short"], tx_url=b["tx_url"],
+        pos_txt=b["pos_txt"], holders_count=b["holders_count"],
+        mc_txt=b["mc_txt"], liq_txt=b["liq_txt"],
+        chart_url=b["chart_url"], pools_url=b["pools_url"],
+        rank=b["rank"], is_blum=False,
+    )
+    group = t.render_group(
+        sym=b["sym"], dex_lbl=b["lbl"], ton_amt=b["ton_amt"], usd_val=b["usd_val"],
+        token_amt=b["token_amt"], buyer_short=b["buyer_short"], pos_txt=b["pos_txt"],
+        price_usd=b["price_usd"], mc_usd=b["mc_usd"], chart_url=b["chart_url"],
+    )
+    return {"master": master, "group": group}
+
+
+def make_buys(n: int, seed: int) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        ton = rnd.uniform(0.5, 80.0)
+        buyer = f"EQ{rnd.getrandbits(128):032x}"
+        mc = rnd.uniform(5e4, 5e6)
+        out.append({
+            "sym": f"TK{i % 50}",
+            "badge": rnd.choice(["🦐", "🐟", "🐬", "🐳"]),
+            "lbl": rnd.choice(["STON.fi", "DeDust"]),
+            "tg_url": rnd.choice([None, f"https://t.me/tk{i % 50}"]),
+            "ton_amt": ton,
+            "usd_val": ton * 3.1,
+            "token_amt": ton * rnd.uniform(10, 10000),
+            "buyer_url": f"https://tonviewer.com/{buyer}",
+            "buyer_short": f"{buyer[:4]}…{buyer[-4:]}",
+            "tx_url": f"https://tonviewer.com/transaction/{rnd.getrandbits(128):032x}",
+            "pos_txt": rnd.choice(["New Holder!", "Existing Holder"]),
+            "holders_count": rnd.randint(10, 20000),
+            "mc_txt": f"${mc:,.0f}",
+            "liq_txt": f"${mc / 7:,.0f}",
+            "mc_usd": mc,
+            "price_usd": rnd.uniform(1e-6, 2.0),
+            "chart_url": f"https://www.geckoterminal.com/ton/tokens/EQtok{i % 50}",
+            "pools_url": f"https://www.geckoterminal.com/ton/pools/EQpool{i % 50}",
+            "rank": rnd.choice([None, rnd.randint(1, 10)]),
+        })
+    return out
+
+
+def bench(fn, buys: List[Dict[str, Any]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for b in buys:
+            fn(b)
+        best = min(best, time.perf_counter() - t0)
+    return len(buys) / best
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=20000, help="buys per run")
+    ap.add_argument("--repeat", type=int, default=5, help="runs per variant (best is reported)")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    buys = make_buys(args.n, args.seed)
+    t = BuyAlertTemplates(ICON_IDS, SPY_ICON_ID, LISTING_URL, TRENDING_URL)
+    for b in buys[:200]:
+        if naive_compose(b) != template_compose(t, b):
+            raise SystemExit(f"output differs for {b['sym']} {b['ton_amt']:.2f} TON")
+
+    naive = bench(naive_compose, buys, args.repeat)
+    tmpl = bench(lambda b: template_compose(t, b), buys, args.repeat)
+    print(json.dumps({
+        "buys": args.n,
+        "naive_renders_per_s": round(naive),
+        "template_renders_per_s": round(tmpl),
+        "speedup": round(tmpl / naive, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
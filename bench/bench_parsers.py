@@ -0,0 +1,393 @@
+"""Microbenchmarks and allocation profiles of the per-buy parsing helpers.
+
+Times each helper on a corpus of realistic inputs and reports, per call:
+  ns       best-of-N wall time
+  rel      ns divided by a fixed reference workload timed in the same run
+           (dict lookups, str ops, float parsing). Baselines are compared
+           on rel, so they carry across machines.
+  peak_b   mean / max transient heap per call (tracemalloc peak above the
+           level before the call)
+  kept_b   bytes still allocated after a full pass with results dropped
+           (caches, leaks)
+
+Corpora are built from the synthetic market of bench/mock_upstream.py by
+default. Real ones come from a CAPTURE_PATH file (--capture): TonAPI
+account / block transactions, DeDust trades and STON events found in it.
+
+_to_hex_tx_hash is also timed as two candidate variants: with the hex regex
+precompiled, and memoized on top of that. The memoized one is timed with a
+cold cache (every hash new) and a hot one (every hash seen before), so
+the per-hit saving can be weighed against the repeat rate in production.
+Both variants are checked to return exactly what main.py returns.
+
+  python bench/bench_parsers.py
+  python bench/bench_parsers.py --save bench/parsers_baseline.json
+  python bench/bench_parsers.py --check bench/parsers_baseline.json --threshold 1.3
+  python bench/bench_parsers.py --capture capture.jsonl.gz
+
+--check exits 1 when a helper's rel exceeds threshold x baseline. On the
+same Python version it also exits 1 when mean peak bytes do.
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import functools
+import gc
+import json
+import os
+import platform
+import random
+import re
+import sys
+import time
+import tracemalloc
+from array import array
+from typing import Any, Callable, Dict, List, Tuple
+
+os.environ.setdefault("PORT", "0")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+from capture import read_capture  # noqa: E402
+from mock_upstream import Market  # noqa: E402
+
+Corpus = List[Tuple[Any, ...]]
+
+
+# ---------- candidate _to_hex_tx_hash variants ----------
+_HEX64 = re.compile(r"[0-9a-fA-F]{64}")
+
+
+def to_hex_precompiled(h: Any) -> str:
+    """main._to_hex_tx_hash with the hex pattern compiled once."""
+    if h is None:
+        return ""
+    if isinstance(h, dict):
+        h = h.get("hash") or h.get("tx_hash") or h.get("txHash") or ""
+    if isinstance(h, (list, tuple)) and all(isinstance(x, int) for x in h):
+        try:
+            b = bytes(h)
+            if len(b) == 32:
+                return b.hex()
+        except Exception:
+            return ""
+    h = str(h).strip()
+    if not h:
+        return ""
+    if h.startswith("0x") and len(h) == 66:
+        h = h[2:]
+    if _HEX64.fullmatch(h):
+        return h.lower()
+    try:
+        s = h.replace("-", "+").replace("_", "/")
+        raw = base64.b64decode(s + "=" * ((4 - (len(s) % 4)) % 4))
+        if len(raw) == 32:
+            return raw.hex()
+    except Exception:
+        pass
+    return ""
+
+
+_to_hex_cached = functools.lru_cache(maxsize=8192)(to_hex_precompiled)
+
+
+def to_hex_memoized(h: Any) -> str:
+    return _to_hex_cached(h) if isinstance(h, str) else to_hex_precompiled(h)
+
+
+# ---------- corpora ----------
+def _hash_forms(rnd: random.Random, hx: str) -> Any:
+    raw = bytes.fromhex(hx)
+    return rnd.choices(
+        [hx, hx.upper(), "0x" + hx, base64.urlsafe_b64encode(raw).decode().rstrip("="), base64.b64encode(raw).decode(), "not-a-hash", ""],
+        weights=[50, 5, 5, 25, 10, 3, 2],
+    )[0]
+
+
+def synthetic_corpora(n: int, seed: int) -> Dict[str, Corpus]:
+    rnd = random.Random(seed)
+    m = Market(pools=40, rate=1.0, dedust_share=0.5, seed=seed)
+    t0 = time.time() - n
+    for i in range(n):
+        m._new_trade(t0 + i)
+    trades = list(m.by_hash.values())
+
+    ston = [t for t in trades if t.pool["dex"] == "stonfi"]
+    dedust = [t for t in trades if t.pool["dex"] == "dedust"]
+    dd_trades = [m.dedust_trade(t) for t in dedust]
+    for i, tr in enumerate(dd_trades):  # cursor keys seen across DeDust API versions
+        if i % 5 == 1:
+            tr["trade_id"] = tr.pop("id")
+        elif i % 5 == 2:
+            tr.pop("id")
+
+    def dedust_tonapi_tx(t):
+        tx = m.tonapi_tx(t)
+        tx["actions"][0]["dex"] = {"name": "dedust"}
+        tx["actions"].insert(0, {"type": "TonTransfer", "sender": t.buyer, "amount": t.ton_nano})
+        return tx
+
+    def blum_tx(t):
+        return {
+            "hash": t.hash,
+            "lt": str(t.lt),
+            "actions": [
+                {"type": "TonTransfer", "sender": t.buyer, "recipient": t.pool["token"], "amount": t.ton_nano},
+                {"type": "JettonMint", "recipient": t.buyer, "amount": str(t.token_nano)},
+            ],
+        }
+
+    assets = []
+    for tr in dd_trades:
+        assets += [tr["assetIn"], tr["assetOut"]]
+    assets += [{"type": "jetton", "symbol": "TON"}, {"kind": "jetton", "meta": {"symbol": "USDT"}, "jetton": {"address": m.pools[0]["token"]}}]
+
+    floats: List[Any] = []
+    for tr in dd_trades[: n // 2]:
+        floats += [tr["amountIn"], tr["amountOut"]]
+    floats += [f" {rnd.uniform(0, 1e4):.9f} " for _ in range(n // 4)]
+    floats += [rnd.uniform(0, 1e6) for _ in range(n // 8)] + [rnd.randint(0, 10 ** 12) for _ in range(n // 8)]
+    floats += [None, "", "abc", "1e9", "NaN"] * max(1, n // 100)
+    rnd.shuffle(floats)
+
+    money = [rnd.lognormvariate(9, 3) for _ in range(n)] + [None, "oops", 0] * max(1, n // 100)
+
+    return {
+        "_to_hex_tx_hash": [(_hash_forms(rnd, t.hash),) for t in trades],
+        "safe_float": [(x,) for x in floats],
+        "money_fmt": [(x,) for x in money],
+        "_trade_cursor_id": [(tr,) for tr in dd_trades],
+        "_get_any": [(tr["transaction"], ["hash", "tx_hash", "txHash", "transactionHash"]) for tr in dd_trades],
+        "is_ton_asset": [(a,) for a in assets],
+        "extract_jetton_master": [(a,) for a in assets],
+        "stonfi_extract_buys_from_tonapi_tx": [(m.tonapi_tx(t), t.pool["token"]) for t in ston],
+        "dedust_extract_buys_from_tonapi_tx": [(dedust_tonapi_tx(t), t.pool["pool"]) for t in dedust],
+        "blum_extract_buys_from_jetton_master_tx": [(blum_tx(t),) for t in trades if t.is_buy],
+    }
+
+
+def capture_corpora(path: str) -> Dict[str, Corpus]:
+    """Same corpora, taken from the responses in a capture file."""
+    c: Dict[str, Corpus] = {k: [] for k in synthetic_corpora(10, 1)}
+    for rec in read_capture(path):
+        if rec.get("k") != "http" or rec.get("st") != 200:
+            continue
+        try:
+            js = json.loads(rec.get("body") or "null")
+        except ValueError:
+            continue
+        if isinstance(js, dict) and isinstance(js.get("transactions"), list):
+            for tx in js["transactions"]:
+                if not isinstance(tx, dict):
+                    continue
+                c["_to_hex_tx_hash"].append((tx.get("hash"),))
+                for a in tx.get("actions") or []:
+                    if not isinstance(a, dict):
+                        continue
+                    dex = str((a.get("dex") or {}).get("name") or "").lower() if isinstance(a.get("dex"), dict) else ""
+                    if "swap" in str(a.get("type") or "").lower():
+                        if "dedust" in dex:
+                            c["dedust_extract_buys_from_tonapi_tx"].append((tx, (tx.get("account") or {}).get("address") or ""))
+                        else:
+                            c["stonfi_extract_buys_from_tonapi_tx"].append((tx, a.get("jetton_master") or ""))
+                        break
+                    if "jetton" in str(a.get("type") or "").lower():
+                        c["blum_extract_buys_from_jetton_master_tx"].append((tx,))
+                        break
+        elif isinstance(js, list):  # DeDust trades
+            for tr in js:
+                if not isinstance(tr, dict):
+                    continue
+                c["_trade_cursor_id"].append((tr,))
+                if isinstance(tr.get("transaction"), dict):
+                    c["_get_any"].append((tr["transaction"], ["hash", "tx_hash", "txHash", "transactionHash"]))
+                    c["_to_hex_tx_hash"].append((tr["transaction"].get("hash"),))
+                for k in ("assetIn", "assetOut"):
+                    c["is_ton_asset"].append((tr.get(k),))
+                    c["extract_jetton_master"].append((tr.get(k),))
+                for k in ("amountIn", "amountOut"):
+                    c["safe_float"].append((tr.get(k),))
+        elif isinstance(js, dict) and isinstance(js.get("events"), list):  # STON export
+            for ev in js["events"]:
+                if isinstance(ev, dict):
+                    c["_to_hex_tx_hash"].append((ev.get("txnId"),))
+                    for k in ("amount0In", "amount0Out", "amount1In", "amount1Out"):
+                        if k in ev:
+                            c["safe_float"].append((ev[k],))
+        elif isinstance(js, dict) and isinstance(js.get("pairs"), list):  # DexScreener
+            for p in js["pairs"]:
+                if isinstance(p, dict):
+                    c["money_fmt"].append(((p.get("liquidity") or {}).get("usd"),))
+                    c["money_fmt"].append((p.get("marketCap") or p.get("fdv"),))
+                    c["safe_float"].append((p.get("priceUsd"),))
+    return {k: v for k, v in c.items() if v}
+
+
+# ---------- measurement ----------
+def _reference(d: Dict[str, Any]) -> float:
+    s = 0.0
+    for k in ("a", "b", "c", "d"):
+        v = d.get(k)
+        if isinstance(v, str):
+            s += float(v.strip().lower() or 0)
+    return s
+
+
+REFERENCE: Corpus = [({"a": " 1.5 ", "b": "2", "c": None, "d": "3.25"},)] * 1000
+
+
+def time_ns(fn: Callable, corpus: Corpus, repeat: int, min_time: float) -> float:
+    """Best ns per call over `repeat` runs of at least min_time each."""
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            for args in corpus:
+                fn(*args)
+        dt = time.perf_counter() - t0
+        if dt >= min_time:
+            break
+        loops *= 2 if dt < min_time / 4 else 1 + int(min_time / max(dt, 1e-9))
+    best = dt
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            for args in corpus:
+                fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e9 / (loops * len(corpus))
+
+
+def alloc_profile(fn: Callable, corpus: Corpus) -> Dict[str, float]:
+    peaks = array("q", bytes(8 * len(corpus)))  # preallocated: storing into it allocates nothing
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for i, args in enumerate(corpus):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            r = fn(*args)
+            peaks[i] = tracemalloc.get_traced_memory()[1] - before
+            del r
+        gc.collect()
+        kept = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return {"peak_b": round(sum(peaks) / len(peaks), 1), "peak_b_max": max(peaks), "kept_b": max(0, kept)}
+
+
+def helpers() -> Dict[str, Callable]:
+    return {
+        "_to_hex_tx_hash": main._to_hex_tx_hash,
+        "safe_float": main.safe_float,
+        "money_fmt": main.money_fmt,
+        "_trade_cursor_id": main._trade_cursor_id,
+        "_get_any": main._get_any,
+        "is_ton_asset": main.is_ton_asset,
+        "extract_jetton_master": main.extract_jetton_master,
+        "stonfi_extract_buys_from_tonapi_tx": main.stonfi_extract_buys_from_tonapi_tx,
+        "dedust_extract_buys_from_tonapi_tx": main.dedust_extract_buys_from_tonapi_tx,
+        "blum_extract_buys_from_jetton_master_tx": main.blum_extract_buys_from_jetton_master_tx,
+    }
+
+
+def run(corpora: Dict[str, Corpus], repeat: int, min_time: float) -> Dict[str, Any]:
+    # decimals come from the cache in production (meta warm-up); no pending lookups here
+    for args in corpora.get("stonfi_extract_buys_from_tonapi_tx", []):
+        main.JETTON_DECIMALS_CACHE.set(args[1], 9)
+
+    ref_ns = time_ns(_reference, REFERENCE, repeat, min_time)
+    out: Dict[str, Any] = {}
+    for name, fn in helpers().items():
+        corpus = corpora.get(name)
+        if not corpus:
+            continue
+        ns = time_ns(fn, corpus, repeat, min_time)
+        out[name] = {"n": len(corpus), "ns": round(ns, 1), "rel": round(ns / ref_ns, 3), **alloc_profile(fn, corpus)}
+
+    hashes = corpora.get("_to_hex_tx_hash") or []
+    variants: Dict[str, Any] = {}
+    if hashes:
+        for args in hashes:
+            want = main._to_hex_tx_hash(*args)
+            if to_hex_precompiled(*args) != want or to_hex_memoized(*args) != want:
+                raise SystemExit(f"_to_hex_tx_hash variant differs for {args[0]!r}")
+        base_ns = out["_to_hex_tx_hash"]["ns"]
+
+        def cold(h):
+            _to_hex_cached.cache_clear()
+            return to_hex_memoized(h)
+
+        clear_ns = time_ns(lambda h: _to_hex_cached.cache_clear(), hashes, repeat, min_time)
+        for vname, fn, adjust in (
+            ("precompiled", to_hex_precompiled, 0.0),
+            ("memoized_cold", cold, clear_ns),
+            ("memoized_hot", to_hex_memoized, 0.0),
+        ):
+            _to_hex_cached.cache_clear()
+            ns = max(0.0, time_ns(fn, hashes, repeat, min_time) - adjust)
+            variants[vname] = {"ns": round(ns, 1), "speedup": round(base_ns / ns, 2) if ns else None}
+        _to_hex_cached.cache_clear()
+        fill = alloc_profile(to_hex_memoized, hashes)  # cold pass: what the cache holds afterwards
+        variants["memoized_cold"].update(fill)
+        variants["memoized_hot"].update(alloc_profile(to_hex_memoized, hashes))
+        variants["cache_bytes_per_entry"] = round(fill["kept_b"] / max(1, _to_hex_cached.cache_info().currsize), 1)
+        _to_hex_cached.cache_clear()
+        # share of calls that must be repeats for memoizing to pay off:
+        # cold * (1 - r) + hot * r = other
+        hot, cold_ns = variants["memoized_hot"]["ns"], variants["memoized_cold"]["ns"]
+        if cold_ns > hot:
+            for other, other_ns in (("current", base_ns), ("precompiled", variants["precompiled"]["ns"])):
+                r = (cold_ns - other_ns) / (cold_ns - hot)
+                variants[f"memo_breakeven_hit_rate_vs_{other}"] = round(max(0.0, min(1.0, r)), 3)
+    return {"reference_ns": round(ref_ns, 1), "helpers": out, "_to_hex_tx_hash_variants": variants}
+
+
+def check(res: Dict[str, Any], base: Dict[str, Any], threshold: float) -> List[str]:
+    same_py = base.get("python", "").rsplit(".", 1)[0] == res["python"].rsplit(".", 1)[0]
+    bad = []
+    for name, cur in res["helpers"].items():
+        old = base.get("helpers", {}).get(name)
+        if not old:
+            continue
+        if cur["rel"] > old["rel"] * threshold:
+            bad.append(f"{name}: rel {cur['rel']} > {old['rel']} x {threshold}")
+        if same_py and cur["peak_b"] > max(old["peak_b"] * threshold, old["peak_b"] + 64):
+            bad.append(f"{name}: peak {cur['peak_b']} B > {old['peak_b']} B x {threshold}")
+    return bad
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=2000, help="synthetic trades per corpus")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--capture", default="", help="build corpora from a CAPTURE_PATH file")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--min-time", type=float, default=0.1, help="seconds per timed run")
+    ap.add_argument("--save", default="", help="write the result as a baseline")
+    ap.add_argument("--check", default="", help="baseline to compare against")
+    ap.add_argument("--threshold", type=float, default=1.3)
+    args = ap.parse_args()
+
+    corpora = capture_corpora(args.capture) if args.capture else synthetic_corpora(args.n, args.seed)
+    res = {"python": platform.python_version(), "corpus": args.capture or f"synthetic n={args.n} seed={args.seed}"}
+    res.update(run(corpora, args.repeat, args.min_time))
+
+    failed: List[str] = []
+    if args.check:
+        with open(args.check, encoding="utf-8") as f:
+            failed = check(res, json.load(f), args.threshold)
+        res["regressions"] = failed
+    print(json.dumps(res, indent=2))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            f.write(json.dumps(res, indent=2) + "\n")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,97 @@
+"""Check run_job against the real PTB JobQueue (APScheduler).
+
+A job that runs longer than its interval is scheduled with main.run_job
+on a real Application.job_queue. Every tick must reach JobRunner.tick:
+the ones that arrive mid-run count as skipped and coalesce into a
+follow-up run. APScheduler must drop none of them ("maximum number of
+running instances reached"). --plain schedules the same job without
+run_job's job_kwargs to show the drops it prevents.
+
+Needs python-telegram-bot[job-queue]; exits 2 without APScheduler.
+
+  python bench/check_jobqueue.py --interval 0.2 --run 0.7 --duration 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("PORT", "0")
+
+from telegram.ext import Application  # noqa: E402
+
+import main  # noqa: E402
+from jobrunner import JobRunner  # noqa: E402
+
+
+class _Drops(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if "maximum number of running instances" in record.getMessage():
+            self.count += 1
+
+
+async def check(interval: float, run_s: float, duration: float, plain: bool) -> Dict[str, Any]:
+    app = Application.builder().token("123456:CHECK").build()
+    if app.job_queue is None:
+        print("no JobQueue: install python-telegram-bot[job-queue]", file=sys.stderr)
+        sys.exit(2)
+
+    drops = _Drops()
+    logging.getLogger("apscheduler").addHandler(drops)
+
+    async def slow_job(_context):
+        await asyncio.sleep(run_s)
+
+    if plain:
+        runner = JobRunner("slow_job", slow_job, interval)
+        app.job_queue.run_repeating(runner.tick, interval=interval, first=0, name="slow_job")
+    else:
+        main.run_job(app, slow_job, interval=interval)
+        runner = main.JOB_RUNNERS["slow_job"]
+
+    await app.job_queue.start()
+    await asyncio.sleep(duration)
+    await app.job_queue.stop(wait=False)
+    await asyncio.sleep(run_s)  # let the last run finish
+
+    ticks = runner.runs - runner.followups + runner.skipped
+    return {
+        "mode": "plain" if plain else "run_job",
+        "interval_s": interval,
+        "run_s": run_s,
+        "expected_ticks": int(duration / interval) + 1,
+        "ticks_seen": ticks,
+        "runs": runner.runs,
+        "skipped": runner.skipped,
+        "followups": runner.followups,
+        "apscheduler_dropped": drops.count,
+        "ok": drops.count == 0 and runner.skipped > 0 and runner.followups > 0,
+    }
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--interval", type=float, default=0.2)
+    ap.add_argument("--run", type=float, default=0.7, help="job duration, longer than --interval")
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--plain", action="store_true", help="schedule without run_job's job_kwargs")
+    args = ap.parse_args()
+
+    report = asyncio.run(check(args.interval, args.run, args.duration, args.plain))
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,338 @@
+"""Load test of post_buy_message against the fake Bot API.
+
+Feeds synthetic buys into main.post_buy_message at --rate buys/s for
+--duration seconds. Each buy goes to the master channel plus the group
+mirrors that track its token (--mirrors chats spread over --tokens
+tokens). The buys are handled by --workers concurrent callers, as the
+trackers do with their per-pool semaphores. Alerts go to the Bot API of
+bench/mock_upstream.py, which can add latency and 429s (--tg-* options,
+passed through). DexScreener enrichment for the follow-up edits is
+served by the same mock.
+
+Every Bot API call goes through main.tg_call; the driver wraps it and
+tags each accepted send with the buy it belongs to (a contextvar set by
+the worker), since the compact group alerts carry no tx link the mock
+could match on. Per-chat order is judged by the mock's message ids.
+
+Reported (JSON):
+  sends_per_s            accepted sends per second while sending
+  drop_rate              share of (buy, chat) alerts that never arrived
+  edit_amplification     edits per accepted send (FAST_POST_MODE follow-ups)
+  loop_ms_per_buy        event-loop busy time per buy (all callbacks)
+  loop_utilization       busy share of the wall time, max_callback_ms the
+                         longest single stall
+  latency_s              buy queued -> first alert / alert in its last chat
+  backlog_max            deepest the buy queue got
+  ordering               chats that got two buys' alerts in the reverse of
+                         the order the buys were queued
+  telegram               calls and 429s as the mock saw them
+
+  python bench/load_post.py --rate 50 --duration 30 --mirrors 100 --tokens 10
+  python bench/load_post.py --rate 50 --tg-latency-ms 60 --tg-chat-rps 1 --tg-global-rps 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from run_bench import _call, _pct  # noqa: E402
+
+MIRROR_BASE_ID = -1001900000000
+
+# index of the buy the current task is posting (-1: none)
+CURRENT_BUY: "contextvars.ContextVar[int]" = contextvars.ContextVar("current_buy", default=-1)
+
+
+class LoopMeter:
+    """Time spent inside event-loop callbacks (asyncio Handle._run)."""
+
+    def __init__(self):
+        self.busy = 0.0
+        self.max = 0.0
+        self.callbacks = 0
+        self._orig = None
+
+    def install(self) -> None:
+        self._orig = orig = asyncio.events.Handle._run
+        meter = self
+
+        def _run(handle):
+            t0 = time.perf_counter()
+            try:
+                return orig(handle)
+            finally:
+                dt = time.perf_counter() - t0
+                meter.busy += dt
+                meter.callbacks += 1
+                if dt > meter.max:
+                    meter.max = dt
+
+        asyncio.events.Handle._run = _run
+
+    def uninstall(self) -> None:
+        if self._orig is not None:
+            asyncio.events.Handle._run = self._orig
+
+    def reset(self) -> None:
+        self.busy, self.max, self.callbacks = 0.0, 0.0, 0
+
+
+def start_mock(args) -> subprocess.Popen:
+    cmd = [
+        sys.executable, os.path.join(HERE, "mock_upstream.py"),
+        "--pools", str(args.tokens), "--rate", "0.001", "--dedust-share", "0", "--seed", str(args.seed),
+        "--tg-latency-ms", str(args.tg_latency_ms), "--tg-jitter-ms", str(args.tg_jitter_ms),
+        "--tg-429-rate", str(args.tg_429_rate), "--tg-retry-after", str(args.tg_retry_after),
+        "--tg-chat-rps", str(args.tg_chat_rps), "--tg-global-rps", str(args.tg_global_rps),
+    ]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+
+
+def write_data(pools: List[Dict[str, Any]], mirrors: int) -> None:
+    pairs = {
+        p["pool"]: {"symbol": p["symbol"], "token_address": p["token"], "dex": "stonfi", "dex_label": "STON.fi", "ton_leg": 1, "pool": p["pool"], "buyers": {}}
+        for p in pools
+    }
+    group_mirrors = {}
+    for i in range(mirrors):
+        p = pools[i % len(pools)]
+        group_mirrors[str(MIRROR_BASE_ID - i)] = {
+            "symbol": p["symbol"], "token_address": p["token"], "pair_id": p["pool"], "dex": "stonfi",
+            "telegram": None, "min_usd": None, "updated_ts": int(time.time()),
+        }
+    with open("data.json", "w", encoding="utf-8") as f:
+        json.dump({"pairs": pairs, "watch": {}, "forced_ranks": {}, "group_mirrors": group_mirrors}, f)
+
+
+async def run_load(base: str, pools: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    import main
+
+    main.load_data()
+    main.load_state()
+    main.load_meta()
+    app = main.application_builder().build()
+    await app.initialize()
+    context = SimpleNamespace(bot=app.bot, application=app, job=None)
+    await main.ton_price_cache_job(context)
+
+    rnd = random.Random(args.seed)
+    queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    queued_at: List[float] = []
+    delivered: List[Tuple[int, int, int, float]] = []  # (buy, chat, message_id, acked)
+    expected = 0
+    started = 0
+    backlog_max = 0
+
+    tg_call = main.tg_call
+
+    async def tagged_tg_call(method: str, coro):
+        msg = await tg_call(method, coro)
+        buy = CURRENT_BUY.get()
+        if method.startswith("send") and buy >= 0 and msg is not None:
+            delivered.append((buy, msg.chat_id, msg.message_id, time.perf_counter()))
+        return msg
+
+    main.tg_call = tagged_tg_call
+
+    async def worker():
+        nonlocal expected, started
+        while True:
+            b = await queue.get()
+            CURRENT_BUY.set(b["i"])
+            started += 1
+            try:
+                usd = main.buy_usd_value(b["ton"])
+                expected += len(main._buy_targets(b["token"], b["pool"], usd)[0])
+                await main.post_buy_message(
+                    context, b["sym"], b["token"], b["pool"], b["buyer"], b["tx"], b["ton"], b["token_amt"],
+                    "New Holder!", source_label="STON.fi", trace=main.BUY_TRACER.start("load", "poll", time.time()),
+                )
+            finally:
+                CURRENT_BUY.set(-1)
+                queue.task_done()
+
+    meter = LoopMeter()
+    meter.install()
+    workers = [asyncio.create_task(worker()) for _ in range(args.workers)]
+    _call(base, "/_bench/reset", "POST")
+    meter.reset()
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    n = int(args.rate * args.duration)
+    try:
+        for i in range(n):
+            delay = t0 + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            p = pools[rnd.randrange(len(pools))]
+            tx = f"{rnd.getrandbits(256):064x}"
+            queued_at.append(time.perf_counter())
+            queue.put_nowait({
+                "i": i, "sym": p["symbol"], "token": p["token"], "pool": p["pool"], "tx": tx,
+                "buyer": f"0:{rnd.getrandbits(256):064x}", "ton": rnd.lognormvariate(0.5, 1.2),
+                "token_amt": rnd.uniform(1e3, 1e6),
+            })
+            backlog_max = max(backlog_max, queue.qsize())
+        feed_s = time.perf_counter() - t0
+        try:
+            await asyncio.wait_for(queue.join(), timeout=args.settle)
+        except asyncio.TimeoutError:
+            pass
+        # follow-up edits still running
+        others = [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and t not in workers]
+        if others:
+            await asyncio.wait(others, timeout=args.settle)
+        wall = time.perf_counter() - t0
+        busy, max_cb, callbacks = meter.busy, meter.max, meter.callbacks
+        cpu = time.process_time() - cpu0
+    finally:
+        meter.uninstall()
+        main.tg_call = tg_call
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await app.shutdown()
+
+    stats = _call(base, "/_bench/stats")
+    return {
+        "n": n, "feed_s": feed_s, "wall_s": wall, "cpu_s": cpu, "expected": expected, "started": started,
+        "backlog_max": backlog_max, "busy": busy, "max_cb": max_cb, "callbacks": callbacks,
+        "queued_at": queued_at, "delivered": delivered, "stats": stats,
+        "tg_errors": {f"{m}:{e}": int(v) for (m, e), v in main.TG_ERRORS.values().items()},
+    }
+
+
+def ordering(delivered: List[Tuple[int, int, int, float]]) -> Dict[str, Any]:
+    """Per chat, alerts in message-id order should be in buy order."""
+    per_chat: Dict[int, List[Tuple[int, int]]] = {}
+    for buy, chat, msg_id, _ in delivered:
+        per_chat.setdefault(chat, []).append((msg_id, buy))
+    out_of_order = 0
+    chats = 0
+    for seq in per_chat.values():
+        seq.sort()
+        top = -1
+        bad = 0
+        for _, buy in seq:
+            if buy < top:
+                bad += 1
+            top = max(top, buy)
+        out_of_order += bad
+        chats += bool(bad)
+    return {"chats": len(per_chat), "chats_out_of_order": chats, "alerts_out_of_order": out_of_order}
+
+
+def report(r: Dict[str, Any], args) -> Dict[str, Any]:
+    tg = r["stats"]["telegram"]
+    seen = set()
+    first: Dict[int, float] = {}
+    last: Dict[int, float] = {}
+    for buy, chat, _, acked in r["delivered"]:
+        seen.add((buy, chat))
+        dt = acked - r["queued_at"][buy]
+        first[buy] = min(first.get(buy, dt), dt)
+        last[buy] = max(last.get(buy, dt), dt)
+    acks = sorted(a for *_, a in r["delivered"])
+    span = (acks[-1] - acks[0]) if len(acks) > 1 else 0.0
+    first_l, last_l = sorted(first.values()), sorted(last.values())
+    n = max(1, r["n"])
+    return {
+        "params": {
+            "rate": args.rate, "duration": args.duration, "mirrors": args.mirrors, "tokens": args.tokens,
+            "workers": args.workers, "fast_post": args.fast_post,
+            "tg": {"latency_ms": args.tg_latency_ms, "jitter_ms": args.tg_jitter_ms, "rate_429": args.tg_429_rate,
+                   "chat_rps": args.tg_chat_rps, "global_rps": args.tg_global_rps},
+        },
+        "buys": r["n"],
+        "buys_not_started": r["n"] - r["started"],
+        "fanout": round(r["expected"] / max(1, r["started"]), 2),
+        "alerts_expected": r["expected"],
+        "alerts_delivered": len(seen),
+        "drop_rate": round(1 - len(seen) / r["expected"], 4) if r["expected"] else 0.0,
+        "sends_per_s": round(len(acks) / span, 1) if span else 0.0,
+        "buys_per_s": round(r["n"] / r["wall_s"], 2),
+        "edit_amplification": round(tg["edits"] / max(1, tg["sends"]), 3),
+        "latency_s": {
+            "first_p50": round(_pct(first_l, 0.5), 3), "first_p95": round(_pct(first_l, 0.95), 3),
+            "last_p50": round(_pct(last_l, 0.5), 3), "last_p95": round(_pct(last_l, 0.95), 3),
+            "last_p99": round(_pct(last_l, 0.99), 3),
+        },
+        "backlog_max": r["backlog_max"],
+        "ordering": ordering(r["delivered"]),
+        "loop_ms_per_buy": round(r["busy"] * 1000 / n, 3),
+        "loop_utilization": round(r["busy"] / r["wall_s"], 3),
+        "max_callback_ms": round(r["max_cb"] * 1000, 2),
+        "cpu_ms_per_buy": round(r["cpu_s"] * 1000 / n, 3),
+        "wall_s": round(r["wall_s"], 2),
+        "telegram": {k: tg[k] for k in ("sends", "edits", "calls", "rejected_429")},
+        "tg_errors": r["tg_errors"],
+    }
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rate", type=float, default=50.0, help="buys/s")
+    ap.add_argument("--duration", type=float, default=20.0)
+    ap.add_argument("--mirrors", type=int, default=100, help="group mirror chats")
+    ap.add_argument("--tokens", type=int, default=10, help="tokens the buys and mirrors are spread over")
+    ap.add_argument("--workers", type=int, default=16, help="concurrent post_buy_message callers")
+    ap.add_argument("--settle", type=float, default=30.0, help="max wait for queued buys / edits after feeding")
+    ap.add_argument("--fast-post", type=int, choices=(0, 1), default=1, help="FAST_POST_MODE")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--tg-latency-ms", type=float, default=0.0)
+    ap.add_argument("--tg-jitter-ms", type=float, default=0.0)
+    ap.add_argument("--tg-429-rate", type=float, default=0.0)
+    ap.add_argument("--tg-retry-after", type=int, default=1)
+    ap.add_argument("--tg-chat-rps", type=float, default=0.0)
+    ap.add_argument("--tg-global-rps", type=float, default=0.0)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+    out_path = os.path.abspath(args.out) if args.out else ""
+
+    mock = start_mock(args)
+    try:
+        port = json.loads(mock.stdout.readline())["port"]
+        base = f"http://127.0.0.1:{port}"
+        pools = _call(base, "/_bench/pools")
+        os.environ.update({
+            "BOT_TOKEN": "1:load",
+            "ADMIN_ID": "1",
+            "PORT": "0",
+            "TELEGRAM_API_BASE": base,
+            "TONAPI_BASE": base,
+            "DEXSCREENER_BASE": base,
+            "TON_PRICE_API": base + "/ton_price",
+            "MIN_USD_BUY": "0",
+            "HEADER_IMAGE_PATH": "",
+            "FAST_POST_MODE": str(args.fast_post),
+            "BUY_COALESCE_SECONDS": "0",
+        })
+        os.chdir(tempfile.mkdtemp(prefix="spyton-load-"))
+        write_data(pools, args.mirrors)
+        res = report(asyncio.run(run_load(base, pools, args)), args)
+    finally:
+        mock.terminate()
+        mock.wait(10)
+
+    text = json.dumps(res, indent=2)
+    print(text)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
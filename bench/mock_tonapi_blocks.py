@@ -0,0 +1,210 @@
+"""Local stand-in for the TonAPI block endpoints used by DETECTION_MODE=blocks.
+
+Serves:
+  GET /v2/blockchain/masterchain-head
+  GET /v2/blockchain/masterchain/<seqno>/transactions
+
+Every block carries `--noise` unrelated txs plus `--buys` swap txs spread over
+the tracked pools, shaped like the TonAPI payloads the STON parser reads.
+
+Run the bot against it:
+  python bench/mock_tonapi_blocks.py --pools 200 --port 9100
+  TONAPI_BASE=http://127.0.0.1:9100 DETECTION_MODE=blocks python main.py
+
+Or check the scanner in-process (no Telegram, no files touched):
+  python bench/mock_tonapi_blocks.py --pools 2000 --check 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def _crc16(data: bytes) -> bytes:
+    reg = 0
+    for byte in data + b"\x00\x00":
+        mask = 0x80
+        while mask:
+            reg <<= 1
+            if byte & mask:
+                reg += 1
+            mask >>= 1
+            if reg > 0xFFFF:
+                reg &= 0xFFFF
+                reg ^= 0x1021
+    return reg.to_bytes(2, "big")
+
+
+def friendly_address(seed: str, wc: int = 0) -> Tuple[str, str]:
+    """Deterministic (friendly EQ.., raw 0:hex) address pair for a seed."""
+    h = hashlib.sha256(seed.encode()).digest()
+    body = bytes([0x11, wc & 0xFF]) + h
+    friendly = base64.urlsafe_b64encode(body + _crc16(body)).decode()
+    return friendly, f"{wc}:{h.hex()}"
+
+
+class BlockFeed:
+    def __init__(self, n_pools: int, buys_per_block: int, noise: int, block_time: float):
+        self.pools = [friendly_address(f"pool-{i}") for i in range(n_pools)]
+        self.tokens = [friendly_address(f"jetton-{i}")[0] for i in range(n_pools)]
+        self.buys_per_block = buys_per_block
+        self.noise = noise
+        self.block_time = block_time
+        self.start_seqno = 40_000_000
+        self.t0 = time.time()
+        self.requests = 0
+
+    def head(self) -> int:
+        return self.start_seqno + int((time.time() - self.t0) / self.block_time)
+
+    def block_txs(self, seqno: int) -> List[Dict[str, Any]]:
+        utime = int(self.t0 + (seqno - self.start_seqno) * self.block_time)
+        txs: List[Dict[str, Any]] = []
+        for j in range(self.noise):
+            _f, raw = friendly_address(f"noise-{seqno}-{j}")
+            txs.append({
+                "hash": hashlib.sha256(f"n{seqno}:{j}".encode()).hexdigest(),
+                "lt": seqno * 1000 + j,
+                "utime": utime,
+                "account": {"address": raw},
+                "actions": [],
+            })
+        for j in range(self.buys_per_block):
+            k = (seqno * 7919 + j) % len(self.pools)
+            _pool, raw = self.pools[k]
+            buyer = friendly_address(f"buyer-{seqno}-{j}")[0]
+            txs.append({
+                "hash": hashlib.sha256(f"b{seqno}:{j}".encode()).hexdigest(),
+                "lt": seqno * 1000 + 500 + j,
+                "utime": utime,
+                "account": {"address": raw},
+                "actions": [{
+                    "type": "JettonSwap",
+                    "dex": {"name": "stonfi"},
+                    "user": {"address": buyer},
+                    "ton_in": str(1_000_000_000 * (1 + j % 5)),
+                    "jetton_out": str(2_500_000 * 10 ** 9),
+                    "jetton_master": self.tokens[k],
+                }],
+            })
+        return txs
+
+
+def make_handler(feed: BlockFeed):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_a):
+            pass
+
+        def _json(self, code: int, obj: Any):
+            body = json.dumps(obj).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            feed.requests += 1
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path == "/v2/blockchain/masterchain-head":
+                return self._json(200, {"seqno": feed.head()})
+            parts = path.split("/")
+            # /v2/blockchain/masterchain/<seqno>/transactions
+            if len(parts) == 6 and parts[3] == "masterchain" and parts[5] == "transactions" and parts[4].isdigit():
+                seqno = int(parts[4])
+                if seqno > feed.head():
+                    return self._json(404, {"error": "block not found"})
+                return self._json(200, {"transactions": feed.block_txs(seqno)})
+            return self._json(404, {"error": "not found"})
+
+    return Handler
+
+
+def serve(feed: BlockFeed, port: int) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer(("127.0.0.1", port), make_handler(feed))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def run_check(feed: BlockFeed, port: int, ticks: int) -> Dict[str, Any]:
+    """Run main.block_scan_job against the feed with Telegram/disk stubbed out."""
+    os.environ.setdefault("PORT", "0")
+    import main
+
+    main.TONAPI_BASE = f"http://127.0.0.1:{port}"
+    main.DETECTION_MODE = "blocks"
+    main.DATA = {
+        "pairs": {
+            pool: {"symbol": f"T{i}", "token_address": feed.tokens[i], "dex": "stonfi", "buyers": {}}
+            for i, (pool, _raw) in enumerate(feed.pools)
+        },
+        "watch": {},
+        "forced_ranks": {},
+        "group_mirrors": {},
+    }
+    main.STATE = {"ston_last_lt_map": {}, "blum_last_lt": {}}
+    for fn in ("load_data", "save_data", "load_state", "save_state"):
+        setattr(main, fn, lambda *a, **k: None)
+
+    posted: List[str] = []
+
+    async def _fake_post(**kw):
+        posted.append(kw.get("tx_hash") or "")
+
+    main.post_buy_message = _fake_post
+
+    async def _run():
+        for _ in range(ticks):
+            await main.block_scan_job(None)
+            await asyncio.sleep(feed.block_time)
+
+    feed.requests = 0
+    t0 = time.perf_counter()
+    asyncio.run(_run())
+    return {
+        "pools": len(feed.pools),
+        "ticks": ticks,
+        "blocks_scanned": (main.STATE.get("block_last_seqno") or 0) - feed.start_seqno,
+        "buys_posted": len(posted),
+        "unique_buys": len(set(posted)),
+        "upstream_requests": feed.requests,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=9100)
+    ap.add_argument("--pools", type=int, default=200)
+    ap.add_argument("--buys", type=int, default=3, help="swap txs per block on tracked pools")
+    ap.add_argument("--noise", type=int, default=300, help="unrelated txs per block")
+    ap.add_argument("--block-time", type=float, default=0.5)
+    ap.add_argument("--check", type=int, default=0, metavar="TICKS", help="run block_scan_job in-process")
+    args = ap.parse_args()
+
+    feed = BlockFeed(args.pools, args.buys, args.noise, args.block_time)
+    serve(feed, args.port)
+    if args.check:
+        print(json.dumps(run_check(feed, args.port, args.check), indent=2))
+        return
+    print(f"mock TonAPI block feed on http://127.0.0.1:{args.port} ({args.pools} pools)")
+    for pool, _raw in feed.pools[:5]:
+        print("  pool", pool)
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == "__main__":
+    main_cli()
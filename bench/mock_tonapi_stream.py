@@ -0,0 +1,278 @@
+"""Local stand-in for TonAPI streaming + polling endpoints (DETECTION_MODE=stream).
+
+Serves:
+  GET /v2/sse/accounts/transactions?accounts=a,b   (SSE: heartbeat + tx notifications)
+  GET /v2/blockchain/transactions/<hash>
+  GET /v2/blockchain/accounts/<addr>/transactions?limit=N
+
+A generator thread creates STON-style swap txs at `--rate` per second spread
+over `--pools` pools. `--drop` drops that fraction of SSE notifications so the
+polling fallback has something to catch.
+
+Serve only:
+  python bench/mock_tonapi_stream.py --pools 50 --port 9200
+  TONAPI_BASE=http://127.0.0.1:9200 TONAPI_KEY=x DETECTION_MODE=stream python main.py
+
+Compare detection latency of polling vs streaming in-process:
+  python bench/mock_tonapi_stream.py --pools 50 --rate 4 --compare 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_tonapi_blocks import friendly_address  # noqa: E402
+
+
+class TxFeed:
+    def __init__(self, n_pools: int, rate: float, drop: float):
+        self.pools = [friendly_address(f"pool-{i}") for i in range(n_pools)]
+        self.tokens = [friendly_address(f"jetton-{i}")[0] for i in range(n_pools)]
+        self.raw_of = {f: r for f, r in self.pools}
+        self.rate = rate
+        self.drop = drop
+        self.cond = threading.Condition()
+        self.reset()
+
+    def reset(self):
+        with self.cond:
+            self.by_hash: Dict[str, Dict[str, Any]] = {}
+            self.by_account: Dict[str, List[Dict[str, Any]]] = {}
+            self.events: List[Tuple[str, str, int]] = []   # (raw, hash, lt) in SSE order
+            self.created: Dict[str, float] = {}
+            self.lt = int(time.time() * 1000) * 1000
+            self.requests = 0
+            self.running = False
+
+    def make_tx(self) -> None:
+        k = random.randrange(len(self.pools))
+        _pool, raw = self.pools[k]
+        with self.cond:
+            self.lt += 1
+            h = hashlib.sha256(f"{self.lt}".encode()).hexdigest()
+            tx = {
+                "hash": h,
+                "lt": self.lt,
+                "utime": int(time.time()),
+                "account": {"address": raw},
+                "actions": [{
+                    "type": "JettonSwap",
+                    "dex": {"name": "stonfi"},
+                    "user": {"address": friendly_address(f"buyer-{self.lt}")[0]},
+                    "ton_in": str(2_000_000_000),
+                    "jetton_out": str(1_000 * 10 ** 9),
+                    "jetton_master": self.tokens[k],
+                }],
+            }
+            self.by_hash[h] = tx
+            arr = self.by_account.setdefault(raw, [])
+            arr.insert(0, tx)
+            del arr[50:]
+            self.created[h] = time.time()
+            if random.random() >= self.drop:
+                self.events.append((raw, h, self.lt))
+            self.cond.notify_all()
+
+    def generator(self):
+        while True:
+            if self.running and self.rate > 0:
+                self.make_tx()
+                time.sleep(random.expovariate(self.rate))
+            else:
+                time.sleep(0.05)
+
+
+def make_handler(feed: TxFeed):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *_a):
+            pass
+
+        def _json(self, code: int, obj: Any):
+            body = json.dumps(obj).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _sse(self, accounts: set):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            with feed.cond:
+                pos = len(feed.events)
+            last_beat = 0.0
+            try:
+                while True:
+                    with feed.cond:
+                        feed.cond.wait(timeout=0.2)
+                        new = feed.events[pos:]
+                        pos = len(feed.events)
+                    out = []
+                    for raw, h, lt in new:
+                        if raw in accounts:
+                            data = json.dumps({"account_id": raw, "lt": lt, "tx_hash": h})
+                            out.append(f"event: message\ndata: {data}\n\n")
+                    if time.time() - last_beat >= 1.0:
+                        out.append("event: heartbeat\ndata: \n\n")
+                        last_beat = time.time()
+                    if out:
+                        self.wfile.write("".join(out).encode())
+                        self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+        def do_GET(self):
+            u = urlparse(self.path)
+            path = u.path.rstrip("/")
+            qs = parse_qs(u.query)
+            if path == "/v2/sse/accounts/transactions":
+                accounts = set(",".join(qs.get("accounts", [""])).lower().split(","))
+                return self._sse(accounts)
+            feed.requests += 1
+            parts = path.split("/")
+            if len(parts) == 5 and parts[3] == "transactions":
+                tx = feed.by_hash.get(parts[4])
+                return self._json(200 if tx else 404, tx or {"error": "not found"})
+            if len(parts) == 6 and parts[3] == "accounts" and parts[5] == "transactions":
+                raw = feed.raw_of.get(parts[4], parts[4].lower())
+                limit = int((qs.get("limit") or ["25"])[0])
+                with feed.cond:
+                    txs = list(feed.by_account.get(raw, []))[:limit]
+                return self._json(200, {"transactions": txs})
+            return self._json(404, {"error": "not found"})
+
+    return Handler
+
+
+def serve(feed: TxFeed, port: int) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer(("127.0.0.1", port), make_handler(feed))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    threading.Thread(target=feed.generator, daemon=True).start()
+    return srv
+
+
+def _pct(vals: List[float], q: float) -> float:
+    if not vals:
+        return 0.0
+    s = sorted(vals)
+    return round(s[min(len(s) - 1, int(q * len(s)))], 3)
+
+
+def run_compare(feed: TxFeed, port: int, seconds: float) -> Dict[str, Any]:
+    """Run polling mode then stream mode against the feed and compare latency."""
+    os.environ.setdefault("PORT", "0")
+    import main
+
+    main.TONAPI_BASE = f"http://127.0.0.1:{port}"
+    main.TONAPI_KEY = "mock"
+    for fn in ("load_data", "save_data", "load_state", "save_state"):
+        setattr(main, fn, lambda *a, **k: None)
+
+    posted: Dict[str, float] = {}
+
+    async def _fake_post(**kw):
+        posted.setdefault(kw.get("tx_hash") or "", time.time())
+
+    main.post_buy_message = _fake_post
+
+    def _reset_bot_state():
+        main.DATA = {
+            "pairs": {
+                pool: {"symbol": f"T{i}", "token_address": feed.tokens[i], "dex": "stonfi", "buyers": {}}
+                for i, (pool, _raw) in enumerate(feed.pools)
+            },
+            "watch": {},
+            "forced_ranks": {},
+            "group_mirrors": {},
+        }
+        main.STATE = {"ston_last_lt_map": {}, "blum_last_lt": {}}
+        main.SEEN_TX_STON.clear()
+        posted.clear()
+
+    async def _loop(mode: str):
+        main.DETECTION_MODE = mode
+        t_end = time.time() + seconds
+        next_poll = 0.0
+        while time.time() < t_end:
+            now = time.time()
+            if now >= next_poll:
+                await main.ston_tracker_job_fast(None)
+                next_poll = now + main.STON_POLL_INTERVAL
+            if mode == "stream":
+                await main.stream_dispatch_job(None)
+                await asyncio.sleep(main.STREAM_DISPATCH_INTERVAL)
+            else:
+                await asyncio.sleep(0.05)
+
+    report: Dict[str, Any] = {"pools": len(feed.pools), "rate_per_s": feed.rate, "drop": feed.drop}
+    for mode in ("poll", "stream"):
+        feed.reset()
+        _reset_bot_state()
+        if mode == "stream":
+            # connect before generating so the first txs are streamed
+            main.stream_sync_subscriptions(main.build_block_scan_index())
+            t0 = time.time()
+            while not all(st.get("connected") for st in main.STREAM_CONNS.values()) and time.time() - t0 < 5:
+                time.sleep(0.05)
+        # prime the poll cursors so history isn't replayed
+        asyncio.run(main.ston_tracker_job_fast(None))
+        posted.clear()
+        feed.requests = 0
+        feed.running = True
+        asyncio.run(_loop(mode))
+        feed.running = False
+        lat = [posted[h] - feed.created[h] for h in posted if h in feed.created]
+        report[mode] = {
+            "txs_created": len(feed.created),
+            "buys_posted": len(lat),
+            "latency_p50_s": _pct(lat, 0.5),
+            "latency_p95_s": _pct(lat, 0.95),
+            "latency_max_s": _pct(lat, 1.0),
+            "upstream_requests": feed.requests,
+        }
+    report["stream_stats"] = dict(main.STREAM_STATS)
+    return report
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=9200)
+    ap.add_argument("--pools", type=int, default=50)
+    ap.add_argument("--rate", type=float, default=2.0, help="swap txs per second")
+    ap.add_argument("--drop", type=float, default=0.0, help="fraction of SSE notifications dropped")
+    ap.add_argument("--compare", type=float, default=0.0, metavar="SECONDS")
+    args = ap.parse_args()
+
+    feed = TxFeed(args.pools, args.rate, args.drop)
+    serve(feed, args.port)
+    if args.compare:
+        print(json.dumps(run_compare(feed, args.port, args.compare), indent=2))
+        return
+    feed.running = True
+    print(f"mock TonAPI stream on http://127.0.0.1:{args.port} ({args.pools} pools, {args.rate}/s)")
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,656 @@
+"""Local stand-in for every upstream the bot talks to, plus a fake Bot API.
+
+One HTTP server answers the URL patterns main.py uses, with payloads in
+the shapes its parsers read:
+
+  TonAPI       /v2/blockchain/accounts/{addr}/transactions, /v2/jettons/{addr},
+               /v2/jettons/_bulk, /v2/blockchain/masterchain-head,
+               /v2/blockchain/masterchain/{seqno}/transactions,
+               /v2/blockchain/transactions/{hash}
+  DeDust       /v2/pools/{pool}/trades
+  STON export  /export/dexscreener/v1/latest-block, /export/dexscreener/v1/events
+  DexScreener  /latest/dex/pairs/ton/{pair}, /latest/dex/tokens/{token}
+  TON price    /ton_price (coingecko shape)
+  Bot API      /bot{token}/{method}
+
+Trades are synthetic: N pools (STON.fi or DeDust), Poisson arrivals at M
+trades/s in total, generated lazily from a seeded RNG, so every run with the
+same seed sees the same market. Each trade remembers when it "landed", and
+every alert the fake Bot API receives is matched back to its trade through
+the tx link in the text. That gives detection latency as measured from
+outside the bot.
+
+Control endpoints (JSON):
+  GET  /_bench/pools    pools to put into data.json
+  POST /_bench/reset    start the measurement window now
+  POST /_bench/pause    stop generating trades (the window ends here)
+  GET  /_bench/stats    counters for the window (?detail=1: per-tx send times)
+
+The Bot API can add latency, answer 429 with retry_after at random or
+when per-chat / per-bot flood limits are exceeded (--tg-* options), and
+checks that every chat received alerts in the order they first went out.
+
+  python bench/mock_upstream.py --pools 50 --rate 20 --port 0
+prints {"port": ...} once listening.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+TON_MASTER = "0:" + "0" * 64
+TON_USD = 5.0
+BLOCK0 = 40_000_000          # first masterchain seqno / STON export block
+HISTORY = 400                # trades kept per pool
+TX_LINK_RE = re.compile(r"tonviewer\.com/transaction/([0-9a-f]{64})")
+
+
+def _addr(seed: int, kind: str, i: int) -> str:
+    return "0:" + hashlib.sha256(f"{seed}:{kind}:{i}".encode()).hexdigest()
+
+
+class Trade:
+    __slots__ = ("seq", "lt", "hash", "created", "pool", "buyer", "is_buy", "ton_nano", "token_nano")
+
+    def __init__(self, seq: int, lt: int, h: str, created: float, pool: Dict[str, Any], buyer: str, is_buy: bool, ton_nano: int, token_nano: int):
+        self.seq = seq
+        self.lt = lt
+        self.hash = h
+        self.created = created
+        self.pool = pool
+        self.buyer = buyer
+        self.is_buy = is_buy
+        self.ton_nano = ton_nano
+        self.token_nano = token_nano
+
+
+class Market:
+    """Seeded synthetic trade flow over a fixed set of pools."""
+
+    def __init__(self, pools: int, rate: float, dedust_share: float = 0.5, buy_ratio: float = 0.7, wallets: int = 5000, seed: int = 1):
+        self.rnd = random.Random(seed)
+        self.seed = seed
+        self.rate = max(0.001, float(rate))
+        self.buy_ratio = buy_ratio
+        self.wallets = [_addr(seed, "wallet", i) for i in range(wallets)]
+        self.pools: List[Dict[str, Any]] = []
+        n_dedust = int(round(pools * dedust_share))
+        for i in range(pools):
+            dex = "dedust" if i < n_dedust else "stonfi"
+            self.pools.append({
+                "pool": _addr(seed, "pool", i),
+                "token": _addr(seed, "token", i),
+                "symbol": f"BENCH{i}",
+                "dex": dex,
+                "decimals": 9,
+                "price_usd": round(self.rnd.uniform(0.0001, 2.0), 6),
+            })
+        self.by_pool = {p["pool"]: p for p in self.pools}
+        self.by_token = {p["token"]: p for p in self.pools}
+        self.trades: Dict[str, Deque[Trade]] = {p["pool"]: deque(maxlen=HISTORY) for p in self.pools}
+        self.by_hash: Dict[str, Trade] = {}
+        self.by_block: Dict[int, List[Trade]] = {}
+        self.t0 = time.time()
+        self.next_at = self.t0 + self.rnd.expovariate(self.rate)  # --pools 0: Bot API only
+        self.paused_at: Optional[float] = None
+        self.seq = 0
+        self.lt = 50_000_000_000
+        self.lock = threading.Lock()
+
+    def block_of(self, ts: float) -> int:
+        return BLOCK0 + int(ts - self.t0)
+
+    def advance(self) -> float:
+        """Generate every trade due by now; returns now."""
+        now = time.time()
+        if not self.pools:
+            return now
+        end = now if self.paused_at is None else min(now, self.paused_at)
+        with self.lock:
+            while self.next_at <= end:
+                self._new_trade(self.next_at)
+                self.next_at += self.rnd.expovariate(self.rate)
+        return now
+
+    def _new_trade(self, created: float) -> None:
+        rnd = self.rnd
+        pool = rnd.choice(self.pools)
+        self.seq += 1
+        self.lt += rnd.randint(1, 5000)
+        ton = rnd.lognormvariate(0.5, 1.2)
+        ton_nano = int(ton * 1e9)
+        token_nano = int(ton * TON_USD / pool["price_usd"] * 10 ** pool["decimals"])
+        h = hashlib.sha256(f"{self.seed}:tx:{self.seq}".encode()).hexdigest()
+        tr = Trade(self.seq, self.lt, h, created, pool, rnd.choice(self.wallets), rnd.random() < self.buy_ratio, ton_nano, token_nano)
+        self.trades[pool["pool"]].append(tr)
+        self.by_hash[h] = tr
+        self.by_block.setdefault(self.block_of(created), []).append(tr)
+
+    def recent(self, pool: str, limit: int) -> List[Trade]:
+        with self.lock:
+            arr = list(self.trades.get(pool, ()))
+        return arr[::-1][:limit]  # newest first
+
+    def in_blocks(self, lo: int, hi: int) -> List[Trade]:
+        with self.lock:
+            out: List[Trade] = []
+            for b in range(lo, hi + 1):
+                out.extend(self.by_block.get(b, ()))
+        return out
+
+    # ---------- payloads ----------
+    def tonapi_tx(self, tr: Trade) -> Dict[str, Any]:
+        p = tr.pool
+        if tr.is_buy:
+            action = {"type": "JettonSwap", "dex": {"name": "stonfi"}, "user": tr.buyer,
+                      "ton_in": tr.ton_nano, "jetton_out": tr.token_nano, "jetton_master": p["token"]}
+        else:
+            action = {"type": "JettonSwap", "dex": {"name": "stonfi"}, "user": tr.buyer,
+                      "jetton_in": tr.token_nano, "ton_out": tr.ton_nano, "jetton_master": p["token"]}
+        return {
+            "hash": tr.hash,
+            "lt": tr.lt,
+            "utime": int(tr.created),
+            "account": {"address": p["pool"]},
+            "success": True,
+            "actions": [action],
+        }
+
+    def dedust_trade(self, tr: Trade) -> Dict[str, Any]:
+        p = tr.pool
+        ton = {"type": "native"}
+        jetton = {"type": "jetton", "address": p["token"]}
+        return {
+            "id": str(tr.seq),
+            "lt": str(tr.lt),
+            "sender": tr.buyer,
+            "assetIn": ton if tr.is_buy else jetton,
+            "assetOut": jetton if tr.is_buy else ton,
+            "amountIn": str(tr.ton_nano if tr.is_buy else tr.token_nano),
+            "amountOut": str(tr.token_nano if tr.is_buy else tr.ton_nano),
+            "createdAt": datetime.fromtimestamp(tr.created, timezone.utc).isoformat().replace("+00:00", "Z"),
+            "transaction": {"hash": tr.hash},
+        }
+
+    def ston_event(self, tr: Trade) -> Dict[str, Any]:
+        # TON is the quote leg (amount1) in the pair metadata served below
+        ton = tr.ton_nano / 1e9
+        tok = tr.token_nano / 10 ** tr.pool["decimals"]
+        ev = {
+            "block": {"blockNumber": self.block_of(tr.created), "blockTimestamp": int(tr.created)},
+            "eventType": "swap",
+            "txnId": tr.hash,
+            "txnIndex": 0,
+            "eventIndex": 0,
+            "maker": tr.buyer,
+            "pairId": tr.pool["pool"],
+        }
+        if tr.is_buy:
+            ev.update({"amount0In": "0", "amount0Out": f"{tok:.9f}", "amount1In": f"{ton:.9f}", "amount1Out": "0"})
+        else:
+            ev.update({"amount0In": f"{tok:.9f}", "amount0Out": "0", "amount1In": "0", "amount1Out": f"{ton:.9f}"})
+        return ev
+
+    def jetton(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "mintable": False,
+            "total_supply": str(10 ** 18),
+            "metadata": {"address": p["token"], "name": p["symbol"], "symbol": p["symbol"], "decimals": str(p["decimals"])},
+            "holders_count": 1000 + int(p["pool"][-4:], 16) % 9000,
+        }
+
+    def dex_pair(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        price = p["price_usd"]
+        liq = price * 5e7
+        return {
+            "chainId": "ton",
+            "dexId": p["dex"],
+            "url": f"https://dexscreener.com/ton/{p['pool']}",
+            "pairAddress": p["pool"],
+            "baseToken": {"address": p["token"], "name": p["symbol"], "symbol": p["symbol"]},
+            "quoteToken": {"address": TON_MASTER, "name": "Toncoin", "symbol": "TON"},
+            "priceNative": f"{price / TON_USD:.9f}",
+            "priceUsd": f"{price:.6f}",
+            "liquidity": {"usd": liq, "base": liq / 2 / price, "quote": liq / 2 / TON_USD},
+            "fdv": liq * 8,
+            "marketCap": liq * 7,
+            "volume": {"m5": liq / 100, "h1": liq / 20, "h6": liq / 5, "h24": liq},
+            "priceChange": {"m5": 0.5, "h1": -1.2, "h6": 3.4, "h24": 10.0},
+            "info": {"socials": [{"type": "telegram", "url": f"https://t.me/{p['symbol'].lower()}"}]},
+        }
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.ts = time.monotonic()
+
+    def take(self) -> float:
+        """0 if a token was taken, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class BotAPI:
+    """Fake Bot API: accepts sends / edits and records them per chat.
+
+    Optional misbehaviour, like the real one under load:
+      latency_ms / jitter_ms   added to every send / edit
+      rate_429                 share of send / edit calls answered 429 at random
+      chat_rps / global_rps    flood limits (token buckets, Telegram allows
+                               about 1 msg/s per chat and 30 msg/s per bot);
+                               over the limit -> 429 with the wait as retry_after
+    """
+
+    def __init__(
+        self,
+        market: Market,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after: int = 1,
+        chat_rps: float = 0.0,
+        global_rps: float = 0.0,
+        seed: int = 1,
+    ):
+        self.market = market
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.chat_rps = chat_rps
+        self.global_rps = global_rps
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calls: Dict[str, int] = {}
+            self.rejected: Dict[str, int] = {}
+            self.sends: List[Dict[str, Any]] = []
+            self.first_post: Dict[Tuple[str, int], float] = {}   # (tx hash, chat) -> first alert
+            self.duplicates = 0
+            self.chat_buckets: Dict[int, TokenBucket] = {}
+            self.global_bucket = TokenBucket(self.global_rps, self.global_rps) if self.global_rps > 0 else None
+
+    def handle(self, method: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        m = method.lower()
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if m == "getme":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}}
+        if m == "getupdates":
+            time.sleep(min(1.0, float(params.get("timeout") or 0)))
+            return 200, {"ok": True, "result": []}
+        if m.startswith("send") or m.startswith("edit"):
+            if self.latency or self.jitter:
+                time.sleep(self.latency + self.rnd.uniform(0, self.jitter))
+            wait = self._limited(int(params.get("chat_id") or 0))
+            if wait:
+                with self.lock:
+                    self.rejected[method] = self.rejected.get(method, 0) + 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {wait}",
+                    "parameters": {"retry_after": wait},
+                }
+            return 200, {"ok": True, "result": self._message(m, params, time.time())}
+        return 200, {"ok": True, "result": True}
+
+    def _limited(self, chat_id: int) -> int:
+        """retry_after seconds if this call is refused, else 0."""
+        with self.lock:
+            if self.rate_429 and self.rnd.random() < self.rate_429:
+                return self.retry_after
+            wait = 0.0
+            if self.chat_rps > 0:
+                b = self.chat_buckets.get(chat_id)
+                if b is None:
+                    b = self.chat_buckets[chat_id] = TokenBucket(self.chat_rps, self.chat_rps * 3)
+                wait = b.take()
+            if not wait and self.global_bucket is not None:
+                wait = self.global_bucket.take()
+            return int(wait) + 1 if wait else 0
+
+    def _message(self, m: str, params: Dict[str, Any], now: float) -> Dict[str, Any]:
+        chat_id = int(params.get("chat_id") or 0)
+        text = str(params.get("text") or params.get("caption") or "")
+        with self.lock:
+            if m.startswith("send"):
+                msg_id = self.next_id
+                self.next_id += 1
+            else:
+                msg_id = int(params.get("message_id") or 0)
+            rec = {"chat_id": chat_id, "message_id": msg_id, "method": m, "ts": now, "txs": TX_LINK_RE.findall(text)}
+            self.sends.append(rec)
+            if m.startswith("send"):
+                for h in rec["txs"]:
+                    if (h, chat_id) in self.first_post:
+                        self.duplicates += 1
+                    else:
+                        self.first_post[(h, chat_id)] = now
+        msg = {"message_id": msg_id, "date": int(now), "chat": {"id": chat_id, "type": "channel" if chat_id < 0 else "private"}}
+        if "caption" in params:
+            msg["caption"] = text
+            msg["photo"] = [{"file_id": "bench", "file_unique_id": "bench", "width": 1, "height": 1}]
+        else:
+            msg["text"] = text
+        return msg
+
+    def ordering(self, sends: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Per-chat order check: a chat should get alerts in the order they first went out anywhere."""
+        rank: Dict[str, int] = {}
+        per_chat: Dict[int, List[int]] = {}
+        for s in sends:
+            if not s["method"].startswith("send"):
+                continue
+            for h in s["txs"]:
+                r = rank.setdefault(h, len(rank))
+                per_chat.setdefault(s["chat_id"], []).append(r)
+        inversions = 0
+        worst = 0
+        for seq in per_chat.values():
+            top = -1
+            for r in seq:
+                if r < top:
+                    inversions += 1
+                    worst = max(worst, top - r)
+                top = max(top, r)
+        return {"chats": len(per_chat), "out_of_order": inversions, "max_displacement": worst}
+
+
+def _parse_body(handler: BaseHTTPRequestHandler) -> Dict[str, Any]:
+    n = int(handler.headers.get("Content-Length") or 0)
+    body = handler.rfile.read(n) if n else b""
+    ctype = handler.headers.get("Content-Type") or ""
+    if not body:
+        return {}
+    if ctype.startswith("application/json"):
+        try:
+            js = json.loads(body)
+            return js if isinstance(js, dict) else {}
+        except ValueError:
+            return {}
+    if ctype.startswith("multipart/form-data"):
+        msg = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + ctype.encode() + b"\r\n\r\n" + body)
+        out: Dict[str, Any] = {}
+        for part in msg.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name and not part.get_filename():
+                out[name] = part.get_content() if part.get_content_maintype() == "text" else part.get_payload(decode=True).decode("utf-8", "replace")
+        return out
+    return {k: v[0] for k, v in parse_qs(body.decode("utf-8", "replace")).items()}
+
+
+class MockUpstream:
+    def __init__(self, market: Market, bot_options: Optional[Dict[str, Any]] = None):
+        self.market = market
+        self.bot = BotAPI(market, **(bot_options or {}))
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.window_start = time.time()
+        self.routes = [
+            ("GET", re.compile(r"^/v2/blockchain/accounts/([^/]+)/transactions$"), self.tonapi_account_txs, "tonapi"),
+            ("POST", re.compile(r"^/v2/jettons/_bulk$"), self.tonapi_jettons_bulk, "tonapi"),
+            ("GET", re.compile(r"^/v2/jettons/([^/]+)$"), self.tonapi_jetton, "tonapi"),
+            ("GET", re.compile(r"^/v2/blockchain/masterchain-head$"), self.tonapi_head, "tonapi"),
+            ("GET", re.compile(r"^/v2/blockchain/masterchain/(\d+)/transactions$"), self.tonapi_block_txs, "tonapi"),
+            ("GET", re.compile(r"^/v2/blockchain/transactions/([^/]+)$"), self.tonapi_tx, "tonapi"),
+            ("GET", re.compile(r"^/v2/pools/([^/]+)/trades$"), self.dedust_trades, "dedust"),
+            ("GET", re.compile(r"^/export/dexscreener/v1/latest-block$"), self.ston_latest_block, "ston"),
+            ("GET", re.compile(r"^/export/dexscreener/v1/events$"), self.ston_events, "ston"),
+            ("GET", re.compile(r"^/latest/dex/pairs/ton/([^/]+)$"), self.dex_pair, "dexscreener"),
+            ("GET", re.compile(r"^/latest/dex/tokens/([^/]+)$"), self.dex_token, "dexscreener"),
+            ("GET", re.compile(r"^/ton_price$"), self.ton_price, "ton_price"),
+        ]
+
+    def count(self, upstream: str) -> None:
+        with self.lock:
+            self.requests[upstream] = self.requests.get(upstream, 0) + 1
+
+    # ---------- upstream handlers: (match groups, query, body) -> (status, json) ----------
+    def tonapi_account_txs(self, g, q, _b):
+        limit = int((q.get("limit") or ["10"])[0])
+        p = self.market.by_pool.get(g[0])
+        if p is None or p["dex"] != "stonfi":
+            return 200, {"transactions": []}
+        return 200, {"transactions": [self.market.tonapi_tx(t) for t in self.market.recent(g[0], limit)]}
+
+    def tonapi_jettons_bulk(self, _g, _q, body):
+        ids = body.get("account_ids") or []
+        return 200, {"jettons": [self.market.jetton(self.market.by_token[a]) for a in ids if a in self.market.by_token]}
+
+    def tonapi_jetton(self, g, _q, _b):
+        p = self.market.by_token.get(g[0])
+        return (200, self.market.jetton(p)) if p else (404, {"error": "not found"})
+
+    def tonapi_head(self, _g, _q, _b):
+        return 200, {"seqno": self.market.block_of(time.time()) - 1}
+
+    def tonapi_block_txs(self, g, _q, _b):
+        seqno = int(g[0])
+        if seqno >= self.market.block_of(time.time()):
+            return 404, {"error": "block not found"}
+        trades = [t for t in self.market.in_blocks(seqno, seqno) if t.pool["dex"] == "stonfi"]
+        return 200, {"transactions": [self.market.tonapi_tx(t) for t in trades]}
+
+    def tonapi_tx(self, g, _q, _b):
+        tr = self.market.by_hash.get(g[0])
+        return (200, self.market.tonapi_tx(tr)) if tr else (404, {"error": "not found"})
+
+    def dedust_trades(self, g, q, _b):
+        limit = int((q.get("limit") or ["25"])[0])
+        p = self.market.by_pool.get(g[0])
+        if p is None or p["dex"] != "dedust":
+            return 200, []
+        return 200, [self.market.dedust_trade(t) for t in self.market.recent(g[0], limit)]
+
+    def ston_latest_block(self, _g, _q, _b):
+        now = time.time()
+        return 200, {"block": {"blockNumber": self.market.block_of(now) - 1, "blockTimestamp": int(now)}}
+
+    def ston_events(self, _g, q, _b):
+        lo = int((q.get("fromBlock") or ["0"])[0])
+        hi = int((q.get("toBlock") or ["0"])[0])
+        trades = [t for t in self.market.in_blocks(lo, hi) if t.pool["dex"] == "stonfi"]
+        return 200, {"events": [self.market.ston_event(t) for t in trades]}
+
+    def dex_pair(self, g, _q, _b):
+        p = self.market.by_pool.get(g[0])
+        return 200, {"schemaVersion": "1.0.0", "pairs": [self.market.dex_pair(p)] if p else None}
+
+    def dex_token(self, g, _q, _b):
+        pairs = [self.market.dex_pair(p) for a in g[0].split(",") for p in [self.market.by_token.get(a)] if p]
+        return 200, {"schemaVersion": "1.0.0", "pairs": pairs or None}
+
+    def ton_price(self, _g, _q, _b):
+        return 200, {"the-open-network": {"usd": TON_USD}}
+
+    # ---------- control ----------
+    def reset(self) -> Dict[str, Any]:
+        with self.lock:
+            self.requests = {}
+        self.bot.reset()
+        self.window_start = time.time()
+        return {"window_start": self.window_start}
+
+    def pause(self) -> Dict[str, Any]:
+        self.market.advance()
+        self.market.paused_at = time.time()
+        return {"paused_at": self.market.paused_at}
+
+    def stats(self, detail: bool = False) -> Dict[str, Any]:
+        m = self.market
+        start = self.window_start
+        end = m.paused_at or time.time()
+        with m.lock:
+            window = [t for t in m.by_hash.values() if start <= t.created <= end]
+        buys = [t for t in window if t.is_buy]
+        with self.bot.lock:
+            first_post = dict(self.bot.first_post)
+            sends = [s for s in self.bot.sends if s["ts"] >= start]
+            calls = dict(self.bot.calls)
+            rejected = dict(self.bot.rejected)
+            duplicates = self.bot.duplicates
+        posted_at: Dict[str, float] = {}
+        for (h, _chat), ts in first_post.items():
+            if h not in posted_at or ts < posted_at[h]:
+                posted_at[h] = ts
+        latencies = [posted_at[t.hash] - t.created for t in buys if t.hash in posted_at]
+        with self.lock:
+            requests = dict(self.requests)
+        out = {
+            "window_s": end - start,
+            "trades": len(window),
+            "buys": len(buys),
+            "posted": len(latencies),
+            "duplicates": duplicates,
+            "latencies": sorted(latencies),
+            "requests": requests,
+            "telegram": {
+                "sends": sum(1 for s in sends if s["method"].startswith("send")),
+                "edits": sum(1 for s in sends if s["method"].startswith("edit")),
+                "calls": calls,
+                "rejected_429": rejected,
+                **self.bot.ordering(sends),
+            },
+        }
+        if detail:
+            # per tx: first / last accepted send and how many chats got it
+            posts: Dict[str, Dict[str, Any]] = {}
+            for (h, _chat), ts in first_post.items():
+                p = posts.setdefault(h, {"first": ts, "last": ts, "chats": 0})
+                p["first"], p["last"], p["chats"] = min(p["first"], ts), max(p["last"], ts), p["chats"] + 1
+            out["posts"] = posts
+            out["send_times"] = sorted(s["ts"] for s in sends if s["method"].startswith("send"))
+        return out
+
+    def pools(self) -> List[Dict[str, Any]]:
+        return [{k: p[k] for k in ("pool", "token", "symbol", "dex", "decimals")} for p in self.market.pools]
+
+
+def make_handler(mock: MockUpstream):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, payload: Any) -> None:
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, verb: str) -> None:
+            url = urlsplit(self.path)
+            path, query = url.path, parse_qs(url.query)
+            body = _parse_body(self) if verb == "POST" else {}
+
+            if path.startswith("/_bench/"):
+                name = path[len("/_bench/"):]
+                if name == "stats":
+                    return self._reply(200, mock.stats(detail=(query.get("detail") or ["0"])[0] == "1"))
+                fn = {"pools": mock.pools, "reset": mock.reset, "pause": mock.pause}.get(name)
+                return self._reply(200, fn()) if fn else self._reply(404, {"error": name})
+
+            bot = re.match(r"^/bot([^/]+)/([A-Za-z]+)$", path)
+            if bot:
+                mock.count("telegram")
+                params = {k: v[0] for k, v in query.items()}
+                params.update(body)
+                return self._reply(*mock.bot.handle(bot.group(2), params))
+
+            mock.market.advance()
+            for rverb, rx, fn, upstream in mock.routes:
+                m = rx.match(path)
+                if m and rverb == verb:
+                    mock.count(upstream)
+                    return self._reply(*fn(m.groups(), query, body))
+            self._reply(404, {"error": f"no mock for {verb} {path}"})
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+    return Handler
+
+
+def serve(
+    pools: int,
+    rate: float,
+    dedust_share: float = 0.5,
+    seed: int = 1,
+    port: int = 0,
+    host: str = "127.0.0.1",
+    bot_options: Optional[Dict[str, Any]] = None,
+) -> Tuple[ThreadingHTTPServer, MockUpstream]:
+    mock = MockUpstream(Market(pools, rate, dedust_share=dedust_share, seed=seed), bot_options)
+    server = ThreadingHTTPServer((host, port), make_handler(mock))
+    server.daemon_threads = True
+    return server, mock
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pools", type=int, default=50)
+    ap.add_argument("--rate", type=float, default=20.0, help="trades/s over all pools")
+    ap.add_argument("--dedust-share", type=float, default=0.5, help="fraction of pools on DeDust")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--port", type=int, default=0)
+    ap.add_argument("--tg-latency-ms", type=float, default=0.0, help="Bot API: added latency per send / edit")
+    ap.add_argument("--tg-jitter-ms", type=float, default=0.0, help="Bot API: extra random latency, 0..N ms")
+    ap.add_argument("--tg-429-rate", type=float, default=0.0, help="Bot API: share of sends / edits refused with 429")
+    ap.add_argument("--tg-retry-after", type=int, default=1, help="Bot API: retry_after of the random 429s")
+    ap.add_argument("--tg-chat-rps", type=float, default=0.0, help="Bot API: per-chat flood limit, msgs/s (0 = none)")
+    ap.add_argument("--tg-global-rps", type=float, default=0.0, help="Bot API: per-bot flood limit, msgs/s (0 = none)")
+    args = ap.parse_args()
+
+    bot_options = {
+        "latency_ms": args.tg_latency_ms,
+        "jitter_ms": args.tg_jitter_ms,
+        "rate_429": args.tg_429_rate,
+        "retry_after": args.tg_retry_after,
+        "chat_rps": args.tg_chat_rps,
+        "global_rps": args.tg_global_rps,
+        "seed": args.seed,
+    }
+    server, _mock = serve(args.pools, args.rate, args.dedust_share, args.seed, args.port, bot_options=bot_options)
+    print(json.dumps({"port": server.server_address[1]}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,373 @@
+"""Replay a CAPTURE_PATH log through the trackers and diff the posted buys.
+
+The capture (see capture.py) starts with a snapshot of data / state / meta
+and the detection settings, followed by every raw upstream response and the
+outcome of every buy production handled. The replay:
+
+- rebuilds data.json / state.json / meta.json from the snapshot in a temp
+  dir and applies the captured settings through the environment;
+- runs main on a virtual clock that starts at the capture start (main,
+  buytrace, ttlcache and volume read it instead of the real clock);
+- serves every http_get / http_post from the capture: the response recorded
+  for the same method + URL + params / body, taken as late as possible but
+  never after the virtual "now". If that exact request was never made in
+  production, it falls back to the latest response for the same URL.
+  If nothing matches, the call fails the way a network error would;
+- sends alerts to the fake Bot API of bench/mock_upstream.py (--pools 0);
+- compares the buys posted in the replay, per tx, with the buys production
+  posted in the same time span.
+
+--speed 0 (default) is stepped: the clock jumps to the next job tick and
+each tick runs to completion before the next one, with no recorded
+latency. The same capture always gives the same result, so this mode is
+the one to profile under. --speed 1 replays in real time with the recorded
+upstream latency. --speed 10 does the same ten times faster. The paced
+modes keep the production timing, including overlapping and skipped ticks.
+
+  CAPTURE_PATH=capture.jsonl.gz python main.py          # in production
+  python bench/replay.py capture.jsonl.gz --out replay.json
+  python bench/replay.py capture.jsonl.gz --speed 10 --duration 600
+
+Stream mode cannot be replayed, since SSE is not captured. It runs as
+polling, and the captured verification polls feed it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import heapq
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time as _time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from capture import read_capture  # noqa: E402
+
+POSTED = ("posted", "burst")
+
+
+class VirtualClock:
+    """Stands in for the `time` module of the modules under replay."""
+
+    def __init__(self, start: float, speed: float):
+        self.start = start
+        self.speed = speed
+        self.now = start          # stepped mode
+        self._real0 = _time.time()
+
+    def time(self) -> float:
+        if self.speed <= 0:
+            return self.now
+        return self.start + (_time.time() - self._real0) * self.speed
+
+    def monotonic(self) -> float:
+        return self.time()
+
+    def sleep(self, seconds: float) -> None:
+        _time.sleep(seconds / self.speed if self.speed > 0 else 0)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(_time, name)
+
+
+def _key(method: str, url: str, params: Any, body: Any) -> Tuple[str, str, str, str]:
+    dump = lambda v: json.dumps(v, sort_keys=True, default=str) if v else ""  # noqa: E731
+    return method, url, dump(params), dump(body)
+
+
+class RecordedUpstreams:
+    """Captured responses indexed by request, served by virtual time."""
+
+    def __init__(self, records: List[Dict[str, Any]], clock: VirtualClock, latency: bool):
+        self.clock = clock
+        self.latency = latency
+        self.exact: Dict[Tuple[str, str, str, str], Tuple[List[float], List[Dict[str, Any]]]] = {}
+        self.by_url: Dict[Tuple[str, str], Tuple[List[float], List[Dict[str, Any]]]] = {}
+        for rec in records:
+            for index, key in ((self.exact, _key(rec["m"], rec["url"], rec.get("q"), rec.get("j"))), (self.by_url, (rec["m"], rec["url"]))):
+                ts, recs = index.setdefault(key, ([], []))
+                ts.append(rec["t"])
+                recs.append(rec)
+        self.served: Counter = Counter()
+
+    @staticmethod
+    def _at(entry: Optional[Tuple[List[float], List[Dict[str, Any]]]], now: float) -> Optional[Dict[str, Any]]:
+        if not entry:
+            return None
+        i = bisect.bisect_right(entry[0], now)
+        return entry[1][i - 1] if i else None
+
+    def http(self, upstream: str, call, url: str, kwargs: Dict[str, Any]):
+        import requests
+
+        method = call.__name__.upper()
+        now = self.clock.time()
+        rec = self._at(self.exact.get(_key(method, url, kwargs.get("params"), kwargs.get("json"))), now)
+        how = "exact"
+        if rec is None:
+            rec = self._at(self.by_url.get((method, url)), now)
+            how = "same_url"
+        if rec is None:
+            self.served[f"{upstream}:missing"] += 1
+            raise requests.ConnectionError(f"replay: no captured response for {method} {url}")
+        self.served[f"{upstream}:{how}"] += 1
+        if self.latency and rec.get("dt"):
+            _time.sleep(rec["dt"] / self.clock.speed)
+        if "err" in rec:
+            raise getattr(requests.exceptions, rec["err"], requests.RequestException)(f"replay: captured {rec['err']}")
+        res = requests.Response()
+        res.status_code = rec["st"]
+        res._content = (rec.get("body") or "").encode("utf-8")
+        res.encoding = "utf-8"
+        res.url = url
+        res.headers["Content-Type"] = "application/json"
+        return res
+
+
+def load_session(path: str, session: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(snapshot, http records, production buy records) of the n-th bot start in the file."""
+    snapshot: Optional[Dict[str, Any]] = None
+    http: List[Dict[str, Any]] = []
+    buys: List[Dict[str, Any]] = []
+    seen = -1
+    for rec in read_capture(path):
+        kind = rec.get("k")
+        if kind == "snapshot":
+            seen += 1
+            if seen > session:
+                break
+            if seen == session:
+                snapshot = rec
+            continue
+        if seen != session:
+            continue
+        if kind == "http":
+            http.append(rec)
+        elif kind == "buy":
+            buys.append(rec)
+    if snapshot is None:
+        raise SystemExit(f"{path}: no session {session} (found {seen + 1})")
+    http.sort(key=lambda r: r["t"])
+    return snapshot, http, buys
+
+
+def replay_env(settings: Dict[str, Any], bot_base: str) -> Dict[str, str]:
+    env = {
+        "BOT_TOKEN": "1:replay",
+        "ADMIN_ID": "1",
+        "PORT": "0",
+        "TELEGRAM_API_BASE": bot_base,
+        "HEADER_IMAGE_PATH": "",
+        "TONAPI_KEY": "replay" if settings.get("TONAPI_KEY") else "",
+    }
+    for name, value in settings.items():
+        if name == "TONAPI_KEY":
+            continue
+        env[name] = ("1" if value else "0") if isinstance(value, bool) else str(value)
+    if env.get("DETECTION_MODE") == "stream":
+        env["DETECTION_MODE"] = "poll"
+    return env
+
+
+def write_files(snapshot: Dict[str, Any]) -> None:
+    for name, key in (("data.json", "data"), ("state.json", "state"), ("meta.json", "meta")):
+        with open(name, "w", encoding="utf-8") as f:
+            json.dump(snapshot.get(key) or {}, f)
+
+
+def _jobs(main) -> List[Tuple[Any, float, float]]:
+    """(job, interval, first) as main() schedules the detection side."""
+    jobs = [
+        (main.data_flush_job, main.DATA_FLUSH_INTERVAL, main.DATA_FLUSH_INTERVAL),
+        (main.ton_price_cache_job, 60, 1),
+        (main.meta_warm_job, main.META_WARM_INTERVAL, 1),
+        (main.ston_tracker_job, main.STON_POLL_INTERVAL, 2),
+        (main.dedust_tracker_job, main.DEDUST_POLL_INTERVAL, 5),
+        (main.memepad_activation_job, main.MEMEPAD_ACTIVATION_INTERVAL, 10),
+        (main.blum_early_tracker_job, main.BLUM_POLL_INTERVAL, 12),
+    ]
+    if main.DETECTION_MODE == "blocks":
+        jobs.append((main.block_scan_job, main.BLOCK_SCAN_INTERVAL, 2))
+    return jobs
+
+
+async def run_stepped(runners, context, clock: VirtualClock, end: float) -> None:
+    heap = [(clock.start + first, i) for i, (_r, _interval, first) in enumerate(runners)]
+    heapq.heapify(heap)
+    while heap:
+        at, i = heapq.heappop(heap)
+        if at > end:
+            break
+        clock.now = at
+        runner, interval, _first = runners[i]
+        await runner.tick(context)
+        await asyncio.sleep(0)  # let fire-and-forget work (alert edits) start
+        heapq.heappush(heap, (at + interval, i))
+
+
+async def run_paced(runners, context, clock: VirtualClock, end: float) -> None:
+    from run_bench import _every
+
+    tasks = [asyncio.create_task(_every(r, context, interval / clock.speed, first / clock.speed)) for r, interval, first in runners]
+    try:
+        while clock.time() < end:
+            await asyncio.sleep(min(1.0, max(0.01, (end - clock.time()) / clock.speed)))
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def replay(snapshot, http, clock: VirtualClock, end: float, latency: bool) -> Dict[str, Any]:
+    import buytrace
+    import ttlcache
+    import volume
+
+    for mod in (buytrace, ttlcache, volume):
+        mod.time = clock
+    import main
+    from jobrunner import JobRunner
+
+    main.time = clock
+    upstreams = RecordedUpstreams(http, clock, latency)
+    main._timed_http = upstreams.http
+
+    buys: List[Dict[str, Any]] = []
+    main.BUY_TRACER.subscribe(lambda trace, outcome, extra: buys.append({
+        "outcome": outcome, "utime": trace.get("utime"), "sent": trace.get("sent"), **extra,
+    }))
+
+    main.load_data()
+    main.load_state()
+    main.load_meta()
+    main.load_volume()
+    app = main.application_builder().build()
+    await app.initialize()
+    context = SimpleNamespace(bot=app.bot, application=app, job=None)
+    runners = []
+    for fn, interval, first in _jobs(main):
+        runner = main.JOB_RUNNERS[fn.__name__] = JobRunner(fn.__name__, fn, interval, main.JOB_METRICS)
+        runners.append((runner, interval, first))
+
+    cpu0, wall0 = _time.process_time(), _time.perf_counter()
+    try:
+        if clock.speed <= 0:
+            await run_stepped(runners, context, clock, end)
+        else:
+            await run_paced(runners, context, clock, end)
+        # alerts still being enriched / edited
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        if pending:
+            await asyncio.wait(pending, timeout=10)
+    finally:
+        await app.shutdown()
+    return {
+        "buys": buys,
+        "served": dict(sorted(upstreams.served.items())),
+        "cpu_s": _time.process_time() - cpu0,
+        "wall_s": _time.perf_counter() - wall0,
+        "jobs": {name: r.stats() for name, r in main.JOB_RUNNERS.items()},
+    }
+
+
+def _posted(buys: List[Dict[str, Any]]) -> Counter:
+    return Counter(b.get("tx") for b in buys if b.get("outcome") in POSTED and b.get("tx"))
+
+
+def _latency(buys: List[Dict[str, Any]]) -> Dict[str, float]:
+    lat = sorted(b["sent"] - b["utime"] for b in buys if b.get("outcome") in POSTED and b.get("sent") and b.get("utime"))
+    if not lat:
+        return {}
+    pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 3)  # noqa: E731
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "n": len(lat)}
+
+
+def diff(prod: List[Dict[str, Any]], rep: List[Dict[str, Any]]) -> Dict[str, Any]:
+    p, r = _posted(prod), _posted(rep)
+    last_prod = {b.get("tx"): b.get("outcome") for b in prod if b.get("tx")}
+    last_rep = {b.get("tx"): b.get("outcome") for b in rep if b.get("tx")}
+    changed = [
+        {"tx": tx, "production": last_prod[tx], "replay": last_rep[tx]}
+        for tx in sorted(set(last_prod) & set(last_rep))
+        if (last_prod[tx] in POSTED) != (last_rep[tx] in POSTED)
+    ]
+    return {
+        "production": {"posted": len(p), "duplicates": sum(n - 1 for n in p.values() if n > 1),
+                       "outcomes": dict(Counter(b.get("outcome") for b in prod)), "latency_s": _latency(prod)},
+        "replay": {"posted": len(r), "duplicates": sum(n - 1 for n in r.values() if n > 1),
+                   "outcomes": dict(Counter(b.get("outcome") for b in rep)), "latency_s": _latency(rep)},
+        "matched": len(set(p) & set(r)),
+        "missing": sorted(set(p) - set(r))[:50],
+        "extra": sorted(set(r) - set(p))[:50],
+        "outcome_changed": changed[:50],
+    }
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("capture", help="CAPTURE_PATH file (gzip JSONL)")
+    ap.add_argument("--session", type=int, default=0, help="which bot start in the file (0 = first)")
+    ap.add_argument("--speed", type=float, default=0.0, help="0 = stepped / deterministic, 1 = real time, N = N times faster")
+    ap.add_argument("--duration", type=float, default=0.0, help="replay only the first N captured seconds")
+    ap.add_argument("--no-latency", action="store_true", help="paced modes: do not sleep the recorded upstream latency")
+    ap.add_argument("--strict", action="store_true", help="exit 1 when posted buys differ from production")
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+    capture_path = os.path.abspath(args.capture)
+    out_path = os.path.abspath(args.out) if args.out else ""
+
+    snapshot, http, prod_buys = load_session(capture_path, args.session)
+    start = snapshot["t"]
+    end = max([start] + [r["t"] for r in http])
+    if args.duration > 0:
+        end = min(end, start + args.duration)
+    prod_buys = [b for b in prod_buys if b["t"] <= end]
+
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "mock_upstream.py"), "--pools", "0"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        port = json.loads(mock.stdout.readline())["port"]
+        os.environ.update(replay_env(snapshot.get("settings") or {}, f"http://127.0.0.1:{port}"))
+        os.chdir(tempfile.mkdtemp(prefix="spyton-replay-"))
+        write_files(snapshot)
+        clock = VirtualClock(start, args.speed)
+        res = asyncio.run(replay(snapshot, http, clock, end, latency=args.speed > 0 and not args.no_latency))
+    finally:
+        mock.terminate()
+        mock.wait(10)
+
+    result = {
+        "capture": capture_path,
+        "session": args.session,
+        "speed": args.speed,
+        "captured_s": round(end - start, 1),
+        "http_records": len(http),
+        **diff(prod_buys, res["buys"]),
+        "served": res["served"],
+        "cpu_s": round(res["cpu_s"], 3),
+        "wall_s": round(res["wall_s"], 3),
+        "jobs": {n: {k: st[k] for k in ("runs", "errors", "skipped")} for n, st in res["jobs"].items()},
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.strict and (result["missing"] or result["extra"] or result["replay"]["duplicates"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
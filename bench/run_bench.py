@@ -0,0 +1,276 @@
+"""End-to-end detection benchmark against local mocks of every upstream.
+
+Starts bench/mock_upstream.py in a subprocess (so its CPU is not counted),
+writes a data.json with the mock's pools into a temp dir, points main.py at
+the mock through its *_BASE env settings and runs the real jobs through
+the same JobRunners main() uses (price cache, metadata warm-up, data
+flush, STON / DeDust trackers, block scanner in blocks mode) for
+--duration seconds after a --warmup. Then trade generation stops, the bot gets --settle seconds to
+catch up and the mock reports what the fake Bot API received.
+
+Result (stdout and --out), one JSON object:
+  buys_per_s          buys posted per second of the window
+  latency_s           p50 / p95 / p99 / max, trade landed -> alert received
+  missed, duplicates  buys in the window never posted / posted twice
+  requests_per_buy    upstream calls (per upstream and total) per posted buy
+  cpu_s, cpu_ms_per_buy, peak_rss_mb   bot process only
+
+  python bench/run_bench.py --pools 100 --rate 20 --duration 60 --out base.json
+  python bench/run_bench.py --pools 100 --rate 20 --duration 60 --compare base.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+
+def _call(base: str, path: str, method: str = "GET") -> Any:
+    req = urllib.request.Request(base + path, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(req, timeout=30) as r:
+        return json.loads(r.read())
+
+
+def _pct(xs: List[float], q: float) -> float:
+    if not xs:
+        return 0.0
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))]
+
+
+def start_mock(args) -> subprocess.Popen:
+    cmd = [
+        sys.executable, os.path.join(HERE, "mock_upstream.py"),
+        "--pools", str(args.pools), "--rate", str(args.rate),
+        "--dedust-share", str(args.dedust_share), "--seed", str(args.seed),
+    ]
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+
+
+def bot_env(base: str, args) -> Dict[str, str]:
+    return {
+        "BOT_TOKEN": "1:bench",
+        "ADMIN_ID": "1",
+        "PORT": "0",
+        "TELEGRAM_API_BASE": base,
+        "TONAPI_BASE": base,
+        "TONAPI_KEY": "bench" if args.ston_source != "export" else "",
+        "DEDUST_API_BASE": base,
+        "STON_BASE": base,
+        "DEXSCREENER_BASE": base,
+        "TON_PRICE_API": base + "/ton_price",
+        "STON_SOURCE_MODE": "race" if args.ston_source == "race" else "auto",
+        "DETECTION_MODE": args.detection,
+        "MIN_USD_BUY": "0",
+        "MEMEPAD_ACTIVATION_ENABLED": "0",
+        "BLUM_EARLY_ENABLED": "0",
+        "HEADER_IMAGE_PATH": "",
+    }
+
+
+def write_data(pools: List[Dict[str, Any]]) -> None:
+    pairs = {
+        p["pool"]: {
+            "symbol": p["symbol"],
+            "token_address": p["token"],
+            "dex": p["dex"],
+            "dex_label": "DeDust" if p["dex"] == "dedust" else "STON.fi",
+            "ton_leg": None,
+            "pool": p["pool"],
+            "buyers": {},
+        }
+        for p in pools
+    }
+    with open("data.json", "w", encoding="utf-8") as f:
+        json.dump({"pairs": pairs, "watch": {}, "forced_ranks": {}, "group_mirrors": {}}, f)
+
+
+async def _every(runner, context, interval: float, first: float) -> None:
+    """What job_queue.run_repeating does for run_job: a tick per interval, never awaited."""
+    await asyncio.sleep(first)
+    ticks = set()
+    while True:
+        t = asyncio.create_task(runner.tick(context))
+        ticks.add(t)
+        t.add_done_callback(ticks.discard)
+        await asyncio.sleep(interval)
+
+
+async def run_bot(base: str, args) -> Dict[str, Any]:
+    import main
+    from jobrunner import JobRunner
+
+    main.load_data()
+    main.load_state()
+    main.load_meta()
+    main.load_volume()
+    main.capture_snapshot()  # CAPTURE_PATH set: the run can be fed to bench/replay.py
+
+    app = main.application_builder().build()
+    await app.initialize()
+    context = SimpleNamespace(bot=app.bot, application=app, job=None)
+
+    # same jobs / intervals as main(); JobRunner directly, so the PTB
+    # job-queue extra (APScheduler) is not needed to run the bench
+    jobs = [
+        (main.data_flush_job, main.DATA_FLUSH_INTERVAL, main.DATA_FLUSH_INTERVAL),
+        (main.ton_price_cache_job, 60, 0),
+        (main.meta_warm_job, main.META_WARM_INTERVAL, 0),
+        (main.ston_tracker_job, main.STON_POLL_INTERVAL, 1),
+        (main.dedust_tracker_job, main.DEDUST_POLL_INTERVAL, 1),
+    ]
+    if main.DETECTION_MODE == "blocks":
+        jobs.append((main.block_scan_job, main.BLOCK_SCAN_INTERVAL, 1))
+    tasks = []
+    for fn, interval, first in jobs:
+        runner = main.JOB_RUNNERS[fn.__name__] = JobRunner(fn.__name__, fn, interval, main.JOB_METRICS)
+        tasks.append(asyncio.create_task(_every(runner, context, interval, first)))
+
+    try:
+        await asyncio.sleep(args.warmup)
+        _call(base, "/_bench/reset", "POST")
+        cpu0 = time.process_time()
+        await asyncio.sleep(args.duration)
+        _call(base, "/_bench/pause", "POST")
+        await asyncio.sleep(args.settle)
+        cpu = time.process_time() - cpu0
+        stats = _call(base, "/_bench/stats")
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await app.shutdown()
+    stats["cpu_s"] = cpu
+    stats["jobs"] = {name: r.stats() for name, r in main.JOB_RUNNERS.items()}
+    return stats
+
+
+def report(stats: Dict[str, Any], args) -> Dict[str, Any]:
+    lat = stats["latencies"]
+    posted = stats["posted"]
+    requests = {k: v for k, v in stats["requests"].items() if k != "telegram"}
+    per_buy = {k: round(v / max(1, posted), 2) for k, v in sorted(requests.items())}
+    per_buy["total"] = round(sum(requests.values()) / max(1, posted), 2)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    return {
+        "params": {
+            "pools": args.pools, "rate": args.rate, "duration": args.duration, "warmup": args.warmup,
+            "settle": args.settle, "dedust_share": args.dedust_share, "ston_source": args.ston_source,
+            "detection": args.detection, "seed": args.seed,
+        },
+        "python": platform.python_version(),
+        "trades": stats["trades"],
+        "buys": stats["buys"],
+        "posted": posted,
+        "buys_per_s": round(posted / max(1e-9, args.duration), 3),
+        "latency_s": {
+            "p50": round(_pct(lat, 0.50), 3),
+            "p95": round(_pct(lat, 0.95), 3),
+            "p99": round(_pct(lat, 0.99), 3),
+            "max": round(lat[-1], 3) if lat else 0.0,
+        },
+        "missed": stats["buys"] - posted,
+        "duplicates": stats["duplicates"],
+        "requests_per_buy": per_buy,
+        "telegram": stats["telegram"],
+        "cpu_s": round(stats["cpu_s"], 3),
+        "cpu_ms_per_buy": round(stats["cpu_s"] * 1000 / max(1, posted), 3),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "jobs": {
+            name: {k: (round(v, 4) if isinstance(v, float) else v) for k, v in st.items() if k in ("runs", "avg_s", "max_s", "skipped", "errors")}
+            for name, st in stats["jobs"].items()
+        },
+    }
+
+
+# metric -> True when higher is better
+COMPARED = {
+    "buys_per_s": True,
+    "latency_s.p50": False,
+    "latency_s.p95": False,
+    "latency_s.p99": False,
+    "missed": False,
+    "duplicates": False,
+    "requests_per_buy.total": False,
+    "cpu_ms_per_buy": False,
+    "peak_rss_mb": False,
+}
+
+
+def compare(res: Dict[str, Any], base: Dict[str, Any]) -> Dict[str, Any]:
+    def get(d, dotted):
+        for k in dotted.split("."):
+            d = (d or {}).get(k)
+        return d
+
+    out = {}
+    for key, higher_better in COMPARED.items():
+        a, b = get(base, key), get(res, key)
+        if a is None or b is None:
+            continue
+        change = (b - a) / a * 100 if a else 0.0
+        better = (b >= a) if higher_better else (b <= a)
+        out[key] = {"base": a, "now": b, "change_pct": round(change, 1), "ok": better or abs(change) < 5}
+    return out
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pools", type=int, default=50)
+    ap.add_argument("--rate", type=float, default=10.0, help="trades/s over all pools (buys are ~70%%)")
+    ap.add_argument("--duration", type=float, default=60.0, help="measured window, seconds")
+    ap.add_argument("--warmup", type=float, default=10.0)
+    ap.add_argument("--settle", type=float, default=10.0, help="time to catch up after trades stop")
+    ap.add_argument("--dedust-share", type=float, default=0.5)
+    ap.add_argument("--ston-source", choices=("fast", "export", "race"), default="fast")
+    ap.add_argument("--detection", choices=("poll", "blocks"), default="poll")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="", help="write the JSON result here")
+    ap.add_argument("--compare", default="", help="baseline JSON from an earlier --out")
+    args = ap.parse_args()
+    out_path = os.path.abspath(args.out) if args.out else ""
+    compare_path = os.path.abspath(args.compare) if args.compare else ""
+
+    mock = start_mock(args)
+    try:
+        port = json.loads(mock.stdout.readline())["port"]
+        base = f"http://127.0.0.1:{port}"
+        pools = _call(base, "/_bench/pools")
+
+        os.environ.update(bot_env(base, args))
+        if os.environ.get("CAPTURE_PATH"):
+            os.environ["CAPTURE_PATH"] = os.path.abspath(os.environ["CAPTURE_PATH"])
+        workdir = tempfile.mkdtemp(prefix="spyton-bench-")
+        os.chdir(workdir)
+        write_data(pools)
+
+        res = report(asyncio.run(run_bot(base, args)), args)
+    finally:
+        mock.terminate()
+        mock.wait(10)
+
+    if compare_path:
+        with open(compare_path, encoding="utf-8") as f:
+            res["compare"] = compare(res, json.load(f))
+    text = json.dumps(res, indent=2)
+    print(text)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
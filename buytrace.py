@@ -0,0 +1,189 @@
+"""Per-buy latency traces: on-chain time -> fetched -> parsed -> deduped -> sent -> edited.
+
+A trace is a plain dict started by the detection path (source, via, utime,
+lt, fetched) and stamped along the pipeline with wall-clock times. finish()
+turns it into:
+- histogram observations per (source, via, stage): seconds from the on-chain
+  utime to that stage (so "sent" answers "how long after the swap landed
+  did the alert appear")
+- a rolling window of utime -> sent per source/via for p50/p95/p99 in /status
+- optionally one JSONL line, written by a background thread, for offline
+  analysis of slow outliers (log_min filters to traces at least that slow)
+
+Traces without a utime still log, but only the stage deltas relative to
+"fetched" can be derived from them.
+"""
+
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+STAGES = ("fetched", "parsed", "deduped", "sent", "edited")
+
+# seconds after the swap landed; detection normally takes a few seconds, outliers minutes
+LATENCY_BUCKETS = (0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 120.0, 300.0)
+
+
+def event_utime(obj: Dict[str, Any]) -> Optional[float]:
+    """Unix time of a tx / trade / event payload (seconds, ms or ISO 8601), else None."""
+    if not isinstance(obj, dict):
+        return None
+    v: Any = None
+    for k in ("utime", "blockTimestamp", "timestamp", "time", "createdAt", "created_at"):
+        if obj.get(k) not in (None, ""):
+            v = obj[k]
+            break
+    if v is None and isinstance(obj.get("block"), dict):
+        v = obj["block"].get("blockTimestamp")
+    if v is None:
+        return None
+    if isinstance(v, str) and not v.replace(".", "", 1).isdigit():
+        try:
+            return datetime.fromisoformat(v.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    try:
+        t = float(v)
+    except (TypeError, ValueError):
+        return None
+    if t > 1e12:  # milliseconds
+        t /= 1000.0
+    return t if t > 0 else None
+
+
+def mark(trace: Optional[Dict[str, Any]], stage: str, ts: Optional[float] = None) -> None:
+    """Stamp a stage once (first time wins). No-op without a trace."""
+    if trace is not None and stage not in trace:
+        trace[stage] = time.time() if ts is None else ts
+
+
+def _pctl(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    arr = sorted(values)
+    return arr[min(len(arr) - 1, int(q * len(arr)))]
+
+
+class BuyTracer:
+    def __init__(self, registry: Any = None, log_path: str = "", log_min: float = 0.0, window: int = 500):
+        self.hist = None
+        if registry is not None:
+            self.hist = registry.histogram(
+                "buy_latency_seconds",
+                "Seconds from the on-chain swap to each pipeline stage",
+                ("source", "via", "stage"),
+                LATENCY_BUCKETS,
+            )
+        self.log_path = log_path
+        self.log_min = float(log_min)
+        self.window = max(10, int(window))
+        self._recent: Dict[Tuple[str, str], Deque[float]] = {}
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=10000)
+        self._writer: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[Dict[str, Any], str, Dict[str, Any]], None]] = []
+        self.finished = 0
+        self.logged = 0
+        self.log_dropped = 0
+
+    def start(
+        self,
+        source: str,
+        via: str = "poll",
+        utime: Any = None,
+        lt: Any = None,
+        fetched: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        trace: Dict[str, Any] = {"source": source, "via": via or "poll"}
+        try:
+            ut = float(utime) if utime is not None else 0.0
+        except (TypeError, ValueError):
+            ut = 0.0
+        if ut > 0:
+            trace["utime"] = ut
+        if lt:
+            trace["lt"] = lt
+        if fetched:
+            trace["fetched"] = fetched
+        return trace
+
+    def finish(self, trace: Optional[Dict[str, Any]], outcome: str = "posted", **extra: Any) -> None:
+        """Record a trace once (histograms, rolling window, JSONL)."""
+        if trace is None or trace.get("done"):
+            return
+        trace["done"] = True
+        self.finished += 1
+        source, via = trace.get("source") or "?", trace.get("via") or "poll"
+        ut = trace.get("utime")
+        if ut:
+            if self.hist is not None:
+                for stage in STAGES:
+                    if stage in trace:
+                        self.hist.observe(max(0.0, trace[stage] - ut), source, via, stage)
+            if "sent" in trace:
+                dq = self._recent.get((source, via))
+                if dq is None:
+                    dq = self._recent[(source, via)] = deque(maxlen=self.window)
+                dq.append(max(0.0, trace["sent"] - ut))
+        if self.log_path:
+            self._log(trace, outcome, extra)
+        for fn in self._listeners:
+            fn(trace, outcome, extra)
+
+    def subscribe(self, fn: Callable[[Dict[str, Any], str, Dict[str, Any]], None]) -> None:
+        """fn(trace, outcome, extra) for every finished trace."""
+        self._listeners.append(fn)
+
+    def _log(self, trace: Dict[str, Any], outcome: str, extra: Dict[str, Any]) -> None:
+        base = trace.get("utime") or trace.get("fetched")
+        end = trace.get("sent") or trace.get("deduped")
+        total = (end - base) if base and end else None
+        if self.log_min > 0 and (total is None or total < self.log_min):
+            return
+        rec = {k: v for k, v in trace.items() if k != "done"}
+        rec["outcome"] = outcome
+        rec["total_s"] = round(total, 3) if total is not None else None
+        if base:
+            rec["deltas"] = {s: round(trace[s] - base, 3) for s in STAGES if s in trace}
+        rec.update(extra)
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="buytrace-writer", daemon=True)
+            self._writer.start()
+        try:
+            self._queue.put_nowait(json.dumps(rec, ensure_ascii=False, default=str))
+        except queue.Full:
+            self.log_dropped += 1
+
+    def _write_loop(self) -> None:
+        while True:
+            lines = [self._queue.get()]
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                self.logged += len(lines)
+            except OSError:
+                self.log_dropped += len(lines)
+
+    def percentiles(self) -> Dict[Tuple[str, str], Dict[str, float]]:
+        out = {}
+        for key, dq in sorted(self._recent.items()):
+            vals = list(dq)
+            out[key] = {"p50": _pctl(vals, 0.5), "p95": _pctl(vals, 0.95), "p99": _pctl(vals, 0.99), "n": len(vals)}
+        return out
+
+    def summary(self) -> str:
+        parts = []
+        for (source, via), p in self.percentiles().items():
+            name = source if via == "poll" else f"{source}/{via}"
+            parts.append(f"{name} p50 {p['p50']:.1f}s / p95 {p['p95']:.1f}s / p99 {p['p99']:.1f}s (n={p['n']})")
+        return " | ".join(parts) if parts else "no samples"
@@ -0,0 +1,128 @@
+"""Append-only capture of raw upstream traffic, for offline replay.
+
+With CAPTURE_PATH set, every http_get / http_post response (upstream,
+method, URL, params / JSON body, status, raw body, latency) and every
+finished buy trace (tx, pair, outcome) is written to a gzip-compressed
+JSONL file, one record per line, stamped with wall-clock time. A snapshot
+of data / state / meta and the detection settings goes in first, so
+bench/replay.py can rebuild the bot as it was and feed the same responses
+through the trackers again.
+
+Records are queued and written by a background thread in batches. Each
+batch is its own gzip member appended to the file, so the file is always
+readable up to the last complete batch, even after a crash, and restarts
+simply keep appending. Request headers (API keys) are never recorded.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class CaptureLog:
+    def __init__(self, path: str = "", batch_seconds: float = 1.0, max_queue: int = 50000):
+        self.path = path
+        self.batch_seconds = max(0.05, float(batch_seconds))
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max_queue)
+        self._writer: Optional[threading.Thread] = None
+        self.records = 0
+        self.dropped = 0
+        self.bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def http(
+        self,
+        upstream: str,
+        method: str,
+        url: str,
+        kwargs: Dict[str, Any],
+        started: float,
+        dt: float,
+        res: Any = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        rec: Dict[str, Any] = {"t": started, "k": "http", "up": upstream, "m": method, "url": url, "dt": round(dt, 4)}
+        if kwargs.get("params"):
+            rec["q"] = kwargs["params"]
+        if kwargs.get("json") is not None:
+            rec["j"] = kwargs["json"]
+        if error is not None:
+            rec["err"] = type(error).__name__
+        else:
+            rec["st"] = res.status_code
+            rec["body"] = res.text
+        self._put(rec)
+
+    def event(self, kind: str, **fields: Any) -> None:
+        rec = {"t": time.time(), "k": kind}
+        rec.update(fields)
+        self._put(rec)
+
+    def _put(self, rec: Dict[str, Any]) -> None:
+        if not self.path:
+            return
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="capture-writer", daemon=True)
+            self._writer.start()
+        try:
+            self._queue.put_nowait(json.dumps(rec, ensure_ascii=False, separators=(",", ":"), default=str))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self) -> None:
+        while True:
+            lines = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_seconds
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    lines.append(self._queue.get(timeout=left))
+                except queue.Empty:
+                    break
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            try:
+                with open(self.path, "ab") as f:
+                    f.write(gzip.compress(data, compresslevel=6))
+                self.records += len(lines)
+                self.bytes += len(data)
+            except OSError:
+                self.dropped += len(lines)
+
+    def summary(self) -> str:
+        if not self.path:
+            return "off"
+        return f"{self.path}: {self.records} records ({self.bytes / 1048576:.1f} MiB raw), {self.dropped} dropped"
+
+
+def read_capture(path: str) -> Iterator[Dict[str, Any]]:
+    """Records of a capture file in write order; stops quietly at a torn tail."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    buf = b""
+    while raw:
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            buf += d.decompress(raw)
+        except zlib.error:
+            break
+        if not d.eof:
+            break  # last member incomplete
+        raw = d.unused_data
+    lines: List[bytes] = buf.split(b"\n")
+    for line in lines:
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
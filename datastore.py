@@ -0,0 +1,236 @@
+"""Versioned copy-on-write store for data.json.
+
+Readers take the current root (store.data) and treat it as read-only: a
+root is never modified after it has been published, so a job can keep
+iterating an older snapshot while others write, without locks and without
+seeing half-applied changes.
+
+Writers go through one serialized writer (a lock) and never touch a
+published dict:
+- path operations (set / incr / merge / delete) copy only the dicts along
+  the path (structural sharing: one buyer update copies root, "pairs", the
+  pair record and its "buyers" dict, nothing else);
+- edit() hands out a deep copy of the root for multi-field admin changes
+  and publishes it when the block exits (no awaits inside the block).
+
+Every commit bumps `version`. flush() serializes a snapshot (safe outside
+the writer lock, snapshots are immutable) and writes it atomically;
+reload() re-reads the file only when it changed on disk (someone edited it
+by hand), so callers can call it freely instead of deep-reloading.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+Path = Sequence[str]
+
+
+class DataStore:
+    def __init__(self, path: str, normalize: Optional[Callable[[Any], Dict[str, Any]]] = None):
+        self.path = path
+        self.normalize = normalize or (lambda d: d if isinstance(d, dict) else {})
+        self._snap: Tuple[int, Dict[str, Any]] = (0, self.normalize({}))
+        self._lock = threading.RLock()      # the single writer
+        self._io_lock = threading.Lock()    # file reads / writes
+        self._listeners: List[Callable[[int, Dict[str, Any]], None]] = []
+        self._saved_version = 0
+        self._file_sig: Optional[Tuple[int, int]] = None
+        self.commits = 0
+        self.flushes = 0
+        self.reloads = 0
+        self.conflicts = 0
+
+    # ---------- readers ----------
+    @property
+    def data(self) -> Dict[str, Any]:
+        return self._snap[1]
+
+    @property
+    def version(self) -> int:
+        return self._snap[0]
+
+    @property
+    def dirty(self) -> bool:
+        return self._snap[0] > self._saved_version
+
+    def snapshot(self) -> Tuple[int, Dict[str, Any]]:
+        return self._snap
+
+    def get(self, *path: str, default: Any = None) -> Any:
+        node: Any = self._snap[1]
+        for k in path:
+            if not isinstance(node, dict) or k not in node:
+                return default
+            node = node[k]
+        return node
+
+    def subscribe(self, fn: Callable[[int, Dict[str, Any]], None]) -> None:
+        """fn(version, root) after every commit / reload (writer lock held)."""
+        self._listeners.append(fn)
+        fn(*self._snap)
+
+    # ---------- writer ----------
+    def _publish(self, root: Dict[str, Any]) -> int:
+        version = self._snap[0] + 1
+        self._snap = (version, root)
+        self.commits += 1
+        for fn in self._listeners:
+            fn(version, root)
+        return version
+
+    @staticmethod
+    def _copy_path(root: Dict[str, Any], keys: Path, require: int) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Copy root and the dicts along `keys`; returns (new_root, innermost copy).
+
+        The first `require` keys must already exist as dicts, else (None, None).
+        """
+        new_root = dict(root)
+        node = new_root
+        for i, k in enumerate(keys):
+            child = node.get(k)
+            if not isinstance(child, dict):
+                if i < require:
+                    return None, None
+                child = {}
+            else:
+                child = dict(child)
+            node[k] = child
+            node = child
+        return new_root, node
+
+    def set(self, path: Path, value: Any, require: int = 0) -> Optional[int]:
+        """DATA[path...] = value (value must not be mutated afterwards). Returns the version."""
+        with self._lock:
+            root, parent = self._copy_path(self._snap[1], path[:-1], require)
+            if root is None:
+                return None
+            parent[path[-1]] = value
+            return self._publish(root)
+
+    def incr(self, path: Path, n: int = 1, require: int = 0) -> Optional[int]:
+        """Integer add at path; returns the new value (None if a required key is missing)."""
+        with self._lock:
+            root, parent = self._copy_path(self._snap[1], path[:-1], require)
+            if root is None:
+                return None
+            try:
+                value = int(parent.get(path[-1]) or 0) + n
+            except (TypeError, ValueError):
+                value = n
+            parent[path[-1]] = value
+            self._publish(root)
+            return value
+
+    def merge(self, path: Path, values: Dict[str, Any], require: int = 0) -> Optional[int]:
+        """dict.update at path (creating it unless required)."""
+        with self._lock:
+            root, node = self._copy_path(self._snap[1], path, require)
+            if root is None:
+                return None
+            node.update(values)
+            return self._publish(root)
+
+    def delete(self, path: Path) -> bool:
+        with self._lock:
+            if self.get(*path, default=_MISSING) is _MISSING:
+                return False
+            root, parent = self._copy_path(self._snap[1], path[:-1], len(path) - 1)
+            parent.pop(path[-1], None)
+            self._publish(root)
+            return True
+
+    @contextmanager
+    def edit(self) -> Iterator[Dict[str, Any]]:
+        """Deep-copied draft of the root, published on clean exit.
+
+        Holds the writer lock for the whole block: keep it short, no awaits.
+        """
+        with self._lock:
+            draft = copy.deepcopy(self._snap[1])
+            yield draft
+            self._publish(self.normalize(draft))
+
+    # ---------- persistence ----------
+    def _sig(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def reload(self, force: bool = False) -> bool:
+        """Load the file if it changed on disk since we last read / wrote it."""
+        sig = self._sig()
+        if not force and sig == self._file_sig:
+            return False
+        with self._lock:
+            with self._io_lock:
+                sig = self._sig()
+                if not force and sig == self._file_sig:
+                    return False
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        raw = json.load(f)
+                except FileNotFoundError:
+                    raw = {}
+                except (OSError, ValueError) as e:
+                    log.warning("data store: cannot read %s: %s", self.path, e)
+                    self._file_sig = sig
+                    return False
+                self._file_sig = sig
+            if self.dirty and self._file_sig is not None and not force:
+                # edited by hand while we had unsaved changes: the file wins
+                self.conflicts += 1
+                log.warning("data store: %s changed on disk, dropping %d unsaved commit(s)", self.path, self._snap[0] - self._saved_version)
+            version = self._publish(self.normalize(raw))
+            self._saved_version = version
+            self.reloads += 1
+            return True
+
+    def flush(self) -> bool:
+        """Write the current snapshot if it has unsaved commits."""
+        version, root = self._snap
+        if version <= self._saved_version:
+            return False
+        text = json.dumps(root, ensure_ascii=False, indent=2)
+        with self._io_lock:
+            if version <= self._saved_version:
+                return False
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, self.path)
+            self._saved_version = version
+            self._file_sig = self._sig()
+        self.flushes += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "saved_version": self._saved_version,
+            "commits": self.commits,
+            "flushes": self.flushes,
+            "reloads": self.reloads,
+            "conflicts": self.conflicts,
+        }
+
+    def summary(self) -> str:
+        st = self.stats()
+        return (
+            f"v{st['version']} (saved v{st['saved_version']}), {st['commits']} commits, "
+            f"{st['flushes']} writes, {st['reloads']} reloads"
+            + (f", {st['conflicts']} conflicts" if st["conflicts"] else "")
+        )
+
+
+_MISSING = object()
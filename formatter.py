@@ -20,6 +20,17 @@ from __future__ import annotations
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
+from templates import Template
+
+BUY_MESSAGE = Template(
+    "<b>TON TRENDING</b>\n🦀 <b>{symbol} Buy!</b>\n\n"
+    "{amount_lines}"
+    "{wallet_line}"
+    "{pos_line}"
+    "💰 Market Cap <b>{mcap}</b>\n"
+    "🌊 Liquidity <b>{liquidity}</b>"
+)
+
 
 def usd(v: float) -> str:
     return f"${v:,.2f}"
@@ -49,9 +60,9 @@ def build_buy_message(
     pair_url: str,
     # Optional data (if you have real swap parsing later)
     amount_ton: float | None = None,
- c 
-    buyer: str = "",b
-    tx_url:  str = "",
+    amount_token: float | None = None,
+    buyer: str = "",
+    tx_url: str = "",
     position: str = "",
     # Button URLs
     trending_url: str = "https://t.me/SpyTonTrending",
@@ -64,8 +75,6 @@ def build_buy_message(
     symbol = (symbol or "").upper()
 
     # ---------- lines ----------
-    title_line = f"<b>TON TRENDING</b>\n🦀 <b>{symbol} Buy!</b>\n"
-
     # Amount lines (TON + token) – only show when provided
     amount_lines = ""
     if amount_ton is not None:
@@ -90,19 +99,26 @@ def build_buy_message(
         # expected values: "New Holder!" / "Existing Holder"
         pos_line = f"⬆️ Position: <b>{position}</b>\n"
 
-    stats_lines = (
-        f"💰 Market Cap <b>{usd(mcap_usd)}</b>\n"
-        f"🌊 Liquidity <b>{usd(liquidity_usd)}</b>"
-    )
-
-    text = title_line + "\n" + amount_lines + wallet_line + pos_line + stats_lines
+    text = BUY_MESSAGE.render({
+        "symbol": symbol,
+        "amount_lines": amount_lines,
+        "wallet_line": wallet_line,
+        "pos_line": pos_line,
+        "mcap": usd(mcap_usd),
+        "liquidity": usd(liquidity_usd),
+    })
 
     # ---------- buttons ----------
     pools_url = pools_url or pair_url
 
     buttons = InlineKeyboardMarkup(
         [
-                       [InlineKeyboardButton("Book Trending", url=book_trending_url)],
+            [
+                InlineKeyboardButton("Chart", url=pair_url),
+                InlineKeyboardButton("Trending", url=trending_url),
+                InlineKeyboardButton("Pools", url=pools_url),
+            ],
+            [InlineKeyboardButton("Book Trending", url=book_trending_url)],
         ]
     )
 
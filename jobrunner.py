@@ -0,0 +1,170 @@
+"""Non-overlapping runner for repeating jobs.
+
+JobRunner.tick is what gets scheduled (job_queue.run_repeating). It makes
+sure a job never runs twice at once:
+- a tick that arrives while the job is still running is skipped and marks
+  the job pending;
+- when the run ends and ticks were skipped meanwhile, the job runs once
+  more right away; however many ticks were missed, they coalesce into
+  that single follow-up run.
+
+Per job it keeps run count, duration (last / avg / max), lag (how late a
+run started: scheduler lateness for regular ticks, time since the first
+skipped tick for a follow-up run), skipped ticks, follow-up runs and
+errors. With a metrics registry the same numbers go to /metrics.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+# seconds; lag is normally ~0, job runs are sub-second to tens of seconds
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0)
+
+
+class JobMetrics:
+    """The /metrics side of the runners, shared by all jobs."""
+
+    def __init__(self, registry: Any):
+        self.runs = registry.counter("job_runs_total", "Job runs (follow-up runs included)", ("job",))
+        self.errors = registry.counter("job_errors_total", "Job runs that raised", ("job",))
+        self.duration = registry.histogram("job_duration_seconds", "Job run duration", ("job",), JOB_BUCKETS)
+        self.lag = registry.histogram("job_lag_seconds", "How late a job run started", ("job",), JOB_BUCKETS)
+        self.skipped = registry.counter("job_skipped_ticks_total", "Ticks skipped because the job was still running", ("job",))
+        self.followups = registry.counter("job_followup_runs_total", "Runs that absorbed skipped ticks", ("job",))
+        self.overruns = registry.counter("job_overruns_total", "Job runs longer than the job interval", ("job",))
+
+
+class JobRunner:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Awaitable[Any]],
+        interval: float,
+        metrics: Optional[JobMetrics] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.interval = float(interval)
+        self.metrics = metrics
+        self.running = False
+        self.pending_since: Optional[float] = None
+        self.last_tick: Optional[float] = None
+        self.runs = 0
+        self.errors = 0
+        self.skipped = 0
+        self.followups = 0
+        self.overruns = 0
+        self.total_s = 0.0
+        self.last_s = 0.0
+        self.max_s = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_error = ""
+
+    async def tick(self, context: Any) -> None:
+        now = time.monotonic()
+        lateness = 0.0
+        if self.last_tick is not None and self.interval > 0:
+            lateness = max(0.0, now - self.last_tick - self.interval)
+        self.last_tick = now
+
+        if self.running:
+            self.skipped += 1
+            if self.metrics:
+                self.metrics.skipped.inc(self.name)
+            if self.pending_since is None:
+                self.pending_since = now
+            return
+
+        self.running = True
+        try:
+            await self._run(context, lateness)
+            while self.pending_since is not None:
+                lag = time.monotonic() - self.pending_since
+                self.pending_since = None
+                self.followups += 1
+                if self.metrics:
+                    self.metrics.followups.inc(self.name)
+                await self._run(context, lag)
+        finally:
+            self.running = False
+
+    async def _run(self, context: Any, lag: float) -> None:
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        t0 = time.perf_counter()
+        try:
+            await self.fn(context)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"[:200]
+            if self.metrics:
+                self.metrics.errors.inc(self.name)
+            log.exception("job %s failed", self.name)
+        finally:
+            dt = time.perf_counter() - t0
+            self.runs += 1
+            self.total_s += dt
+            self.last_s = dt
+            self.max_s = max(self.max_s, dt)
+            over = self.interval > 0 and dt > self.interval
+            if over:
+                self.overruns += 1
+            if self.metrics:
+                self.metrics.runs.inc(self.name)
+                self.metrics.duration.observe(dt, self.name)
+                self.metrics.lag.observe(lag, self.name)
+                if over:
+                    self.metrics.overruns.inc(self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "job": self.name,
+            "interval_s": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "followups": self.followups,
+            "overruns": self.overruns,
+            "avg_s": (self.total_s / self.runs) if self.runs else 0.0,
+            "last_s": self.last_s,
+            "max_s": self.max_s,
+            "last_lag_s": self.last_lag,
+            "max_lag_s": self.max_lag,
+            "last_error": self.last_error,
+        }
+
+    def summary(self) -> str:
+        st = self.stats()
+        line = (
+            f"{self.name} /{st['interval_s']:g}s: {st['runs']} runs, "
+            f"avg {st['avg_s']:.2f}s max {st['max_s']:.2f}s, "
+            f"lag max {st['max_lag_s']:.2f}s, {st['skipped']} skipped"
+        )
+        if st["followups"]:
+            line += f" ({st['followups']} merged runs)"
+        if st["errors"]:
+            line += f", {st['errors']} errors"
+        if st["running"]:
+            line += " [running]"
+        return line
+
+
+async def repeat(runner: JobRunner, context: Any, interval: float, first: float = 0) -> None:
+    """run_repeating without a PTB job queue (shard workers): a tick per
+    interval, each in its own task so the runner sees overlapping ticks.
+    Runs until cancelled."""
+    await asyncio.sleep(first)
+    ticks = set()
+    while True:
+        t = asyncio.create_task(runner.tick(context))
+        ticks.add(t)
+        t.add_done_callback(ticks.discard)
+        await asyncio.sleep(interval)
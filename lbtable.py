@@ -0,0 +1,178 @@
+"""Columnar pair table for the leaderboard.
+
+PairTable holds one row per tracked pair in NumPy columns (price change and
+USD volume per timeframe, liquidity, market cap) so that filtering, dedup by
+token and the gainers / losers / whales sections are array operations
+instead of per-item Python sorts. Missing DexScreener values are NaN.
+
+Only the small result (top-N row indices) goes back to Python for rendering.
+The table is built once per leaderboard tick; every board (movers per
+timeframe, volume) is a different selection over the same columns.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+TIMEFRAMES = ("m5", "h1", "h6", "h24")
+_TF_INDEX = {tf: i for i, tf in enumerate(TIMEFRAMES)}
+
+
+def _num(v: Any) -> float:
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return np.nan
+    return f
+
+
+def _col(values: List[Any]) -> np.ndarray:
+    """float64 column, None / junk -> NaN."""
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return np.array([_num(v) for v in values], dtype=float)
+
+
+class PairTable:
+    def __init__(self, rows: Iterable[Dict[str, Any]]):
+        """rows: {"pair_id", "sym", "token", "tg", "liq", "mc",
+        "price_change": {tf: pct}, "volume_usd": {tf: usd}}"""
+        rows = list(rows)
+        n = len(rows)
+        self.n = n
+        self.pair_id: List[str] = [r.get("pair_id") or "" for r in rows]
+        self.sym: List[str] = [r.get("sym") or "?" for r in rows]
+        self.tg: List[Optional[str]] = [r.get("tg") for r in rows]
+
+        pcs = [r.get("price_change") or {} for r in rows]
+        vols = [r.get("volume_usd") or {} for r in rows]
+        self.change = np.column_stack([_col([pc.get(tf) for pc in pcs]) for tf in TIMEFRAMES])
+        self.volume = np.column_stack([_col([v.get(tf) for v in vols]) for tf in TIMEFRAMES])
+        self.liq = _col([r.get("liq") for r in rows])
+        self.mc = _col([r.get("mc") for r in rows])
+
+        # token id per row (dedup key); pairs without a token address stay unique
+        keys = [(r.get("token") or "").strip() or f"PAIR::{r.get('pair_id')}" for r in rows]
+        if n:
+            self.token_code = np.unique(np.array(keys), return_inverse=True)[1].reshape(-1)
+        else:
+            self.token_code = np.empty(0, dtype=np.int64)
+
+    # ---------- columns ----------
+    def change_tf(self, tf: str, fallback: Optional[str] = None) -> np.ndarray:
+        col = self.change[:, _TF_INDEX[tf]]
+        if fallback:
+            col = np.where(np.isnan(col), self.change[:, _TF_INDEX[fallback]], col)
+        return col
+
+    def volume_tf(self, tf: str) -> np.ndarray:
+        return self.volume[:, _TF_INDEX[tf]]
+
+    # ---------- selection ----------
+    def mask(self, col: np.ndarray, min_liq: float = 0.0, min_mc: float = 0.0) -> np.ndarray:
+        """Rows with a value in `col` that pass the liquidity / market-cap floors
+        (unknown liquidity / market cap passes, like the old list filter)."""
+        m = ~np.isnan(col)
+        if min_liq > 0:
+            m &= np.isnan(self.liq) | (self.liq >= min_liq)
+        if min_mc > 0:
+            m &= np.isnan(self.mc) | (self.mc >= min_mc)
+        return m
+
+    def dedup(self, m: np.ndarray, ch: np.ndarray) -> np.ndarray:
+        """Indices (one per token) among rows in `m`: the most liquid pair,
+        then highest market cap, then biggest absolute move."""
+        idx = np.flatnonzero(m)
+        if idx.size == 0:
+            return idx
+        liq = np.nan_to_num(self.liq[idx], nan=0.0)
+        mc = np.nan_to_num(self.mc[idx], nan=0.0)
+        mv = np.abs(ch[idx])
+        # lexsort: last key is primary -> token, then liq desc, mc desc, |ch| desc
+        order = np.lexsort((-mv, -mc, -liq, self.token_code[idx]))
+        tok_sorted = self.token_code[idx][order]
+        first = np.ones(order.size, dtype=bool)
+        first[1:] = tok_sorted[1:] != tok_sorted[:-1]
+        return idx[order[first]]
+
+    @staticmethod
+    def top(idx: np.ndarray, score: np.ndarray, k: int) -> np.ndarray:
+        """Top-k of `idx` by score[idx] (descending), stable for ties."""
+        if k <= 0 or idx.size == 0:
+            return idx[:0]
+        s = score[idx]
+        if idx.size > k:
+            part = np.argpartition(-s, k - 1)[:k]
+            idx, s = idx[part], s[part]
+        return idx[np.argsort(-s, kind="stable")]
+
+    def sections(
+        self,
+        tf: str = "h6",
+        fallback: Optional[str] = "h1",
+        min_liq: float = 0.0,
+        min_mc: float = 0.0,
+        whale_mc: float = 0.0,
+        split: bool = True,
+        whales: bool = True,
+        max_gainers: int = 10,
+        max_losers: int = 10,
+        max_whales: int = 10,
+        max_movers: int = 10,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Leaderboard sections as row dicts.
+
+        split=False -> {"movers": top by |change|};
+        split=True  -> {"gainers", "losers", "whales"}; with whales enabled,
+        pairs at or above whale_mc market cap go to "whales" only.
+        """
+        ch = self.change_tf(tf, fallback)
+        idx = self.dedup(self.mask(ch, min_liq, min_mc), ch)
+
+        out: Dict[str, np.ndarray] = {}
+        if not split:
+            out["movers"] = self.top(idx, np.abs(ch), max_movers)
+        else:
+            rest = idx
+            if whales and whale_mc > 0:
+                is_whale = np.nan_to_num(self.mc[idx], nan=0.0) >= whale_mc
+                out["whales"] = self.top(idx[is_whale], np.abs(ch), max_whales)
+                rest = idx[~is_whale]
+            out["gainers"] = self.top(rest[ch[rest] > 0], ch, max_gainers)
+            out["losers"] = self.top(rest[ch[rest] < 0], -ch, max_losers)
+
+        return {name: [self.row(int(i), ch) for i in sel] for name, sel in out.items()}
+
+    def volume_board(self, tf: str = "h24", min_liq: float = 0.0, min_mc: float = 0.0, k: int = 10) -> List[Dict[str, Any]]:
+        """Top tokens by USD volume over `tf`, summed across a token's pairs
+        (each row shows the token's most liquid pair)."""
+        vol = np.nan_to_num(self.volume_tf(tf), nan=0.0)
+        m = self.mask(np.where(vol > 0, vol, np.nan), min_liq, min_mc)
+        idx = self.dedup(m, vol)
+        if idx.size == 0:
+            return []
+        per_token = np.bincount(self.token_code[m], weights=vol[m], minlength=int(self.token_code.max()) + 1)
+        score = np.zeros(self.n)
+        score[idx] = per_token[self.token_code[idx]]
+        ch = self.change_tf(tf)
+        out = []
+        for i in self.top(idx, score, k):
+            r = self.row(int(i), ch)
+            r["vol"] = float(score[i])
+            out.append(r)
+        return out
+
+    def row(self, i: int, ch: np.ndarray) -> Dict[str, Any]:
+        liq = self.liq[i]
+        mc = self.mc[i]
+        return {
+            "pair_id": self.pair_id[i],
+            "sym": self.sym[i],
+            "tg": self.tg[i],
+            "ch": None if np.isnan(ch[i]) else float(ch[i]),
+            "liq": None if np.isnan(liq) else float(liq),
+            "mc": None if np.isnan(mc) else float(mc),
+        }
@@ -6,12 +6,34 @@ import asyncio
 import base64
 import re
 import threading
+import queue
+import zlib
+import math
+import hashlib
+import io
+import logging
+import subprocess
+import sys
 import requests
+from html import escape as html_escape
 from urllib.parse import urlparse, parse_qs
+from types import SimpleNamespace
 from typing import Any, Dict, Optional, List, Tuple
 
-from flask import Flask
+from flask import Flask, Response
+from buytrace import BuyTracer, event_utime, mark as trace_mark
+from capture import CaptureLog
+from datastore import DataStore
+from jobrunner import JobMetrics, JobRunner, repeat
+from metrics import REGISTRY
+from profiler import MemProfiler, SamplingProfiler
+from sharding import ShardCoordinator, ShardWorker
+from ttlcache import MissBackoff, TTLCache
+from volume import VolumeWindow
+from lbtable import TIMEFRAMES, PairTable
+from templates import BuyAlertTemplates
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, RetryAfter, TelegramError
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
 
 # ============================================================
@@ -31,6 +53,8 @@ from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
 # - 6H movers (DexScreener priceChange.h6) + clickable TG + no preview
 # ============================================================
 
+log = logging.getLogger("spyton")
+
 # -------------------- ENV --------------------
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 # MASTER SpyTON channel (hard-coded)
@@ -79,6 +103,17 @@ ICON_CHART_ID   = os.getenv("ICON_CHART_ID", "").strip()
 ICON_TREND_ID   = os.getenv("ICON_TREND_ID", "").strip()
 ICON_POOLS_ID   = os.getenv("ICON_POOLS_ID", "").strip()
 
+# Buy-alert layouts with emoji tags, strength bars and static links resolved once
+BUY_TEMPLATES = BuyAlertTemplates(
+    icon_ids={
+        "swap": ICON_SWAP_ID, "wallet": ICON_WALLET_ID, "txn": ICON_TXN_ID, "pos": ICON_POS_ID,
+        "holders": ICON_HOLDERS_ID, "mcap": ICON_MCAP_ID, "liq": ICON_LIQ_ID, "pin": ICON_PIN_ID,
+        "chart": ICON_CHART_ID, "trend": ICON_TREND_ID, "pools": ICON_POOLS_ID,
+    },
+    spy_icon_id=SPY_CUSTOM_EMOJI_ID,
+    listing_url=LISTING_URL,
+    trending_url=TRENDING_URL,
+)
 
 TONAPI_KEY = os.getenv("TONAPI_KEY", "")
 TONAPI_BASE = os.getenv("TONAPI_BASE", "https://tonapi.io")
@@ -91,21 +126,68 @@ DEDUST_API_BASE = os.getenv("DEDUST_API_BASE", "https://api.dedust.io").rstrip("
 # Poll intervals (seconds)
 STON_POLL_INTERVAL = int(os.getenv("STON_POLL_INTERVAL", "2"))
 DEDUST_POLL_INTERVAL = int(os.getenv("DEDUST_POLL_INTERVAL", "3"))
-LB_UPDATE_INTERVAL = int(os.getenv("LB_UPDATE_INTERVAL", "60"))
-AUTO_RANK_INTERVAL = int(os.getenv("AUTO_RANK_INTERVAL", "30"))
+LB_UPDATE_INTERVAL = int(os.getenv("LB_UPDATE_INTERVAL", "60"))  # regular republish (only if text changed)
+LB_CHECK_INTERVAL = int(os.getenv("LB_CHECK_INTERVAL", str(min(15, LB_UPDATE_INTERVAL))))  # ranking check tick
+LB_EARLY_TOP = int(os.getenv("LB_EARLY_TOP", "3"))        # order change in top N of a section -> publish early
+LB_MIN_EDIT_GAP = int(os.getenv("LB_MIN_EDIT_GAP", "10"))  # never edit one board more often than this
+LB_MAX_BOARDS = int(os.getenv("LB_MAX_BOARDS", "10"))      # /setleaderboard refuses more; /delleaderboard frees one
+AUTO_RANK_INTERVAL = int(os.getenv("AUTO_RANK_INTERVAL", "30"))  # volume snapshot + optional reconcile
 
 # Memepad auto-activation
 MEMEPAD_ACTIVATION_ENABLED = os.getenv("MEMEPAD_ACTIVATION_ENABLED", "1") == "1"
-MEMEPAD_ACTIVATION_INTERVAL = int(os.getenv("MEMEPAD_ACTIVATION_INTERVAL", "45"))  # seconds
+MEMEPAD_ACTIVATION_INTERVAL = int(os.getenv("MEMEPAD_ACTIVATION_INTERVAL", "5"))  # job tick (seconds); entries have their own schedule
+MEMEPAD_CONCURRENCY = int(os.getenv("MEMEPAD_CONCURRENCY", "8"))
+MEMEPAD_CHECK_MIN = int(os.getenv("MEMEPAD_CHECK_MIN", "10"))        # recheck interval for a fresh entry
+MEMEPAD_CHECK_MAX = int(os.getenv("MEMEPAD_CHECK_MAX", "900"))       # cap for old entries
+MEMEPAD_BACKOFF_STEP = int(os.getenv("MEMEPAD_BACKOFF_STEP", "600"))  # interval doubles per this much age
 
 # -------------------- BLUM EARLY MODE (NEW) --------------------
 # If a WATCH entry is source=blum AND approved_early=True AND token_address is set,
 # bot will post early buys by scanning TONAPI transactions on the jetton master.
 BLUM_EARLY_ENABLED = os.getenv("BLUM_EARLY_ENABLED", "1") == "1"
 BLUM_POLL_LIMIT = int(os.getenv("BLUM_POLL_LIMIT", "12"))  # txs pulled per jetton per poll
+BLUM_CONCURRENCY = int(os.getenv("BLUM_CONCURRENCY", "8"))  # parallel jetton-master polls
+BLUM_HANDOFF_LIMIT = int(os.getenv("BLUM_HANDOFF_LIMIT", "100"))  # first DEX poll after graduation
 BLUM_POLL_INTERVAL = int(os.getenv("BLUM_POLL_INTERVAL", "14"))  # seconds
 BLUM_DEBUG = os.getenv("BLUM_DEBUG", "0") == "1"
 
+# -------------------- DETECTION MODE --------------------
+# poll   = per-pool TonAPI polling (ston_tracker_job_fast) + per-jetton Blum polling
+# blocks = follow masterchain blocks once and match txs against tracked pools/jettons
+# stream = TonAPI SSE tx notifications; accounts whose stream stalls fall back to polling
+DETECTION_MODE = os.getenv("DETECTION_MODE", "poll").strip().lower()
+BLOCK_SCAN_INTERVAL = float(os.getenv("BLOCK_SCAN_INTERVAL", "1"))
+BLOCK_SCAN_MAX_BLOCKS = int(os.getenv("BLOCK_SCAN_MAX_BLOCKS", "8"))    # blocks fetched per tick
+BLOCK_SCAN_MAX_LAG = int(os.getenv("BLOCK_SCAN_MAX_LAG", "120"))        # jump to tip if further behind
+BLOCK_SCAN_CONCURRENCY = int(os.getenv("BLOCK_SCAN_CONCURRENCY", "4"))
+
+STREAM_CONNECTIONS = int(os.getenv("STREAM_CONNECTIONS", "4"))          # SSE connections (accounts hashed across them)
+STREAM_STALL_SECONDS = float(os.getenv("STREAM_STALL_SECONDS", "20"))   # no data/heartbeat for this long = stalled
+STREAM_VERIFY_INTERVAL = float(os.getenv("STREAM_VERIFY_INTERVAL", "60"))  # poll streamed pools this often to catch misses
+STREAM_GRACE_SECONDS = float(os.getenv("STREAM_GRACE_SECONDS", "10"))   # poll-found tx younger than this is not a miss
+STREAM_DISPATCH_INTERVAL = float(os.getenv("STREAM_DISPATCH_INTERVAL", "0.5"))
+
+# STON source selection:
+# auto = TonAPI fast path when TONAPI_KEY is set, else STON export feed
+# race = run both every tick, post whichever copy arrives first, drop the other
+STON_SOURCE_MODE = os.getenv("STON_SOURCE_MODE", "auto").strip().lower()
+RACE_WINDOW_SECONDS = int(os.getenv("RACE_WINDOW_SECONDS", "600"))  # how long a first-seen record waits for the other source
+
+# Sharding (see sharding.py): SHARD_WORKERS > 0 runs the STON/DeDust
+# trackers in that many worker processes, pools split by consistent hashing;
+# this process stays the single poster (dedup, holder counts, data.json,
+# Telegram). SPYTON_ROLE=worker is set by the coordinator for its workers.
+# Workers only poll per-pool TonAPI / DeDust endpoints: shared feeds (block
+# scan, stream, STON export / race) would be read in full by every worker,
+# so startup refuses them together with SHARD_WORKERS.
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))
+SHARD_ROLE = os.getenv("SPYTON_ROLE", "").strip().lower() or ("poster" if SHARD_WORKERS > 0 else "single")
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+SHARD_SOCKET = os.path.abspath(os.getenv("SHARD_SOCKET", "shard.sock"))
+SHARD_CURSOR_INTERVAL = float(os.getenv("SHARD_CURSOR_INTERVAL", "5"))  # seconds between a worker's cursor reports
+SHARD_POSTERS = int(os.getenv("SHARD_POSTERS", "8"))         # poster tasks for worker buys (per-pool order kept)
+SHARD_POST_QUEUE = int(os.getenv("SHARD_POST_QUEUE", "1000"))  # buys queued per poster task before reading pauses
+
 # -------------------- LEADERBOARD FILTERS / MODES --------------------
 LB_MIN_LIQ_USD = float(os.getenv("LB_MIN_LIQ_USD", "0"))
 LB_MIN_MC_USD = float(os.getenv("LB_MIN_MC_USD", "0"))
@@ -115,6 +197,8 @@ LB_SHOW_WHALES = os.getenv("LB_SHOW_WHALES", "1") == "1"
 LB_MAX_GAINERS = int(os.getenv("LB_MAX_GAINERS", "10"))
 LB_MAX_LOSERS = int(os.getenv("LB_MAX_LOSERS", "10"))
 LB_MAX_WHALES = int(os.getenv("LB_MAX_WHALES", "10"))
+LB_MAX_VOLUME = int(os.getenv("LB_MAX_VOLUME", "10"))
+LB_VOLUME_TF = os.getenv("LB_VOLUME_TF", "h24")  # timeframe of the "volume" board
 
 # -------------------- SPEED / POSTING --------------------
 # FAST_POST_MODE posts immediately with minimal info, then edits the message
@@ -123,9 +207,20 @@ FAST_POST_MODE = os.getenv("FAST_POST_MODE", "1") == "1"
 # In FAST_POST_MODE, these expensive lookups are moved to the background.
 FAST_STATS_TIMEOUT = float(os.getenv("FAST_STATS_TIMEOUT", "3"))
 FAST_HOLDERS_ENABLED = os.getenv("FAST_HOLDERS_ENABLED", "0") == "1"  # default off (slow)
+# Buy coalescing: after a token's alert, further buys within this many seconds
+# are merged into one burst alert (0 = off). Buys >= BUY_WHALE_TON always post alone.
+BUY_COALESCE_SECONDS = float(os.getenv("BUY_COALESCE_SECONDS", "0"))
+BUY_WHALE_TON = float(os.getenv("BUY_WHALE_TON", "50"))
+# Dust filter: buys below this USD value (cached TON price) are not posted anywhere.
+# Default from config.py; per-group override via /setminbuy (group_mirrors[chat]["min_usd"]).
+try:
+    from config import MIN_USD_BUY as _CONFIG_MIN_USD_BUY
+except Exception:
+    _CONFIG_MIN_USD_BUY = 0
+MIN_USD_BUY = float(os.getenv("MIN_USD_BUY", str(_CONFIG_MIN_USD_BUY)))
 
 # -------------------- STON API --------------------
-STON_BASE = "https://api.ston.fi"
+STON_BASE = os.getenv("STON_BASE", "https://api.ston.fi").rstrip("/")
 LATEST_BLOCK_URL = f"{STON_BASE}/export/dexscreener/v1/latest-block"
 EVENTS_URL = f"{STON_BASE}/export/dexscreener/v1/events"
 STON_HEADERS = {
@@ -135,32 +230,137 @@ STON_HEADERS = {
 }
 
 # -------------------- DEXSCREENER --------------------
-DEX_PAIR_URL = "https://api.dexscreener.com/latest/dex/pairs/ton"
-DEX_TOKEN_URL = "https://api.dexscreener.com/latest/dex/tokens"
+DEXSCREENER_BASE = os.getenv("DEXSCREENER_BASE", "https://api.dexscreener.com").rstrip("/")
+DEX_PAIR_URL = f"{DEXSCREENER_BASE}/latest/dex/pairs/ton"
+DEX_TOKEN_URL = f"{DEXSCREENER_BASE}/latest/dex/tokens"
+
+# -------------------- TELEGRAM --------------------
+# Bot API server; empty = api.telegram.org (set for a local Bot API server or bench/mock_upstream.py)
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "").rstrip("/")
 
 # -------------------- FILES --------------------
 DATA_FILE = "data.json"
-STATE_FILE = "state.json"
+DATA_FLUSH_INTERVAL = float(os.getenv("DATA_FLUSH_INTERVAL", "2"))  # seconds; buyer counts are written in batches
+STATE_FILE = os.getenv("STATE_FILE", "state.json")  # shard workers get their own
+META_FILE = os.getenv("META_FILE", "meta.json")  # persistent jetton/pair metadata cache
+VOLUME_FILE = os.getenv("VOLUME_FILE", "volume.json")  # sliding-window buy volume (trend ranks)
+
+# Metadata warm-up (fills META for tracked tokens/pairs in the background)
+META_WARM_INTERVAL = int(os.getenv("META_WARM_INTERVAL", "60"))
 
 # -------------------- RUNTIME --------------------
 LAST_HTTP_INFO: str = "No requests yet"
 LAST_EVENTS_COUNT: int = 0
 
+# Metrics, exported on /metrics (see metrics.py). Per-thread shards, so they
+# are bumped from jobs and to_thread workers without locking.
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "Upstream HTTP requests by status code or error type", ("upstream", "status"))
+HTTP_LATENCY = REGISTRY.histogram("http_request_seconds", "Upstream HTTP request latency", ("upstream",))
+JOB_METRICS = JobMetrics(REGISTRY)
+BUYS = REGISTRY.counter("buys_total", "Buys by source and outcome (detected, filtered, coalesced, posted)", ("source", "outcome"))
+TG_LATENCY = REGISTRY.histogram("telegram_request_seconds", "Bot API call latency", ("method",))
+TG_ERRORS = REGISTRY.counter("telegram_errors_total", "Bot API call errors", ("method", "error"))
+# job name -> JobRunner (see run_job)
+JOB_RUNNERS: Dict[str, JobRunner] = {}
+
+# Per-buy latency traces (see buytrace.py): histograms per source on /metrics,
+# p50/p95/p99 in /status, optional JSONL log (only traces >= TRACE_LOG_MIN_SECONDS).
+BUY_TRACER = BuyTracer(
+    REGISTRY,
+    log_path=os.getenv("TRACE_LOG_PATH", "").strip(),
+    log_min=float(os.getenv("TRACE_LOG_MIN_SECONDS", "0")),
+)
+
+# Raw upstream responses + buy outcomes for bench/replay.py (see capture.py); off unless CAPTURE_PATH is set.
+CAPTURE = CaptureLog(os.getenv("CAPTURE_PATH", "").strip())
+# settings a replay needs to behave like the captured run
+CAPTURE_SETTINGS = (
+    "DETECTION_MODE", "STON_SOURCE_MODE", "RACE_WINDOW_SECONDS", "MIN_USD_BUY",
+    "FAST_POST_MODE", "FAST_HOLDERS_ENABLED", "BUY_COALESCE_SECONDS", "BUY_WHALE_TON",
+    "STON_POLL_INTERVAL", "DEDUST_ENABLED", "DEDUST_POLL_INTERVAL", "DEDUST_POLL_LIMIT",
+    "BLOCK_SCAN_INTERVAL", "BLOCK_SCAN_MAX_BLOCKS", "BLOCK_SCAN_MAX_LAG",
+    "MEMEPAD_ACTIVATION_ENABLED", "MEMEPAD_ACTIVATION_INTERVAL",
+    "BLUM_EARLY_ENABLED", "BLUM_POLL_INTERVAL", "BLUM_POLL_LIMIT", "META_WARM_INTERVAL",
+    # upstream URLs are part of the recorded requests
+    "TONAPI_BASE", "DEDUST_API_BASE", "STON_BASE", "DEXSCREENER_BASE", "TON_PRICE_API",
+)
+
+def _capture_buy(trace: Dict[str, Any], outcome: str, extra: Dict[str, Any]) -> None:
+    CAPTURE.event(
+        "buy",
+        outcome=outcome,
+        source=trace.get("source"),
+        via=trace.get("via"),
+        utime=trace.get("utime"),
+        sent=trace.get("sent"),
+        **extra,
+    )
+
+def capture_snapshot() -> None:
+    """First record of a capture: settings and the data / state / meta the run starts from."""
+    if not CAPTURE.enabled:
+        return
+    settings = {name: globals()[name] for name in CAPTURE_SETTINGS}
+    settings["TONAPI_KEY"] = bool(TONAPI_KEY)
+    CAPTURE.event("snapshot", settings=settings, data=STORE.data, state=STATE, meta=META)
+
+if CAPTURE.enabled:
+    BUY_TRACER.subscribe(_capture_buy)
+
+# On-demand profilers behind /profile and /memprofile (see profiler.py); no cost until used.
+PROFILER = SamplingProfiler(interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000.0)
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "120"))
+MEM_PROFILER = MemProfiler(frames=int(os.getenv("MEMPROFILE_FRAMES", "1")))
+
 SEEN_TX_STON: Dict[str, float] = {}
 SEEN_TX_DEDUST: Dict[str, float] = {}
 SEEN_TX_BLUM: Dict[str, float] = {}
+SEEN_TX_SHARD: Dict[str, float] = {}  # poster: buys from shard workers
 SEEN_TTL_SECONDS = 3600
 
-PAIR_CACHE: Dict[str, Dict[str, Any]] = {}
+# Bounded LRU+TTL caches (see ttlcache.py). Negative TTL applies to "no data" results.
 PAIR_CACHE_TTL = 30
-
-DATA: Dict[str, Any] = {"pairs": {}, "watch": {}}
+# DexScreener pair stats back the leaderboard: every fetch must serve at least two
+# LB_CHECK_INTERVAL ticks (+5s for tick jitter / fetch time), or alternate checks refetch everything.
+PAIR_STATS_TTL = int(os.getenv("PAIR_STATS_TTL", str(max(PAIR_CACHE_TTL, 2 * LB_CHECK_INTERVAL + 5))))
+PAIR_CACHE_NEG_TTL = int(os.getenv("PAIR_CACHE_NEG_TTL", "60"))
+PAIR_CACHE_MAX = int(os.getenv("PAIR_CACHE_MAX", "2000"))
+JETTON_META_TTL = int(os.getenv("JETTON_META_TTL", "86400"))
+PAIR_META_MISS_TTL = int(os.getenv("PAIR_META_MISS_TTL", "3600"))  # recheck pairs DexScreener gave no TON leg / label for
+PAIR_CACHE = TTLCache("pair_stats", PAIR_CACHE_MAX, PAIR_STATS_TTL, negative_ttl=PAIR_CACHE_NEG_TTL)
+
+# "Not found" memory for slow-changing lookups, keyed by token address.
+# Recheck delay doubles per miss (base .. max seconds); admin edits clear it.
+TG_MISSES = MissBackoff(
+    "tg_link",
+    float(os.getenv("TG_MISS_BASE", "300")),
+    float(os.getenv("TG_MISS_MAX", "21600")),
+)
+# Jetton masters TonAPI gave no metadata for: the trackers skip them until due,
+# meta_warm_job keeps retrying.
+JETTON_META_MISSES = MissBackoff(
+    "jetton_meta",
+    float(os.getenv("JETTON_META_MISS_BASE", "60")),
+    float(os.getenv("JETTON_META_MISS_MAX", "3600")),
+)
+# Memepad WATCH entries: watch_id -> next pair-discovery check (see memepad_check_interval)
+MEMEPAD_NEXT_CHECK: Dict[str, float] = {}
+
+DATA: Dict[str, Any] = {"pairs": {}, "watch": {}}  # rebound by STORE on every commit
 STATE: Dict[str, Any] = {
     "leaderboard_msg_id": None,
     "ston_last_block": None,
     "dedust_last_id": {},   # { pool_address: last_trade_id }
     "dedust_last_lt": {},   # legacy (unused)
     "blum_last_lt": {},     # { jetton_master: last_lt_int }  (NEW)
+    "blum_last_utime": {},  # { jetton_master: utime of the cursor tx }
+    "blum_graduated": {},   # { jetton_master: {last_lt, last_utime, pool, dex, ts} } cursor after handoff
+    "pool_floor_utime": {}, # { pool: utime } first DEX poll after handoff skips older txs
+}
+# Persistent metadata (meta.json). Written only by the prefetch helpers.
+META: Dict[str, Any] = {
+    "jettons": {},          # { jetton_master: {decimals, symbol, ts} }
+    "pairs": {},            # { pair_id: {ton_leg, dex_label, base_sym, quote_sym, dex_id, ts} }
 }
 
 # ===================== UPTIMEROBOT WEB SERVER =====================
@@ -178,6 +378,10 @@ def uptimerobot():
 def health():
     return "healthy", 200
 
+@app_web.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 def run_web():
     port = int(os.getenv("PORT", "8080"))
     app_web.run(host="0.0.0.0", port=port, debug=False)
@@ -197,7 +401,8 @@ def start_web_server_once():
         # Don't crash the bot if web server fails
         print("⚠️ Failed to start keep-alive web server:", e)
 
-start_web_server_once()
+if SHARD_ROLE != "worker":
+    start_web_server_once()
 
 # --- Optional self-ping keep-warm loop ---
 _PING_STARTED = False
@@ -227,13 +432,86 @@ def start_self_ping_once():
     except Exception as e:
         print("⚠️ Failed to start self-ping loop:", e)
 
-start_self_ping_once()
+if SHARD_ROLE != "worker":
+    start_self_ping_once()
 
 
 # ===================== ASYNC HELPERS =====================
 async def _to_thread(fn, *args, **kwargs):
     return await asyncio.to_thread(fn, *args, **kwargs)
 
+async def tg_call(method: str, coro):
+    """Await a Bot API call, recording its latency and errors."""
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    except Exception as e:
+        TG_ERRORS.inc(method, type(e).__name__)
+        raise
+    finally:
+        TG_LATENCY.observe(time.perf_counter() - t0, method)
+
+def run_job(app, fn, interval: float, first: float = 0):
+    """job_queue.run_repeating through a JobRunner: never two runs of the same
+    job at once, ticks missed during a long run merge into one follow-up run."""
+    name = fn.__name__
+    runner = JOB_RUNNERS.get(name)
+    if runner is None or runner.fn is not fn:
+        runner = JOB_RUNNERS[name] = JobRunner(name, fn, interval, JOB_METRICS)
+    # APScheduler would otherwise drop a tick while the previous one runs
+    # (max_instances=1) before JobRunner sees it; skipping is JobRunner's job.
+    return app.job_queue.run_repeating(
+        runner.tick, interval=interval, first=first, name=name,
+        job_kwargs={"max_instances": 1000, "coalesce": False},
+    )
+
+def jobs_summary() -> str:
+    return "\n".join(r.summary() for r in JOB_RUNNERS.values()) or "no jobs scheduled"
+
+
+# ===================== HTTP =====================
+def _timed_http(upstream: str, call, url: str, kwargs: Dict[str, Any]) -> requests.Response:
+    started = time.time()
+    t0 = time.perf_counter()
+    try:
+        res = call(url, **kwargs)
+    except Exception as e:
+        dt = time.perf_counter() - t0
+        HTTP_LATENCY.observe(dt, upstream)
+        HTTP_REQUESTS.inc(upstream, type(e).__name__)
+        if CAPTURE.enabled:
+            CAPTURE.http(upstream, call.__name__.upper(), url, kwargs, started, dt, error=e)
+        raise
+    dt = time.perf_counter() - t0
+    HTTP_LATENCY.observe(dt, upstream)
+    HTTP_REQUESTS.inc(upstream, str(res.status_code))
+    if CAPTURE.enabled:
+        CAPTURE.http(upstream, call.__name__.upper(), url, kwargs, started, dt, res=res)
+    return res
+
+def http_get(upstream: str, url: str, **kwargs) -> requests.Response:
+    """requests.get, counted per upstream (status / latency on /metrics)."""
+    return _timed_http(upstream, requests.get, url, kwargs)
+
+def http_post(upstream: str, url: str, **kwargs) -> requests.Response:
+    return _timed_http(upstream, requests.post, url, kwargs)
+
+def http_summary() -> str:
+    """Per upstream: requests, non-2xx/errors, p95 latency (for /status)."""
+    per: Dict[str, List[float]] = {}
+    for (upstream, status), n in HTTP_REQUESTS.values().items():
+        acc = per.setdefault(upstream, [0.0, 0.0])
+        acc[0] += n
+        if not status.startswith("2"):
+            acc[1] += n
+    if not per:
+        return "no requests yet"
+    parts = []
+    for upstream, (n, bad) in sorted(per.items()):
+        p95 = HTTP_LATENCY.quantile(0.95, upstream)
+        parts.append(f"{upstream} {int(n)} ({int(bad)} bad)" + (f" p95 {p95:.2f}s" if p95 is not None else ""))
+    return " | ".join(parts)
+
 
 # ===================== UTIL =====================
 def is_admin(uid: int) -> bool:
@@ -335,6 +613,31 @@ def _to_hex_tx_hash(h: str) -> str:
 
     return ""
 
+def to_raw_address(addr: str) -> str:
+    """Normalize a TON address to raw form "wc:hex" (lowercase).
+
+    Accepts raw addresses and user-friendly base64/base64url (EQ../UQ..).
+    Returns empty string if cannot parse.
+    """
+    a = (addr or "").strip()
+    if not a:
+        return ""
+    if ":" in a:
+        wc, _, hx = a.partition(":")
+        if re.fullmatch(r"-?\d+", wc) and re.fullmatch(r"[0-9a-fA-F]{64}", hx):
+            return f"{int(wc)}:{hx.lower()}"
+        return ""
+    if len(a) != 48:
+        return ""
+    try:
+        raw = base64.b64decode(a.replace("-", "+").replace("_", "/"))
+    except Exception:
+        return ""
+    if len(raw) != 36:
+        return ""
+    wc = raw[1] - 256 if raw[1] > 127 else raw[1]
+    return f"{wc}:{raw[2:34].hex()}"
+
 def make_tx_url(tx_hash: str, fallback_url: str = "") -> str:
     """Return a working explorer link for the given tx hash.
 
@@ -402,29 +705,36 @@ def _atomic_write(path: str, data: str):
         f.write(data)
     os.replace(tmp, path)
 
-def load_data():
+def _normalize_data(d: Any) -> Dict[str, Any]:
+    if not isinstance(d, dict):
+        d = {}
+    for k in ("pairs", "watch", "forced_ranks", "group_mirrors"):
+        if not isinstance(d.get(k), dict):
+            d[k] = {}
+    return d
+
+def _publish_data(version: int, root: Dict[str, Any]):
     global DATA
-    try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            DATA = json.load(f)
-        if not isinstance(DATA, dict):
-            DATA = {"pairs": {}, "watch": {}, "forced_ranks": {}}
-        DATA.setdefault("pairs", {})
-        DATA.setdefault("watch", {})
-        DATA.setdefault("forced_ranks", {})
-        if not isinstance(DATA["forced_ranks"], dict):
-            DATA["forced_ranks"] = {}
-        if not isinstance(DATA["pairs"], dict):
-            DATA["pairs"] = {}
-        if not isinstance(DATA["watch"], dict):
-            DATA["watch"] = {}
-        if not isinstance(DATA.get("group_mirrors"), dict):
-            DATA["group_mirrors"] = {}
-    except:
-        DATA = {"pairs": {}, "watch": {}, "forced_ranks": {}, "group_mirrors": {}}
+    DATA = root
+
+# data.json as versioned immutable snapshots (see datastore.py). DATA always
+# names the latest one; write through STORE (path ops / STORE.edit()), never
+# into DATA or a record taken from it.
+STORE = DataStore(DATA_FILE, _normalize_data)
+STORE.subscribe(_publish_data)
+
+def load_data():
+    """Pick up hand edits of data.json; a stat() when the file is unchanged."""
+    STORE.reload()
 
 def save_data():
-    _atomic_write(DATA_FILE, json.dumps(DATA, ensure_ascii=False, indent=2))
+    """Write data.json now if there are unsaved changes (jobs rely on data_flush_job)."""
+    STORE.flush()
+
+async def data_flush_job(context: ContextTypes.DEFAULT_TYPE):
+    """Persist the latest DATA snapshot (off the event loop), at most once per interval."""
+    if STORE.dirty:
+        await _to_thread(STORE.flush)
 
 def load_state():
     global STATE
@@ -445,20 +755,148 @@ def load_state():
     except:
         STATE = {"leaderboard_msg_id": None, "ston_last_block": None, "dedust_last_id": {}, "dedust_last_lt": {}, "blum_last_lt": {}}
 
-# Auto trend ranks (computed from 6H USD volume)
-AUTO_RANKS: Dict[str, int] = {}
-AUTO_RANK_TS = 0.0
-AUTO_RANK_TTL = int(os.getenv("AUTO_RANK_TTL", "30"))  # seconds
+META_FILE_SIG: Optional[Tuple[int, int]] = None  # (mtime_ns, size) of meta.json as last read / written
+
+def _meta_sig() -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(META_FILE)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def load_meta():
+    global META, META_FILE_SIG
+    META_FILE_SIG = _meta_sig()
+    try:
+        with open(META_FILE, "r", encoding="utf-8") as f:
+            m = json.load(f)
+        META = m if isinstance(m, dict) else {}
+    except:
+        META = {}
+    for k in ("jettons", "pairs"):
+        if not isinstance(META.get(k), dict):
+            META[k] = {}
+    for jm, rec in META["jettons"].items():
+        if isinstance(rec, dict) and isinstance(rec.get("decimals"), int):
+            JETTON_DECIMALS_CACHE.set(jm, rec["decimals"])
+
+def save_meta():
+    global META_FILE_SIG
+    _atomic_write(META_FILE, json.dumps(META, ensure_ascii=False, indent=2))
+    META_FILE_SIG = _meta_sig()
+
+def reload_meta() -> bool:
+    """Re-read meta.json if another process (shard poster / workers) wrote it
+    since we last read or wrote it. Entries only we have are kept."""
+    if _meta_sig() == META_FILE_SIG:
+        return False
+    old = META
+    load_meta()
+    for k in ("jettons", "pairs"):
+        for key, rec in (old.get(k) or {}).items():
+            META[k].setdefault(key, rec)
+    return True
+
+# Auto trend ranks: local sliding-window buy volume per symbol (fed by post_buy_message)
+AUTO_RANK_WINDOW = int(os.getenv("AUTO_RANK_WINDOW", str(6 * 3600)))  # seconds
+AUTO_RANK_TOP_K = int(os.getenv("AUTO_RANK_TOP_K", "100"))
+# Optional: top up local volume with DexScreener 6H volume (buys we don't see, e.g. other DEXes)
+AUTO_RANK_RECONCILE = os.getenv("AUTO_RANK_RECONCILE", "0") == "1"
+AUTO_RANK_RECONCILE_INTERVAL = int(os.getenv("AUTO_RANK_RECONCILE_INTERVAL", "900"))
+VOLUME = VolumeWindow(window=AUTO_RANK_WINDOW, bucket=60, top_k=AUTO_RANK_TOP_K)
+_AUTO_RANK_RECONCILE_TS = 0.0
+
+def load_volume():
+    if VOLUME.updates:
+        return  # already live (runner restarted inside the process)
+    try:
+        with open(VOLUME_FILE, "r", encoding="utf-8") as f:
+            VOLUME.load(json.load(f))
+    except:
+        pass
+
+def save_volume():
+    _atomic_write(VOLUME_FILE, json.dumps(VOLUME.dump(), separators=(",", ":")))
 
 def save_state():
     _atomic_write(STATE_FILE, json.dumps(STATE, ensure_ascii=False, indent=2))
 
 def cleanup_seen():
     now = time.time()
-    for cache in (SEEN_TX_STON, SEEN_TX_DEDUST, SEEN_TX_BLUM):
+    for c in (PAIR_CACHE, TOKEN_STATS_CACHE, PAIR_META_CACHE, JETTON_DECIMALS_CACHE):
+        c.purge()
+    for cache in (SEEN_TX_STON, SEEN_TX_DEDUST, SEEN_TX_BLUM, SEEN_TX_SHARD, STREAM_DELIVERED):
         old = [k for k, ts in cache.items() if now - ts > SEEN_TTL_SECONDS]
         for k in old:
             cache.pop(k, None)
+    old = [k for k, v in RACE_FIRST.items() if now - v[1] > RACE_WINDOW_SECONDS]
+    for k in old:
+        RACE_FIRST.pop(k, None)
+
+# ===================== STON DEDUP / SOURCE RACE =====================
+# First-seen record per normalized tx hash: key -> (source, ts, pool, late_sources)
+RACE_FIRST: Dict[str, Tuple[str, float, str, set]] = {}
+# { pool: { source: {"wins", "late", "lag_sum", "lag_max"} } }
+RACE_STATS: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+def _race_bucket(pool: str, source: str) -> Dict[str, float]:
+    return RACE_STATS.setdefault(pool, {}).setdefault(source, {"wins": 0, "late": 0, "lag_sum": 0.0, "lag_max": 0.0})
+
+def ston_claim_tx(pool: str, tx_hash: str, source: str) -> bool:
+    """Shared STON dedup across sources. True = first copy, post it.
+
+    Hashes are normalized with _to_hex_tx_hash so the TonAPI and export
+    copies of one swap collide. A later copy from another source records
+    its lag against the winner.
+    """
+    hx = _to_hex_tx_hash(tx_hash) or (tx_hash or "").strip()
+    if not hx:
+        return False
+    key = f"ston:{hx}"
+    now = time.time()
+    if key not in SEEN_TX_STON:
+        SEEN_TX_STON[key] = now
+        RACE_FIRST[key] = (source, now, pool, set())
+        _race_bucket(pool, source)["wins"] += 1
+        return True
+    first = RACE_FIRST.get(key)
+    if first and first[0] != source and source not in first[3]:
+        first[3].add(source)
+        lag = now - first[1]
+        b = _race_bucket(first[2], source)
+        b["late"] += 1
+        b["lag_sum"] += lag
+        b["lag_max"] = max(b["lag_max"], lag)
+    return False
+
+def race_summary(per_pool: bool = False, limit: int = 15) -> str:
+    """Per-source first-seen win rate and lag, overall or per pool."""
+    def _fmt(rows: Dict[str, Dict[str, float]]) -> str:
+        total = sum(int(v["wins"]) for v in rows.values()) or 1
+        parts = []
+        for src, v in sorted(rows.items()):
+            lag = (v["lag_sum"] / v["late"]) if v["late"] else 0.0
+            parts.append(f"{src} {100.0 * v['wins'] / total:.0f}% first, late {int(v['late'])} avg {lag:.1f}s max {v['lag_max']:.1f}s")
+        return " | ".join(parts)
+
+    if not RACE_STATS:
+        return "no data"
+    if not per_pool:
+        agg: Dict[str, Dict[str, float]] = {}
+        for rows in RACE_STATS.values():
+            for src, v in rows.items():
+                a = agg.setdefault(src, {"wins": 0, "late": 0, "lag_sum": 0.0, "lag_max": 0.0})
+                a["wins"] += v["wins"]
+                a["late"] += v["late"]
+                a["lag_sum"] += v["lag_sum"]
+                a["lag_max"] = max(a["lag_max"], v["lag_max"])
+        return _fmt(agg)
+    busiest = sorted(RACE_STATS.items(), key=lambda kv: -sum(v["wins"] for v in kv[1].values()))[:limit]
+    lines = []
+    for pool, rows in busiest:
+        sym = (DATA.get("pairs", {}).get(pool, {}) or {}).get("symbol") or short(pool)
+        lines.append(f"{sym}: {_fmt(rows)}")
+    return "\n".join(lines)
 
 def buy_badge(ton_amt: float) -> str:
     if ton_amt >= 50:
@@ -473,7 +911,7 @@ def ton_price_usd() -> float:
     if not TON_PRICE_API:
         return 0.0
     try:
-        r = requests.get(TON_PRICE_API, timeout=10).json()
+        r = http_get("ton_price", TON_PRICE_API, timeout=10).json()
         return float(r["the-open-network"]["usd"])
     except:
         return 0.0
@@ -518,12 +956,14 @@ def book_trending_only_button():
     ])
 
 
+# ✅ User requested: Chart/Trending/Pools should be TEXT LINKS inside the message, not buttons.
+# Keep only the Book Trending button (static, built once).
+BUY_ALERT_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Book Trending", url=BOOK_TRENDING_URL)]
+])
+
 def buy_alert_keyboard(chart_url: str, pools_url: str) -> InlineKeyboardMarkup:
-    # ✅ User requested: Chart/Trending/Pools should be TEXT LINKS inside the message, not buttons.
-    # Keep only the Book Trending button.
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("Book Trending", url=BOOK_TRENDING_URL)]
-    ])
+    return BUY_ALERT_KEYBOARD
 
 def leaderboard_button():
     return InlineKeyboardMarkup([
@@ -626,7 +1066,7 @@ def parse_addtoken_message_text(msg_text: str) -> Optional[Tuple[str, str, Optio
 def ston_latest_block() -> Optional[int]:
     global LAST_HTTP_INFO
     try:
-        res = requests.get(LATEST_BLOCK_URL, headers=STON_HEADERS, timeout=12)
+        res = http_get("ston", LATEST_BLOCK_URL, headers=STON_HEADERS, timeout=12)
         LAST_HTTP_INFO = f"latest-block status={res.status_code}"
         if res.status_code != 200:
             return None
@@ -642,7 +1082,7 @@ def ston_events(from_block: int, to_block: int) -> List[Dict[str, Any]]:
     global LAST_HTTP_INFO, LAST_EVENTS_COUNT
     params = {"fromBlock": from_block, "toBlock": to_block}
     try:
-        res = requests.get(EVENTS_URL, params=params, headers=STON_HEADERS, timeout=20)
+        res = http_get("ston", EVENTS_URL, params=params, headers=STON_HEADERS, timeout=20)
         LAST_HTTP_INFO = f"events status={res.status_code} params={params}"
         if res.status_code != 200:
             LAST_EVENTS_COUNT = 0
@@ -653,6 +1093,9 @@ def ston_events(from_block: int, to_block: int) -> List[Dict[str, Any]]:
             evs = [x for x in js if isinstance(x, dict)]
         elif isinstance(js, dict) and isinstance(js.get("events"), list):
             evs = [x for x in js["events"] if isinstance(x, dict)]
+        now = time.time()
+        for ev in evs:
+            ev["_fetched"] = now  # latency trace
         LAST_EVENTS_COUNT = len(evs)
         return evs
     except Exception as e:
@@ -662,23 +1105,22 @@ def ston_events(from_block: int, to_block: int) -> List[Dict[str, Any]]:
 
 # ===================== DEXSCREENER HELPERS =====================
 def fetch_pair_stats(pair_id: str) -> Dict[str, Any]:
-    now = time.time()
     cached = PAIR_CACHE.get(pair_id)
-    if cached and (now - cached.get("_ts", 0) < PAIR_CACHE_TTL):
+    if cached is not None:
         return cached
 
-    out = {"liquidity_usd": None, "marketcap_usd": None, "volume_h6_usd": None, "_ts": now}
+    out = {"liquidity_usd": None, "marketcap_usd": None, "volume_h6_usd": None, "price_change": {}, "volume_usd": {}}
     url = f"{DEX_PAIR_URL}/{pair_id}"
     try:
-        res = requests.get(url, timeout=15)
+        res = http_get("dexscreener", url, timeout=15)
         if res.status_code != 200:
-            PAIR_CACHE[pair_id] = out
+            PAIR_CACHE.set(pair_id, out, negative=True)
             return out
 
         js = res.json()
         pairs = js.get("pairs") if isinstance(js, dict) else None
         if not isinstance(pairs, list) or not pairs or not isinstance(pairs[0], dict):
-            PAIR_CACHE[pair_id] = out
+            PAIR_CACHE.set(pair_id, out, negative=True)
             return out
 
         p0 = pairs[0]
@@ -691,23 +1133,33 @@ def fetch_pair_stats(pair_id: str) -> Dict[str, Any]:
         fdv_val = safe_float(p0.get("fdv"))
         out["marketcap_usd"] = mc_val if mc_val > 0 else (fdv_val if fdv_val > 0 else None)
 
-        # 6H volume (USD)
+        # Volume (USD) and price change for every timeframe (leaderboard columns)
         vol = p0.get("volume")
         if isinstance(vol, dict):
-            vh6 = vol.get("h6")
-            if isinstance(vh6, dict):
-                out["volume_h6_usd"] = safe_float(vh6.get("usd"))
+            for tf in TIMEFRAMES:
+                v = vol.get(tf)
+                if isinstance(v, dict):  # some payloads nest {"usd": ...}
+                    v = v.get("usd")
+                if v is not None:
+                    out["volume_usd"][tf] = safe_float(v)
+            out["volume_h6_usd"] = out["volume_usd"].get("h6")
+        pc = p0.get("priceChange")
+        if isinstance(pc, dict):
+            for tf in TIMEFRAMES:
+                if pc.get(tf) is not None:
+                    out["price_change"][tf] = safe_float(pc.get(tf))
 
     except:
-        pass
+        PAIR_CACHE.set(pair_id, out, negative=True)
+        return out
 
-    PAIR_CACHE[pair_id] = out
+    PAIR_CACHE.set(pair_id, out)
     return out
 
 
 
 # ===================== TOKEN STATS FALLBACK =====================
-TOKEN_STATS_CACHE: Dict[str, Dict[str, Any]] = {}
+TOKEN_STATS_CACHE = TTLCache("token_stats", PAIR_CACHE_MAX, PAIR_CACHE_TTL, negative_ttl=PAIR_CACHE_NEG_TTL)
 
 def fetch_token_stats(token_addr: str) -> Dict[str, Any]:
     """Fallback stats using DexScreener token endpoint.
@@ -715,22 +1167,21 @@ def fetch_token_stats(token_addr: str) -> Dict[str, Any]:
     Returns liquidity_usd and marketcap_usd derived from the best TON pair for this token.
     Used when pair endpoint returns missing metrics (common for some pools / v2 / wrappers).
     """
-    now = time.time()
     cached = TOKEN_STATS_CACHE.get(token_addr)
-    if cached and (now - cached.get("_ts", 0) < PAIR_CACHE_TTL):
+    if cached is not None:
         return cached
 
-    out = {"liquidity_usd": None, "marketcap_usd": None, "price_usd": None, "_ts": now}
+    out = {"liquidity_usd": None, "marketcap_usd": None, "price_usd": None}
     try:
         url = f"{DEX_TOKEN_URL}/{token_addr}"
-        res = requests.get(url, timeout=15)
+        res = http_get("dexscreener", url, timeout=15)
         if res.status_code != 200:
-            TOKEN_STATS_CACHE[token_addr] = out
+            TOKEN_STATS_CACHE.set(token_addr, out, negative=True)
             return out
         js = res.json()
         pairs = js.get("pairs") if isinstance(js, dict) else None
         if not isinstance(pairs, list) or not pairs:
-            TOKEN_STATS_CACHE[token_addr] = out
+            TOKEN_STATS_CACHE.set(token_addr, out, negative=True)
             return out
 
         best = None
@@ -755,31 +1206,31 @@ def fetch_token_stats(token_addr: str) -> Dict[str, Any]:
             out["price_usd"] = price_val if price_val > 0 else None
 
     except:
-        pass
+        TOKEN_STATS_CACHE.set(token_addr, out, negative=True)
+        return out
 
-    TOKEN_STATS_CACHE[token_addr] = out
+    TOKEN_STATS_CACHE.set(token_addr, out, negative=out["liquidity_usd"] is None and out["marketcap_usd"] is None)
     return out
 
 # ===================== PAIR META (TON LEG) =====================
-PAIR_META_CACHE: Dict[str, Dict[str, Any]] = {}
+PAIR_META_CACHE = TTLCache("pair_meta", PAIR_CACHE_MAX, PAIR_CACHE_TTL, negative_ttl=PAIR_CACHE_NEG_TTL)
 
 def fetch_pair_meta(pair_id: str) -> Dict[str, Any]:
     """Fetch base/quote symbols from DexScreener pair endpoint."""
-    now = time.time()
     cached = PAIR_META_CACHE.get(pair_id)
-    if cached and (now - cached.get("_ts", 0) < PAIR_CACHE_TTL):
+    if cached is not None:
         return cached
-    out = {"base_sym": None, "quote_sym": None, "dex_id": None, "_ts": now}
+    out = {"base_sym": None, "quote_sym": None, "dex_id": None}
     try:
         url = f"{DEX_PAIR_URL}/{pair_id}"
-        res = requests.get(url, timeout=15)
+        res = http_get("dexscreener", url, timeout=15)
         if res.status_code != 200:
-            PAIR_META_CACHE[pair_id] = out
+            PAIR_META_CACHE.set(pair_id, out, negative=True)
             return out
         js = res.json()
         pairs = js.get("pairs") if isinstance(js, dict) else None
         if not isinstance(pairs, list) or not pairs or not isinstance(pairs[0], dict):
-            PAIR_META_CACHE[pair_id] = out
+            PAIR_META_CACHE.set(pair_id, out, negative=True)
             return out
         p0 = pairs[0]
         base = p0.get("baseToken") or {}
@@ -788,8 +1239,9 @@ def fetch_pair_meta(pair_id: str) -> Dict[str, Any]:
         out["quote_sym"] = (quote.get("symbol") or "").upper() or None
         out["dex_id"] = (p0.get("dexId") or "") or None
     except:
-        pass
-    PAIR_META_CACHE[pair_id] = out
+        PAIR_META_CACHE.set(pair_id, out, negative=True)
+        return out
+    PAIR_META_CACHE.set(pair_id, out)
     return out
 
 
@@ -804,108 +1256,145 @@ def dex_label_from_dex_id(dex_id: str) -> str:
         return "STON.fi"
     return "DEX"
 
-def ensure_pair_ton_leg(pair_id: str) -> Optional[int]:
-    """Store which token leg is TON for STON events: 0=base(amount0), 1=quote(amount1)."""
+def ensure_pair_ton_leg(pair_id: str, fetch: bool = False) -> Optional[int]:
+    """Store which token leg is TON for STON events: 0=base(amount0), 1=quote(amount1).
+
+    Reads the pair record / META only. With fetch=True (admin commands, warm job)
+    a missing entry is looked up on DexScreener; on the detection path it is
+    queued for meta_warm_job instead.
+    """
     rec = DATA.get("pairs", {}).get(pair_id)
     if not isinstance(rec, dict):
         return None
     ton_leg = rec.get("ton_leg")
     if ton_leg in (0, 1):
         return int(ton_leg)
-    meta = fetch_pair_meta(pair_id)
+    pm = META.get("pairs", {}).get(pair_id)
+    if not (isinstance(pm, dict) and pm.get("ton_leg") in (0, 1)):
+        if not fetch:
+            if _pair_meta_missing(pm):
+                META_PENDING_PAIRS.add(pair_id)
+            return None
+        pm = prefetch_pair_meta(pair_id, dex=str(rec.get("dex") or ""))
     # Cache human DEX label for multi-dex title (STON.fi / Stonfi v2 / DeDust)
-    if isinstance(meta, dict) and not rec.get("dex_label"):
-        rec["dex_label"] = dex_label_from_dex_id(meta.get("dex_id") or "")
-    base_sym = meta.get("base_sym")
-    quote_sym = meta.get("quote_sym")
-    if base_sym == "TON":
-        ton_leg = 0
-    elif quote_sym == "TON":
-        ton_leg = 1
-    else:
-        ton_leg = None
-    if ton_leg is not None:
-        rec["ton_leg"] = ton_leg
-        # persist quietly
-        try:
-            save_data()
-        except:
-            pass
+    patch: Dict[str, Any] = {}
+    if pm.get("dex_label") and not rec.get("dex_label"):
+        patch["dex_label"] = pm["dex_label"]
+    ton_leg = pm.get("ton_leg")
+    if ton_leg in (0, 1):
+        patch["ton_leg"] = ton_leg
+    if patch:
+        # written out by data_flush_job
+        STORE.merge(("pairs", pair_id), patch, require=2)
     return ton_leg
-def find_pair_for_token_on_dex(token_address: str, want_dex: str) -> Optional[str]:
+def _ton_pair_info(p: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Normalized TON pair from a DexScreener token-endpoint item (None if not a TON pair)."""
+    if (p.get("chainId") or "").lower() != "ton":
+        return None
+    base = p.get("baseToken") or {}
+    quote = p.get("quoteToken") or {}
+    base_sym = (base.get("symbol") or "").upper()
+    quote_sym = (quote.get("symbol") or "").upper()
+    if base_sym != "TON" and quote_sym != "TON":
+        return None
+
+    pair_id = (p.get("pairAddress") or p.get("pairId") or p.get("pair") or "").strip()
+    if not pair_id:
+        u = (p.get("url") or "")
+        if "/ton/" in u:
+            pair_id = u.split("/ton/")[-1].split("?")[0].strip()
+    if not pair_id:
+        return None
+
+    # Choose "best" pool: prefer higher liquidity (USD) then volume (24h)
+    liq = 0.0
+    vol = 0.0
+    try:
+        liq = float(((p.get("liquidity") or {}).get("usd") or 0) or 0)
+    except:
+        liq = 0.0
+    try:
+        vol = float(((p.get("volume") or {}).get("h24") or 0) or 0)
+    except:
+        vol = 0.0
+    return {
+        "pair_id": pair_id,
+        "dex_id": (p.get("dexId") or "").lower(),
+        "base_sym": base_sym or None,
+        "quote_sym": quote_sym or None,
+        "score": liq * 1_000_000 + vol,
+    }
+
+def find_ton_pairs_for_token(token_address: str) -> Optional[Dict[str, Optional[Dict[str, Any]]]]:
+    """Best STON.fi and DeDust TON pools for a token from ONE DexScreener call.
+
+    Returns {"stonfi": info|None, "dedust": info|None}, or None if the request failed.
+    """
     url = f"{DEX_TOKEN_URL}/{token_address}"
     try:
-        res = requests.get(url, timeout=20)
+        res = http_get("dexscreener", url, timeout=20)
         if res.status_code != 200:
             return None
         js = res.json()
         pairs = js.get("pairs") if isinstance(js, dict) else None
-        if not isinstance(pairs, list):
-            return None
-
-        want = want_dex.lower()
-        best_pair_id = None
-        best_score = -1.0
-
-        for p in pairs:
-            if not isinstance(p, dict):
-                continue
-            dex_id = (p.get("dexId") or "").lower()
-            chain_id = (p.get("chainId") or "").lower()
-            if chain_id != "ton":
-                continue
-
-            if want == "stonfi" and "ston" not in dex_id:
-                continue
-            if want == "dedust" and "dedust" not in dex_id:
-                continue
-
-            base = p.get("baseToken") or {}
-            quote = p.get("quoteToken") or {}
-            base_sym = (base.get("symbol") or "").upper()
-            quote_sym = (quote.get("symbol") or "").upper()
-
-            if base_sym == "TON" or quote_sym == "TON":
-                pair_id = (p.get("pairAddress") or p.get("pairId") or p.get("pair") or "").strip()
-                if not pair_id:
-                    u = (p.get("url") or "")
-                    if "/ton/" in u:
-                        pair_id = u.split("/ton/")[-1].split("?")[0].strip()
-                if not pair_id:
-                    continue
-
-                # Choose "best" pool: prefer higher liquidity (USD) then volume (24h)
-                liq = 0.0
-                vol = 0.0
-                try:
-                    liq = float(((p.get("liquidity") or {}).get("usd") or 0) or 0)
-                except:
-                    liq = 0.0
-                try:
-                    vol = float(((p.get("volume") or {}).get("h24") or 0) or 0)
-                except:
-                    vol = 0.0
-                score = liq * 1_000_000 + vol
-                if score > best_score:
-                    best_score = score
-                    best_pair_id = pair_id
-
-        return best_pair_id
     except:
         return None
 
-def find_stonfi_ton_pair_for_token(token_address: str) -> Optional[str]:
-    return find_pair_for_token_on_dex(token_address, "stonfi")
+    best: Dict[str, Optional[Dict[str, Any]]] = {"stonfi": None, "dedust": None}
+    if not isinstance(pairs, list):
+        return best
+    for p in pairs:
+        if not isinstance(p, dict):
+            continue
+        info = _ton_pair_info(p)
+        if not info:
+            continue
+        dex_id = info["dex_id"]
+        want = "dedust" if "dedust" in dex_id else ("stonfi" if "ston" in dex_id else None)
+        if want and (best[want] is None or info["score"] > best[want]["score"]):
+            best[want] = info
+    return best
+
+def pick_listing(found: Optional[Dict[str, Optional[Dict[str, Any]]]]) -> Tuple[Optional[str], str, Optional[Dict[str, Any]]]:
+    """(pair_id, dex, info) preferring STON.fi over DeDust, like /addtoken always did."""
+    if found:
+        for dex in ("stonfi", "dedust"):
+            info = found.get(dex)
+            if info:
+                return info["pair_id"], dex, info
+    return None, "dedust", None
+
+def store_pair_meta_from_info(info: Dict[str, Any], dex: str) -> Dict[str, Any]:
+    """Write META["pairs"] from a token-endpoint pair (no extra pair lookup)."""
+    base_sym = info.get("base_sym")
+    quote_sym = info.get("quote_sym")
+    out = {
+        "ton_leg": 0 if base_sym == "TON" else (1 if quote_sym == "TON" else None),
+        "dex_label": "DeDust" if dex == "dedust" else dex_label_from_dex_id(info.get("dex_id") or ""),
+        "base_sym": base_sym,
+        "quote_sym": quote_sym,
+        "dex_id": info.get("dex_id"),
+        "ts": int(time.time()),
+    }
+    META.setdefault("pairs", {})[info["pair_id"]] = out
+    META_PENDING_PAIRS.discard(info["pair_id"])
+    try:
+        save_meta()
+    except:
+        pass
+    return out
 
-def find_dedust_ton_pair_for_token(token_address: str) -> Optional[str]:
-    return find_pair_for_token_on_dex(token_address, "dedust")
+def find_pair_for_token_on_dex(token_address: str, want_dex: str) -> Optional[str]:
+    found = find_ton_pairs_for_token(token_address)
+    info = (found or {}).get(want_dex.lower())
+    return info["pair_id"] if info else None
 
 def fetch_token_telegram_url_from_dexscreener(token_address: str) -> Optional[str]:
     if not token_address:
         return None
     url = f"{DEX_TOKEN_URL}/{token_address}"
     try:
-        res = requests.get(url, timeout=20)
+        res = http_get("dexscreener", url, timeout=20)
         if res.status_code != 200:
             return None
         js = res.json()
@@ -935,27 +1424,9 @@ def fetch_token_telegram_url_from_dexscreener(token_address: str) -> Optional[st
     return None
 
 def fetch_pair_change(pair_id: str, tf: str = "h6") -> Optional[float]:
-    try:
-        url = f"{DEX_PAIR_URL}/{pair_id}"
-        res = requests.get(url, timeout=15)
-        if res.status_code != 200:
-            return None
-        js = res.json()
-        pairs = js.get("pairs") if isinstance(js, dict) else None
-        if not isinstance(pairs, list) or not pairs or not isinstance(pairs[0], dict):
-            return None
-
-        p0 = pairs[0]
-        pc = p0.get("priceChange") or {}
-        if not isinstance(pc, dict):
-            return None
-
-        v = pc.get(tf)
-        if v is None:
-            return None
-        return float(v)
-    except:
-        return None
+    """Price change % for a timeframe (same cached request as fetch_pair_stats)."""
+    v = (fetch_pair_stats(pair_id).get("price_change") or {}).get(tf)
+    return float(v) if v is not None else None
 
 # ===================== TONAPI =====================
 def tonapi_headers() -> Dict[str, str]:
@@ -965,9 +1436,21 @@ def tonapi_headers() -> Dict[str, str]:
 
 def tonapi_get(url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     try:
-        res = requests.get(url, headers=tonapi_headers(), params=params, timeout=20)
+        res = http_get("tonapi", url, headers=tonapi_headers(), params=params, timeout=20)
+        if res.status_code == 401 and TONAPI_KEY:
+            res = http_get("tonapi", url, headers={"X-API-Key": TONAPI_KEY, "Accept": "application/json"}, params=params, timeout=20)
+        if res.status_code != 200:
+            return None
+        js = res.json()
+        return js if isinstance(js, dict) else None
+    except:
+        return None
+
+def tonapi_post(url: str, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    try:
+        res = http_post("tonapi", url, headers=tonapi_headers(), json=body, timeout=20)
         if res.status_code == 401 and TONAPI_KEY:
-            res = requests.get(url, headers={"X-API-Key": TONAPI_KEY, "Accept": "application/json"}, params=params, timeout=20)
+            res = http_post("tonapi", url, headers={"X-API-Key": TONAPI_KEY, "Accept": "application/json"}, json=body, timeout=20)
         if res.status_code != 200:
             return None
         js = res.json()
@@ -977,30 +1460,169 @@ def tonapi_get(url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Di
 
 
 # ===================== Jetton meta cache (decimals) =====================
-JETTON_DECIMALS_CACHE: Dict[str, int] = {}
+# In-memory front of META["jettons"]; filled from meta.json at startup and by
+# the prefetch helpers below. The buy parsers only ever read from it.
+JETTON_DECIMALS_CACHE = TTLCache("jetton_decimals", int(os.getenv("JETTON_CACHE_MAX", "5000")), JETTON_META_TTL)
+
+# Jettons / pairs seen on the hot path without metadata; meta_warm_job fills them.
+META_PENDING_JETTONS: set = set()
+META_PENDING_PAIRS: set = set()
+
+def _cached_decimals(jetton_master: str) -> Optional[int]:
+    dec = JETTON_DECIMALS_CACHE.get(jetton_master)
+    if dec is not None:
+        return dec
+    jm = META.get("jettons", {}).get(jetton_master)
+    if isinstance(jm, dict) and isinstance(jm.get("decimals"), int):
+        JETTON_DECIMALS_CACHE.set(jetton_master, jm["decimals"])
+        return jm["decimals"]
+    return None
 
 def get_jetton_decimals(jetton_master: str) -> int:
-    """Best-effort decimals lookup via TonAPI. Defaults to 9."""
+    """Cached decimals lookup (no network). Trackers call ensure_jetton_decimals
+    first; 9 only if TonAPI could not tell us."""
     if not jetton_master:
         return 9
-    if jetton_master in JETTON_DECIMALS_CACHE:
-        return JETTON_DECIMALS_CACHE[jetton_master]
-    dec = 9
+    dec = _cached_decimals(jetton_master)
+    if dec is not None:
+        return dec
+    META_PENDING_JETTONS.add(jetton_master)
+    return 9
+
+async def ensure_jetton_decimals(addresses: List[str]) -> None:
+    """One bulk TonAPI fetch for the masters without cached decimals, before
+    their buys are parsed (a guessed 9 puts 6-decimal amounts 1000x off).
+    Masters that failed recently are skipped; meta_warm_job retries them."""
+    missing = {a for a in addresses if a and _cached_decimals(a) is None}
+    if missing and reload_meta():
+        # a shard worker loads meta.json once; another process may have fetched these already
+        missing = {a for a in missing if _cached_decimals(a) is None}
+    missing = {a for a in missing if JETTON_META_MISSES.due(a)}
+    if missing:
+        await _to_thread(prefetch_jetton_meta, list(missing), single=False)
+
+def _jetton_meta_from_info(info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    md = info.get("metadata") if isinstance(info, dict) else None
+    if not isinstance(md, dict):
+        return None
+    dec = md.get("decimals")
+    if isinstance(dec, str) and dec.isdigit():
+        dec = int(dec)
+    if not isinstance(dec, int):
+        dec = 9
+    return {
+        "decimals": dec,
+        "symbol": (md.get("symbol") or "").strip().upper() or None,
+        "ts": int(time.time()),
+    }
+
+def tonapi_jettons_bulk(addresses: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Jetton metadata for many masters in one TonAPI call.
+
+    Returns { raw_address: JettonInfo }. Empty dict on failure.
+    """
+    if not addresses:
+        return {}
+    url = f"{TONAPI_BASE.rstrip('/')}/v2/jettons/_bulk"
+    js = tonapi_post(url, {"account_ids": addresses})
+    out: Dict[str, Dict[str, Any]] = {}
+    arr = js.get("jettons") if js else None
+    if isinstance(arr, list):
+        for info in arr:
+            if not isinstance(info, dict):
+                continue
+            md = info.get("metadata") or {}
+            raw = to_raw_address(md.get("address") if isinstance(md, dict) else "")
+            if raw:
+                out[raw] = info
+    return out
+
+def prefetch_jetton_meta(addresses: List[str], force: bool = False, single: bool = True) -> int:
+    """Blocking: fill META["jettons"] for the given masters (bulk first, then
+    one by one unless single=False). Masters still without metadata go to
+    JETTON_META_MISSES.
+
+    Returns how many entries were written.
+    """
+    jettons = META.setdefault("jettons", {})
+    todo = list(dict.fromkeys(
+        a for a in ((a or "").strip() for a in addresses) if a and (force or a not in jettons)
+    ))
+    if not todo:
+        return 0
+
+    written = 0
+    by_raw: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(todo), 100):
+        by_raw.update(tonapi_jettons_bulk(todo[i:i + 100]))
+
+    for a in todo:
+        info = by_raw.get(to_raw_address(a))
+        if info is None and single:
+            info = tonapi_get(f"{TONAPI_BASE.rstrip('/')}/v2/jettons/{a}")
+        m = _jetton_meta_from_info(info) if info else None
+        if not m:
+            JETTON_META_MISSES.miss(a)
+            continue
+        jettons[a] = m
+        JETTON_DECIMALS_CACHE.set(a, m["decimals"])
+        JETTON_META_MISSES.clear(a)
+        META_PENDING_JETTONS.discard(a)
+        written += 1
+
+    if written:
+        try:
+            save_meta()
+        except:
+            pass
+    return written
+
+def prefetch_pair_meta(pair_id: str, dex: str = "", force: bool = False) -> Dict[str, Any]:
+    """Blocking: fill META["pairs"][pair_id] with ton_leg + dex_label from DexScreener."""
+    pairs = META.setdefault("pairs", {})
+    cur = pairs.get(pair_id)
+    if not force and not _pair_meta_missing(cur):
+        return cur
+
+    meta = fetch_pair_meta(pair_id)
+    base_sym = meta.get("base_sym")
+    quote_sym = meta.get("quote_sym")
+    if base_sym == "TON":
+        ton_leg = 0
+    elif quote_sym == "TON":
+        ton_leg = 1
+    else:
+        ton_leg = None
+
+    if (dex or "").lower() == "dedust":
+        dex_label = "DeDust"
+    else:
+        dex_label = dex_label_from_dex_id(meta.get("dex_id") or "") if meta.get("dex_id") else None
+
+    out = {
+        "ton_leg": ton_leg,
+        "dex_label": dex_label,
+        "base_sym": base_sym,
+        "quote_sym": quote_sym,
+        "dex_id": meta.get("dex_id"),
+        "ts": int(time.time()),
+    }
+    # stored even without TON leg / label: a negative entry, rechecked after PAIR_META_MISS_TTL
+    pairs[pair_id] = out
+    META_PENDING_PAIRS.discard(pair_id)
     try:
-        js = tonapi_get(f"{TONAPI_BASE.rstrip('/')}/v2/jettons/{jetton_master}")
-        if isinstance(js, dict):
-            md = js.get("metadata")
-            if isinstance(md, dict):
-                d = md.get("decimals")
-                if isinstance(d, str) and d.isdigit():
-                    dec = int(d)
-                elif isinstance(d, int):
-                    dec = d
+        save_meta()
     except:
         pass
-    JETTON_DECIMALS_CACHE[jetton_master] = dec
-    return dec
+    return out
 
+def _pair_meta_missing(pm: Any) -> bool:
+    """No usable META["pairs"] entry and no recent negative one."""
+    if not isinstance(pm, dict):
+        return True
+    if pm.get("ton_leg") in (0, 1) or pm.get("dex_label"):
+        return False
+    return time.time() - (safe_int(pm.get("ts")) or 0) > PAIR_META_MISS_TTL
 
 def dedust_fetch_trades(pool_addr: str, limit: int = 25) -> List[Dict[str, Any]]:
     """Fetch recent trades for a DeDust pool.
@@ -1010,16 +1632,19 @@ def dedust_fetch_trades(pool_addr: str, limit: int = 25) -> List[Dict[str, Any]]
         return []
     url = f"{DEDUST_API_BASE}/v2/pools/{pool_addr}/trades"
     try:
-        res = requests.get(url, params={"limit": limit}, timeout=20)
+        res = http_get("dedust", url, params={"limit": limit}, timeout=20)
         if res.status_code != 200:
             return []
         js = res.json()
-        if isinstance(js, list):
-            return [t for t in js if isinstance(t, dict)]
+        arr = js if isinstance(js, list) else None
         if isinstance(js, dict):
             arr = js.get("trades") or js.get("items") or js.get("data")
-            if isinstance(arr, list):
-                return [t for t in arr if isinstance(t, dict)]
+        if isinstance(arr, list):
+            now = time.time()
+            out = [t for t in arr if isinstance(t, dict)]
+            for t in out:
+                t["_fetched"] = now  # latency trace
+            return out
     except:
         pass
     return []
@@ -1108,7 +1733,11 @@ def tonapi_account_transactions(address: str, limit: int = 10) -> List[Dict[str,
     js = tonapi_get(url, params={"limit": limit})
     txs = js.get("transactions") if js else None
     if isinstance(txs, list):
-        return [t for t in txs if isinstance(t, dict)]
+        now = time.time()
+        out = [t for t in txs if isinstance(t, dict)]
+        for t in out:
+            t["_fetched"] = now  # latency trace
+        return out
     return []
 
 # ===================== BUY DETECTION: STON (TONAPI FAST PATH) =====================
@@ -1219,15 +1848,99 @@ def stonfi_extract_buys_from_tonapi_tx(tx: Dict[str, Any], token_addr: str) -> L
                 out.append({"buyer": buyer, "ton": ton_spent, "token_amt": token_received, "tx": tx_hash, "lt": _tx_lt(tx)})
     return out
 
-async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE):
+def _ston_pool_fresh_txs(pool_addr: str, txs: List[Dict[str, Any]], last_lt_map: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return txs newer than the pool cursor (oldest -> newest) and advance the cursor."""
+    last_lt = last_lt_map.get(pool_addr, 0)
+    try:
+        last_lt = int(last_lt) if str(last_lt).isdigit() else int(last_lt or 0)
+    except Exception:
+        last_lt = 0
+
+    # Graduated Blum token: no cursor yet, start right where the Blum tracker stopped
+    floor_map = STATE.get("pool_floor_utime")
+    floor = safe_int(floor_map.get(pool_addr)) if isinstance(floor_map, dict) and not last_lt else None
+
+    # tonapi returns newest-first
+    fresh_txs = []
+    newest_lt = 0
+    for tx in txs:
+        lt = _tx_lt(tx)
+        if lt > newest_lt:
+            newest_lt = lt
+        if last_lt and lt <= last_lt:
+            continue
+        if floor and (safe_int(tx.get("utime")) or 0) < floor:
+            continue
+        fresh_txs.append(tx)
+
+    if newest_lt > last_lt:
+        last_lt_map[pool_addr] = newest_lt
+        if floor:
+            floor_map.pop(pool_addr, None)
+        save_state()
+
+    # process oldest -> newest
+    fresh_txs.sort(key=_tx_lt)
+    return fresh_txs
+
+async def _post_ston_tonapi_txs(
+    context: ContextTypes.DEFAULT_TYPE,
+    pool_addr: str,
+    rec: Dict[str, Any],
+    token_addr: str,
+    fresh_txs: List[Dict[str, Any]],
+    via: str = "poll",
+):
+    """Parse fresh TonAPI pool txs (oldest first) and post every new buy."""
+    sym = (rec.get("symbol") or "?").strip().upper()
+    if fresh_txs:
+        await ensure_jetton_decimals([token_addr])  # no-op when cached (fast path batches it)
+
+    for tx in fresh_txs:
+        buys = stonfi_extract_buys_from_tonapi_tx(tx, token_addr)
+        if not buys:
+            continue
+        parsed_at = time.time()
+        for buy in buys:
+            txh = (buy.get("tx") or "").strip()
+            if not txh:
+                continue
+            if not ston_claim_tx(pool_addr, txh, via):
+                continue
+            trace = BUY_TRACER.start("ston_fast", via, tx.get("utime"), buy.get("lt"), tx.get("_fetched"))
+            trace_mark(trace, "parsed", parsed_at)
+            trace_mark(trace, "deduped")
+
+            buyer = (buy.get("buyer") or "").strip()
+            ton_amt = safe_float(buy.get("ton"))
+            token_amt = safe_float(buy.get("token_amt"))
+
+            pos_txt = "New Holder!" if record_buyer("pairs", pool_addr, buyer) else "Existing Holder"
+
+            await post_buy_message(
+                context=context,
+                sym=sym,
+                token_addr=token_addr,
+                pair_id=pool_addr,
+                buyer=buyer,
+                tx_hash=txh,
+                ton_amt=ton_amt,
+                token_amt=token_amt,
+                pos_txt=pos_txt,
+                source_label=(rec.get("dex_label") or "STON.fi"),
+                trace=trace,
+            )
+
+async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE, reload: bool = True):
     """FAST STON tracker using TonAPI pool transactions (lower latency than export feed)."""
     if not TONAPI_KEY:
         return
 
     try:
-        cleanup_seen()
-        load_data()
-        load_state()
+        if reload:
+            cleanup_seen()
+            load_data()
+            load_state()
 
         last_lt_map = STATE.get("ston_last_lt_map")
         if not isinstance(last_lt_map, dict):
@@ -1242,18 +1955,33 @@ async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE):
             if str(rec.get("dex", "")).lower() != "stonfi":
                 continue
             token_addr = (rec.get("token_address") or "").strip()
-            if not token_addr:
+            if not token_addr or not owns_pool(pool):
                 continue
             pools.append((pool, rec, token_addr))
 
+        # Stream mode: poll only accounts the stream doesn't cover, plus a
+        # periodic verify pass over all of them to catch missed notifications.
+        verify = False
+        if DETECTION_MODE == "stream":
+            now = time.time()
+            verify = now - STREAM_STATS["last_verify"] >= STREAM_VERIFY_INTERVAL
+            if verify:
+                STREAM_STATS["last_verify"] = now
+            else:
+                pools = [p for p in pools if not stream_covers(p[0])]
+            STREAM_STATS["polled_pools"] = len(pools)
+
         if not pools:
             return
 
         sem = asyncio.Semaphore(int(os.getenv("STON_CONCURRENCY", "16")))
+        floor_map = STATE.get("pool_floor_utime") or {}
 
         async def _fetch_pool(pool_addr: str):
+            # first poll of a just-graduated pool pulls a deeper page so nothing since the handoff is missed
+            limit = BLUM_HANDOFF_LIMIT if pool_addr in floor_map and not last_lt_map.get(pool_addr) else 25
             async with sem:
-                txs = await _to_thread(tonapi_account_transactions, pool_addr, 25)
+                txs = await _to_thread(tonapi_account_transactions, pool_addr, limit)
                 return pool_addr, txs
 
         fetch_tasks = [asyncio.create_task(_fetch_pool(p[0])) for p in pools]
@@ -1267,78 +1995,26 @@ async def ston_tracker_job_fast(context: ContextTypes.DEFAULT_TYPE):
             if isinstance(pool_addr, str) and isinstance(txs, list):
                 txs_by_pool[pool_addr] = [t for t in txs if isinstance(t, dict)]
 
+        await ensure_jetton_decimals([t for p, _r, t in pools if txs_by_pool.get(p)])
+
         for pool_addr, rec, token_addr in pools:
             txs = txs_by_pool.get(pool_addr) or []
             if not txs:
                 continue
 
-            last_lt = last_lt_map.get(pool_addr, 0)
-            try:
-                last_lt = int(last_lt) if str(last_lt).isdigit() else int(last_lt or 0)
-            except Exception:
-                last_lt = 0
-
-            # tonapi returns newest-first
-            fresh_txs = []
-            newest_lt = 0
-            for tx in txs:
-                lt = _tx_lt(tx)
-                if lt > newest_lt:
-                    newest_lt = lt
-                if last_lt and lt <= last_lt:
-                    continue
-                fresh_txs.append(tx)
-
-            if newest_lt:
-                last_lt_map[pool_addr] = newest_lt
-                save_state()
+            cursor = safe_int(last_lt_map.get(pool_addr)) or 0
+            missed: List[Dict[str, Any]] = []
+            if verify and stream_covers(pool_addr):
+                missed = [t for t in stream_check_missed(pool_addr, txs, cursor) if _tx_lt(t) <= cursor]
 
+            fresh_txs = _ston_pool_fresh_txs(pool_addr, txs, last_lt_map)
+            if missed:
+                # skipped by the stream below its cursor; the ones past it are in fresh_txs
+                await _post_ston_tonapi_txs(context, pool_addr, rec, token_addr, missed)
             if not fresh_txs:
                 continue
 
-            # process oldest -> newest
-            fresh_txs.sort(key=_tx_lt)
-
-            sym = (rec.get("symbol") or "?").strip().upper()
-            buyer_map = rec.get("buyers")
-            if not isinstance(buyer_map, dict):
-                buyer_map = {}
-                rec["buyers"] = buyer_map
-
-            for tx in fresh_txs:
-                buys = stonfi_extract_buys_from_tonapi_tx(tx, token_addr)
-                if not buys:
-                    continue
-                for buy in buys:
-                    txh = (buy.get("tx") or "").strip()
-                    if not txh:
-                        continue
-                    seen_key = f"ston:{pool_addr}:{txh}"
-                    if seen_key in SEEN_TX_STON:
-                        continue
-                    SEEN_TX_STON[seen_key] = time.time()
-
-                    buyer = (buy.get("buyer") or "").strip()
-                    ton_amt = safe_float(buy.get("ton"))
-                    token_amt = safe_float(buy.get("token_amt"))
-
-                    pos_txt = "New Holder!" if buyer and buyer not in buyer_map else "Existing Holder"
-                    if buyer:
-                        buyer_map[buyer] = int(buyer_map.get(buyer, 0)) + 1
-                        save_data()
-
-                    await post_buy_message(
-                        context=context,
-                        sym=sym,
-                        token_addr=token_addr,
-                        pair_id=pool_addr,
-                        buyer=buyer,
-                        tx_hash=txh,
-                        ton_amt=ton_amt,
-                        token_amt=token_amt,
-                        pos_txt=pos_txt,
-                        source_label=(rec.get("dex_label") or "STON.fi"),
-                    )
+            await _post_ston_tonapi_txs(context, pool_addr, rec, token_addr, fresh_txs)
     except Exception as e:
         log.exception("ston_tracker_job_fast error: %s", e)
 
@@ -1579,43 +2255,295 @@ def blum_extract_buys_from_jetton_master_tx(tx: Dict[str, Any]) -> List[Dict[str
 
     return buys
 
-def tg_emoji(emoji_id: str, fallback: str) -> str:
-    # Return Telegram custom emoji HTML tag if a VALID numeric id is provided, else fallback.
-    emoji_id = (emoji_id or "").strip()
-    if not emoji_id.isdigit():
-        return fallback
-    return f"<tg-emoji emoji-id=\"{emoji_id}\">{fallback}</tg-emoji>"
-
-def strength_count_from_ton(ton_amt: float) -> int:
-    # Map TON amount to 1..28 strength icons.
-    try:
-        t = float(ton_amt or 0.0)
-    except Exception:
-        t = 0.0
-    return max(1, min(28, int(t // 2) + 1))
-
 def build_strength_bar(ton_amt: float) -> str:
-    # Two-line strength bar (up to 28 icons). No empty squares.
-    filled = strength_count_from_ton(ton_amt)
-    icon = tg_emoji(SPY_CUSTOM_EMOJI_ID, "🟢")
-    icons = [icon] * filled
-    line1 = "".join(icons[:14])
-    line2 = "".join(icons[14:28])
-    return f"{line1}\n{line2}\n" if line2 else f"{line1}\n"
+    # Two-line strength bar (up to 28 icons). No empty squares. Precomputed.
+    return BUY_TEMPLATES.bar(ton_amt)
 
 # ===================== MESSAGE SENDER =====================
-async def post_buy_message(
-    context: ContextTypes.DEFAULT_TYPE,
-    sym: str,
-    token_addr: str,
-    pair_id: str,
-    buyer: str,
+def _token_tg_url(pair_id: str, token_addr: str) -> Optional[str]:
+    rec = DATA["pairs"].get(pair_id, {})
+    tg_url = rec.get("telegram")
+    if not tg_url and token_addr:
+        for _wid, w in DATA.get("watch", {}).items():
+            if isinstance(w, dict) and (w.get("token_address") or "").strip() == (token_addr or "").strip():
+                tg_url = w.get("telegram")
+                break
+    return tg_url
+
+# Precomputed per-token targets + USD thresholds, rebuilt only when the mirror config changes:
+# {"sig": (group_mirrors dict, min_usd_buy), "global": usd, "by_key": {token_or_pair: [(chat_id, min_usd), ...]}}
+# Snapshots share unchanged dicts, so buyer counts do not invalidate it; any
+# edit of group_mirrors publishes a new dict (compared by identity).
+BUY_FILTER: Dict[str, Any] = {"sig": None, "global": MIN_USD_BUY, "by_key": {}}
+BUY_FILTER_STATS = {"dropped": 0, "trimmed": 0}
+
+def global_min_usd() -> float:
+    v = DATA.get("min_usd_buy")
+    return float(v) if isinstance(v, (int, float)) and 0 <= v < math.inf else MIN_USD_BUY
+
+def buy_filter_table() -> Dict[str, Any]:
+    """Per-chat USD minimums, rebuilt when DATA's mirrors or global minimum
+    change. Reads the current snapshot; the jobs and commands reload it."""
+    mirrors = DATA.get("group_mirrors", {})
+    prev = BUY_FILTER["sig"]
+    if prev is not None and prev[0] is mirrors and prev[1] == DATA.get("min_usd_buy"):
+        return BUY_FILTER
+
+    sig = (mirrors, DATA.get("min_usd_buy"))
+    glob = global_min_usd()
+    by_key: Dict[str, List[Tuple[int, float]]] = {}
+    if isinstance(mirrors, dict):
+        for cid_str, cfg in mirrors.items():
+            if not isinstance(cfg, dict):
+                continue
+            try:
+                cid = int(cid_str)
+            except:
+                continue
+            if cid == MASTER_CHANNEL_ID:
+                continue
+            m = cfg.get("min_usd")
+            min_usd = float(m) if isinstance(m, (int, float)) and 0 <= m < math.inf else glob
+            for k in {(cfg.get("token_address") or "").strip(), (cfg.get("pair_id") or "").strip()}:
+                if k:
+                    by_key.setdefault(k, []).append((cid, min_usd))
+
+    BUY_FILTER.update({"sig": sig, "global": glob, "by_key": by_key})
+    return BUY_FILTER
+
+def _buy_targets(token_addr: str, pair_id: str, usd_val: Optional[float] = None) -> Tuple[List[int], int]:
+    """Master channel + group mirrors for this token/pair whose USD minimum
+    the buy meets (usd_val None = price unknown, nobody filters), and how
+    many chats there are before the minimums."""
+    table = buy_filter_table()
+    targets: List[int] = []
+    seen = {MASTER_CHANNEL_ID}
+    if usd_val is None or usd_val >= table["global"]:
+        targets.append(MASTER_CHANNEL_ID)
+    for k in (token_addr.strip() if token_addr else "", pair_id.strip() if pair_id else ""):
+        for cid, min_usd in table["by_key"].get(k, ()) if k else ():
+            if cid not in seen:
+                seen.add(cid)
+                if usd_val is None or usd_val >= min_usd:
+                    targets.append(cid)
+    return targets, len(seen)
+
+def buy_source(source_label: str) -> str:
+    """Metrics label for a buy's detection source ("DEX" -> "dex", "STON.fi" -> "ston.fi")."""
+    return (source_label or "").strip().lower() or "dex"
+
+def record_buyer(section: str, key: str, buyer: str) -> bool:
+    """Count a buy in DATA[section][key]["buyers"]; True on the wallet's first buy.
+
+    One atomic store op, so two buys by a new wallet in one batch give one
+    "New Holder!". A record deleted meanwhile is not recreated. Shard
+    workers leave this to the poster.
+    """
+    if not buyer or SHARD_ROLE == "worker":
+        return False
+    return STORE.incr((section, key, "buyers", buyer), require=2) == 1
+
+def buy_usd_value(ton_amt: float, ton_usd: Optional[float] = None) -> Optional[float]:
+    ton_usd = ton_price_cache_value() if ton_usd is None else ton_usd
+    return ton_amt * ton_usd if ton_usd > 0 else None
+
+# ---------- buy coalescing ----------
+# token key -> {sym, token_addr, pair_id, source_label, until, buys: [...]}
+BUY_BURSTS: Dict[str, Dict[str, Any]] = {}
+BURST_STATS = {"merged": 0, "bursts": 0, "whales": 0}
+BURST_TASKS: set = set()  # flush tasks; the loop only keeps weak references
+
+def coalesce_buy(
+    context: ContextTypes.DEFAULT_TYPE,
+    sym: str,
+    token_addr: str,
+    pair_id: str,
+    buyer: str,
+    tx_hash: str,
+    ton_amt: float,
+    token_amt: float,
+    pos_txt: str,
+    source_label: str,
+    trace: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """True if the buy was absorbed into a burst (caller must not post it).
+
+    The first buy of a quiet token posts normally and opens a window; buys in
+    that window are collected and posted as one burst alert when it closes.
+    A window that collected buys is reopened right away, so a hot token gets
+    at most one post per BUY_COALESCE_SECONDS. Whale buys always post alone.
+    """
+    if BUY_COALESCE_SECONDS <= 0:
+        return False
+    if ton_amt >= BUY_WHALE_TON:
+        BURST_STATS["whales"] += 1
+        return False
+
+    key = (token_addr or pair_id or "").strip()
+    if not key:
+        return False
+    now = time.time()
+    burst = BUY_BURSTS.get(key)
+    if burst is None or burst["until"] <= now:
+        BUY_BURSTS[key] = {
+            "sym": sym,
+            "token_addr": token_addr,
+            "pair_id": pair_id,
+            "source_label": source_label,
+            "until": now + BUY_COALESCE_SECONDS,
+            "buys": [],
+        }
+        task = asyncio.create_task(_flush_burst_later(context, key))
+        BURST_TASKS.add(task)
+        task.add_done_callback(BURST_TASKS.discard)
+        return False
+
+    burst["buys"].append({
+        "buyer": buyer,
+        "tx": tx_hash,
+        "ton": float(ton_amt or 0.0),
+        "token_amt": float(token_amt or 0.0),
+        "new": "new" in (pos_txt or "").lower(),
+        "trace": trace,
+    })
+    BURST_STATS["merged"] += 1
+    return True
+
+async def _flush_burst_later(context: ContextTypes.DEFAULT_TYPE, key: str):
+    while True:
+        burst = BUY_BURSTS.get(key)
+        if burst is None:
+            return
+        await asyncio.sleep(max(0.0, burst["until"] - time.time()))
+        buys = burst["buys"]
+        if not buys:
+            BUY_BURSTS.pop(key, None)
+            return
+        burst["buys"] = []
+        burst["until"] = time.time() + BUY_COALESCE_SECONDS
+        try:
+            await post_burst_message(context, burst, buys)
+            BURST_STATS["bursts"] += 1
+        except Exception:
+            pass
+
+async def post_burst_message(context: ContextTypes.DEFAULT_TYPE, burst: Dict[str, Any], buys: List[Dict[str, Any]]):
+    """One alert for several buys of the same token."""
+    sym = burst["sym"]
+    token_addr = burst["token_addr"]
+    pair_id = burst["pair_id"]
+    lbl = (burst.get("source_label") or "").strip()
+
+    total_ton = sum(b["ton"] for b in buys)
+    total_tokens = sum(b["token_amt"] for b in buys)
+    buyers = {b["buyer"] for b in buys if b["buyer"]}
+    new_holders = len({b["buyer"] for b in buys if b["buyer"] and b["new"]})
+    largest = max(buys, key=lambda b: b["ton"])
+
+    ton_usd = ton_price_cache_value()
+    usd_val = total_ton * ton_usd if ton_usd > 0 else 0.0
+
+    chart_url = f"https://www.geckoterminal.com/ton/tokens/{token_addr}" if token_addr else f"https://dexscreener.com/ton/{pair_id}"
+    pools_url = f"https://dexscreener.com/ton/{pair_id}"
+    tg_url = _token_tg_url(pair_id, token_addr)
+
+    rendered = BUY_TEMPLATES.render_burst(
+        {
+            "sym": sym,
+            "lbl": lbl,
+            "count": len(buys),
+            "total_ton": total_ton,
+            "usd_val": usd_val,
+            "total_tokens": total_tokens,
+            "buyers": len(buyers),
+            "new_holders": new_holders,
+            "big_ton": largest["ton"],
+            "big_badge": buy_badge(largest["ton"]),
+            "big_url": f"https://tonviewer.com/{largest['buyer']}" if largest["buyer"] else "",
+            "big_short": short(largest["buyer"]),
+            "big_tx_url": make_tx_url(largest["tx"]),
+            "chart_url": chart_url,
+        },
+        tg_url,
+        get_forced_rank(sym) or get_auto_rank(sym),
+    )
+    text, group_text = rendered["master"], rendered["group"]
+
+    sent = 0
+    for chat_id in _buy_targets(token_addr, pair_id, buy_usd_value(total_ton, ton_usd))[0]:
+        try:
+            if chat_id == MASTER_CHANNEL_ID:
+                await tg_call("send_message", context.bot.send_message(
+                    chat_id=chat_id,
+                    text=text,
+                    parse_mode="HTML",
+                    reply_markup=buy_alert_keyboard(chart_url, pools_url),
+                    disable_web_page_preview=True,
+                ))
+            else:
+                await tg_call("send_message", context.bot.send_message(
+                    chat_id=chat_id,
+                    text=group_text,
+                    parse_mode="HTML",
+                    disable_web_page_preview=True,
+                ))
+            sent += 1
+        except Exception:
+            continue
+    if sent:
+        BUYS.inc(buy_source(lbl), "posted", n=len(buys))
+    sent_at = time.time()
+    for b in buys:
+        if sent:
+            trace_mark(b.get("trace"), "sent", sent_at)
+        BUY_TRACER.finish(b.get("trace"), "burst" if sent else "failed", sym=sym, pair=pair_id, tx=b["tx"], ton=b["ton"])
+
+async def post_buy_message(
+    context: ContextTypes.DEFAULT_TYPE,
+    sym: str,
+    token_addr: str,
+    pair_id: str,
+    buyer: str,
     tx_hash: str,
     ton_amt: float,
     token_amt: float,
     pos_txt: str,
     source_label: str = "DEX",
+    trace: Optional[Dict[str, Any]] = None,
 ):
+    if SHARD_ROLE == "worker":
+        # the poster dedups across workers, counts the holder and sends
+        await SHARD_WORKER.send({
+            "op": "buy", "sym": sym, "token_addr": token_addr, "pair_id": pair_id, "buyer": buyer,
+            "tx_hash": tx_hash, "ton_amt": ton_amt, "token_amt": token_amt, "source_label": source_label,
+            "trace": trace,
+        })
+        return
+    ton_usd = ton_price_cache_value()
+    src = buy_source(source_label)
+    BUYS.inc(src, "detected")
+    if trace is None:
+        trace = BUY_TRACER.start(src)
+    trace_info = {"sym": sym, "pair": pair_id, "tx": tx_hash, "ton": ton_amt}
+
+    # Feed the trend-rank window before composing so this buy already counts
+    if ton_amt > 0:
+        VOLUME.add(sym.upper(), ton_amt, ton_amt * ton_usd if ton_usd > 0 else 0.0)
+
+    # Dust filter before any enrichment / rendering / sends
+    usd_val = buy_usd_value(ton_amt, ton_usd)
+    targets, eligible = _buy_targets(token_addr, pair_id, usd_val)
+    if not targets:
+        BUY_FILTER_STATS["dropped"] += 1
+        BUYS.inc(src, "filtered")
+        BUY_TRACER.finish(trace, "filtered", **trace_info)
+        return
+
+    # Hot token: merged into the running burst alert instead of its own post
+    if coalesce_buy(context, sym, token_addr, pair_id, buyer, tx_hash, ton_amt, token_amt, pos_txt, source_label, trace):
+        BUYS.inc(src, "coalesced")
+        return
+
     # Build links early (no network)
     chart_url = f"https://www.geckoterminal.com/ton/tokens/{token_addr}" if token_addr else f"https://dexscreener.com/ton/{pair_id}"
     pools_url = f"https://dexscreener.com/ton/{pair_id}"
@@ -1626,90 +2554,52 @@ async def post_buy_message(
     lbl = (source_label or "").strip()
 
     # Get TG link if available
-    rec = DATA["pairs"].get(pair_id, {})
-    tg_url = rec.get("telegram")
-    if not tg_url and token_addr:
-        for _wid, w in DATA.get("watch", {}).items():
-            if isinstance(w, dict) and (w.get("token_address") or "").strip() == (token_addr or "").strip():
-                tg_url = w.get("telegram")
-                break
+    tg_url = _token_tg_url(pair_id, token_addr)
 
     # Compose function so we can send fast then edit later
+    is_blum = lbl.lower() == "blum"
+    dex_lbl_plain = (lbl or source_label or "DEX").strip() or "DEX"
+    buyer_short = short(buyer)
+    show_rank = get_forced_rank(sym) or get_auto_rank(sym)
+
     def _compose(ton_usd_val: float, stats: Dict[str, Any], holders_count: Optional[int]) -> Tuple[str, str]:
         usd_val = ton_amt * ton_usd_val if ton_usd_val > 0 and ton_amt > 0 else 0.0
-        usd_part = f" (${usd_val:,.2f})" if usd_val else ""
-
-        mc_txt = money_fmt(stats.get("marketcap_usd"))
-        liq_txt = money_fmt(stats.get("liquidity_usd"))
-
-        holders_line = f"{tg_emoji(ICON_HOLDERS_ID, '👥')} Holders <b>{holders_count}</b>\n" if isinstance(holders_count, int) else ""
-
-        title_core = f"{badge} {sym} Buy!"
-        if lbl:
-            title_core = f"{badge} {sym} Buy! — {lbl}"
-        title = f"<a href='{tg_url}'><b>{title_core}</b></a>" if tg_url else f"<b>{title_core}</b>"
-
-        ton_line = f"{tg_emoji(ICON_SWAP_ID, '🔁')} <b>{ton_amt:.2f} TON</b>{usd_part}\n" if ton_amt > 0 else ""
-        token_line = f"{tg_emoji(ICON_SWAP_ID, '🔁')} <b>{token_amt:,.6f} {sym}</b>\n" if token_amt > 0 else ""
-
-        forced_rank = get_forced_rank(sym)
-        auto_rank = get_auto_rank(sym)
-        show_rank = forced_rank or auto_rank
-        trend_rank_line = (f"\n\n🟢 <b>#{show_rank}</b> On <a href='{TRENDING_URL}'>SpyTON Trending</a>" if show_rank else "")
-
-        text = (
-            f"{title}\n"
-            f"{build_strength_bar(ton_amt)}\n"
-            f"{ton_line}"
-            f"{token_line}"
-            f"{tg_emoji(ICON_WALLET_ID, '👤')} <a href='{buyer_url}'>{short(buyer)}</a> | {tg_emoji(ICON_TXN_ID, '🔗')} <a href='{tx_url}'>Txn</a>\n"
-            f"{tg_emoji(ICON_POS_ID, '⬆️')} Position: <b>{pos_txt}</b>\n"
-            f"{holders_line}"
+        text = BUY_TEMPLATES.render_master(
+            sym=sym,
+            badge=badge,
+            lbl=lbl,
+            tg_url=tg_url,
+            ton_amt=ton_amt,
+            usd_val=usd_val,
+            token_amt=token_amt,
+            buyer_url=buyer_url,
+            buyer_short=buyer_short,
+            tx_url=tx_url,
+            pos_txt=pos_txt,
+            holders_count=holders_count,
+            mc_txt=money_fmt(stats.get("marketcap_usd")),
+            liq_txt=money_fmt(stats.get("liquidity_usd")),
+            chart_url=chart_url,
+            pools_url=pools_url,
+            rank=show_rank,
+            is_blum=is_blum,
         )
-
-        is_blum = (source_label or "").strip().lower() == "blum"
-        if not is_blum:
-            text += (
-                f"{tg_emoji(ICON_MCAP_ID, '💸')} Market Cap <b>{mc_txt}</b>\n"
-                f"{tg_emoji(ICON_LIQ_ID, '🌊')} Liquidity <b>{liq_txt}</b>\n\n"
-                f"{tg_emoji(ICON_PIN_ID, '📌')} <a href='{LISTING_URL}'>Ton Listing</a>\n"
-                f"{tg_emoji(ICON_CHART_ID, '📊')} <a href='{chart_url}'>Chart</a> | "
-                f"{tg_emoji(ICON_TREND_ID, '🔥')} <a href='{TRENDING_URL}'>Trending</a> | "
-                f"{tg_emoji(ICON_POOLS_ID, '🆕')} <a href='{pools_url}'>Pools</a>"
-            )
-        else:
-            text += (
-                f"\n{tg_emoji(ICON_PIN_ID, '📌')} <a href='{LISTING_URL}'>Ton Listing</a>\n"
-                f"{tg_emoji(ICON_CHART_ID, '📊')} <a href='{chart_url}'>Chart</a> | "
-                f"{tg_emoji(ICON_TREND_ID, '🔥')} <a href='{TRENDING_URL}'>Trending</a>"
-            )
-
-        text += trend_rank_line
-
         # GROUP STYLE (exact template user wants)
-        dex_lbl_plain = (lbl or source_label or "DEX").strip() or "DEX"
-        grp_pos = "New!" if "new" in (pos_txt or "").lower() else "Old!"
-        price_val = stats.get("price_usd")
-        price_txt = f"{price_val:.6f}".rstrip("0").rstrip(".") if isinstance(price_val, (int, float)) and price_val > 0 else "—"
-        mc_val_raw = stats.get("marketcap_usd")
-        mc_group = f"{mc_val_raw:,.0f}" if isinstance(mc_val_raw, (int, float)) and mc_val_raw > 0 else "—"
-        usd_group = f"{usd_val:,.2f}" if usd_val else ""
-        buyer_group = short(buyer)
-        group_text = (
-            f"🚀 {sym} TOKEN Buy! — {dex_lbl_plain}\n"
-            f"✅ LISTED!\n\n"
-            f"{'💡'*10}\n\n"
-            f"💰 {ton_amt:.2f} TON ({'$' + usd_group if usd_group else '$0'})\n"
-            f"📦 {token_amt:,.2f} {sym}\n"
-            f"👤 {buyer_group} | {grp_pos}\n"
-            f"💵 Price: ${price_txt}\n"
-            f"🏦 MarketCap: ${mc_group}\n\n"
-            f"❤️ <a href='{LISTING_URL}'>TonListing</a> | 📊 <a href='{chart_url}'>Chart</a>"
+        group_text = BUY_TEMPLATES.render_group(
+            sym=sym,
+            dex_lbl=dex_lbl_plain,
+            ton_amt=ton_amt,
+            usd_val=usd_val,
+            token_amt=token_amt,
+            buyer_short=buyer_short,
+            pos_txt=pos_txt,
+            price_usd=stats.get("price_usd"),
+            mc_usd=stats.get("marketcap_usd"),
+            chart_url=chart_url,
         )
         return text, group_text
 
     # FAST: send immediately with placeholders, then edit with enriched stats
-    ton_usd = ton_price_cache_value()
     stats: Dict[str, Any] = {"marketcap_usd": None, "liquidity_usd": None, "price_usd": None}
     holders_count: Optional[int] = None
 
@@ -1731,23 +2621,8 @@ async def post_buy_message(
     text, group_text = _compose(ton_usd, stats, holders_count)
 
 
-    # Targets: always master channel + any configured group mirrors for this token/pair
-    load_data()
-    targets: List[int] = [MASTER_CHANNEL_ID]
-    mirrors = DATA.get("group_mirrors", {})
-    if isinstance(mirrors, dict):
-        for cid_str, cfg in mirrors.items():
-            if not isinstance(cfg, dict):
-                continue
-            try:
-                cid = int(cid_str)
-            except:
-                continue
-            taddr = (cfg.get("token_address") or "").strip()
-            pid = (cfg.get("pair_id") or "").strip()
-            if (token_addr and taddr and token_addr.strip() == taddr) or (pair_id and pid and pair_id.strip() == pid):
-                if cid not in targets and cid != MASTER_CHANNEL_ID:
-                    targets.append(cid)
+    if len(targets) < eligible:
+        BUY_FILTER_STATS["trimmed"] += 1
 
     sent_refs: List[Tuple[int, int, bool]] = []  # (chat_id, message_id, used_photo)
 
@@ -1758,42 +2633,50 @@ async def post_buy_message(
             if file_exists(HEADER_IMAGE_PATH):
                 try:
                     with open(HEADER_IMAGE_PATH, "rb") as img:
-                        msg = await context.bot.send_photo(
+                        msg = await tg_call("send_photo", context.bot.send_photo(
                             chat_id=chat_id,
                             photo=img,
                             caption=text,
                             parse_mode="HTML",
                             reply_markup=buy_alert_keyboard(chart_url, pools_url),
-                        )
+                        ))
                         sent_refs.append((chat_id, msg.message_id, True))
                         return
                 except Exception:
                     pass
 
-            msg = await context.bot.send_message(
+            msg = await tg_call("send_message", context.bot.send_message(
                 chat_id=chat_id,
                 text=text,
                 parse_mode="HTML",
                 reply_markup=buy_alert_keyboard(chart_url, pools_url),
                 disable_web_page_preview=True,
-            )
+            ))
             sent_refs.append((chat_id, msg.message_id, False))
             return
 
-        msg = await context.bot.send_message(
+        msg = await tg_call("send_message", context.bot.send_message(
             chat_id=chat_id,
             text=group_text,
             parse_mode="HTML",
             disable_web_page_preview=True,
-        )
+        ))
         sent_refs.append((chat_id, msg.message_id, False))
 
     # Send to master and mirrors
     for chat_id in targets:
         try:
             await _send_message(chat_id)
+            trace_mark(trace, "sent")
         except Exception:
             continue
+    if sent_refs:
+        BUYS.inc(src, "posted")
+    else:
+        BUY_TRACER.finish(trace, "failed", **trace_info)
+        return
+    if not FAST_POST_MODE:
+        BUY_TRACER.finish(trace, "posted", **trace_info)
 
     # Background enrichment: fetch stats/holders and edit messages
     if FAST_POST_MODE and sent_refs:
@@ -1826,53 +2709,54 @@ async def post_buy_message(
                     try:
                         if cid == MASTER_CHANNEL_ID:
                             if used_photo:
-                                await context.bot.edit_message_caption(
+                                await tg_call("edit_message_caption", context.bot.edit_message_caption(
                                     chat_id=cid,
                                     message_id=mid,
                                     caption=new_text,
                                     parse_mode="HTML",
                                     reply_markup=buy_alert_keyboard(chart_url, pools_url),
-                                )
+                                ))
                             else:
-                                await context.bot.edit_message_text(
+                                await tg_call("edit_message_text", context.bot.edit_message_text(
                                     chat_id=cid,
                                     message_id=mid,
                                     text=new_text,
                                     parse_mode="HTML",
                                     reply_markup=buy_alert_keyboard(chart_url, pools_url),
                                     disable_web_page_preview=True,
-                                )
+                                ))
                         else:
-                            await context.bot.edit_message_text(
+                            await tg_call("edit_message_text", context.bot.edit_message_text(
                                 chat_id=cid,
                                 message_id=mid,
                                 text=new_group_text,
                                 parse_mode="HTML",
                                 disable_web_page_preview=True,
-                            )
+                            ))
                     except Exception:
                         continue
+                trace_mark(trace, "edited")
             except Exception:
                 return
+            finally:
+                BUY_TRACER.finish(trace, "posted", **trace_info)
 
         asyncio.create_task(_enrich_and_edit())
 
 # ===================== LEADERBOARD (6H movers) =====================
-
-async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
-    """Auto-updating Top Movers leaderboard (Top 1–10) in Crypton-style format."""
-    lb_id = STATE.get("leaderboard_msg_id")
-    if not lb_id:
-        return
-
-    load_data()
-    # Refresh auto ranks from volume
-    refresh_auto_ranks(force=True)
-    TF_PRIMARY = "h6"
-
-    items: List[Dict[str, Any]] = []
-
-    for pid, rec in DATA.get("pairs", {}).items():
+# default/split/movers: 6H board; m5/h1/h6/h24: movers for that timeframe; volume: top USD volume
+LB_VIEWS = ("default", "split", "movers") + TIMEFRAMES + ("volume",)
+LB_VIEW_TITLES = {"m5": "⏱ 5M movers", "h1": "⏱ 1H movers", "h6": "⏱ 6H movers", "h24": "⏱ 24H movers", "volume": "💰 Top volume"}
+# (chat_id, message_id) -> {hash, order, ts, retry_at} of the last published render
+LB_PUBLISHED: Dict[Tuple[int, int], Dict[str, Any]] = {}
+LB_STATS = {"edits": 0, "early": 0, "skipped": 0, "errors": 0}
+
+LB_NUMS = ["1️⃣","2️⃣","3️⃣","4️⃣","5️⃣","6️⃣","7️⃣","8️⃣","9️⃣","🔟"]
+
+def build_leaderboard_table() -> PairTable:
+    """Blocking (call in a thread): one row per tracked pair from cached DexScreener stats."""
+    rows: List[Dict[str, Any]] = []
+    for pid, rec in list(DATA.get("pairs", {}).items()):
         if not isinstance(rec, dict):
             continue
 
@@ -1881,58 +2765,29 @@ async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
 
         # Try auto-fetch TG link if missing
         tg_url = rec.get("telegram")
-        if not tg_url and token_addr:
+        if not tg_url and token_addr and TG_MISSES.due(token_addr):
             tg_found = fetch_token_telegram_url_from_dexscreener(token_addr)
-            if tg_found:
-                rec["telegram"] = tg_found
+            if not tg_found:
+                TG_MISSES.miss(token_addr)
+            else:
+                TG_MISSES.clear(token_addr)
+                STORE.set(("pairs", pid, "telegram"), tg_found, require=2)
                 tg_url = tg_found
-                try:
-                    save_data()
-                except:
-                    pass
-
-        # Fetch price change (fallback to h1 if h6 missing)
-        ch = fetch_pair_change(pid, TF_PRIMARY)
-        if ch is None:
-            ch = fetch_pair_change(pid, "h1")
-        if ch is None:
-            continue
 
         stats = fetch_pair_stats(pid)
-        liq = stats.get("liquidity_usd")
-        mc = stats.get("marketcap_usd")
-
-        # Filters (can be lowered via env vars)
-        if liq is not None and liq < LB_MIN_LIQ_USD:
-            continue
-        if mc is not None and mc < LB_MIN_MC_USD:
-            continue
-
-        items.append({
+        rows.append({
             "pair_id": pid,
             "sym": sym,
-            "ch": float(ch),
-            "mc": mc,
-            "liq": liq,
+            "token": token_addr,
             "tg": tg_url,
+            "liq": stats.get("liquidity_usd"),
+            "mc": stats.get("marketcap_usd"),
+            "price_change": stats.get("price_change"),
+            "volume_usd": stats.get("volume_usd"),
         })
+    return PairTable(rows)
 
-    # Dedup by token address if possible
-    grouped: Dict[str, List[Dict[str, Any]]] = {}
-    for it in items:
-        key = (DATA.get("pairs", {}).get(it["pair_id"], {}).get("token_address") or f"PAIR::{it['pair_id']}").strip()
-        grouped.setdefault(key, []).append(it)
-
-    deduped: List[Dict[str, Any]] = []
-    for _k, arr in grouped.items():
-        # choose most liquid among duplicates
-        chosen = sorted(arr, key=lambda x: (x["liq"] or 0.0, x["mc"] or 0.0, abs(x["ch"])), reverse=True)[0]
-        deduped.append(chosen)
-
-    # Sort by absolute move (so big gainers and losers show)
-    deduped.sort(key=lambda x: abs(x["ch"]), reverse=True)
-    top = deduped[:10]
-
+def render_leaderboard(sections: Dict[str, List[Dict[str, Any]]], view: str = "default") -> str:
     def fmt_pct(v: float) -> str:
         sign = "+" if v > 0 else ""
         return f"{sign}{v:.0f}%"
@@ -1942,33 +2797,180 @@ async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
             return f"<a href='{tg}'>${sym}</a>"
         return f"${sym}"
 
-    nums = ["1️⃣","2️⃣","3️⃣","4️⃣","5️⃣","6️⃣","7️⃣","8️⃣","9️⃣","🔟"]
+    def num(i: int) -> str:
+        return LB_NUMS[i] if i < len(LB_NUMS) else f"{i + 1}."
 
     text = "TON TRENDING\n🟢 @Spytontrending\n\n"
+    if view in LB_VIEW_TITLES:
+        text += f"<b>{LB_VIEW_TITLES[view]}</b>\n"
 
-    if not top:
-        text += "(No data yet)"
-    else:
+    if "volume" in sections:
+        top = sections["volume"]
+        if not top:
+            return text + "(No data yet)"
+        for i, it in enumerate(top):
+            text += f"{num(i)} - {sym_link(it['sym'], it.get('tg'))} | {money_fmt(it.get('vol'))}\n"
+        return text
+
+    if "movers" in sections:
+        top = sections["movers"]
+        if not top:
+            return text + "(No data yet)"
         for i, it in enumerate(top):
-            line = f"{nums[i]} - {sym_link(it['sym'], it.get('tg'))} | {fmt_pct(it['ch'])}"
-            text += line + "\n"
+            text += f"{num(i)} - {sym_link(it['sym'], it.get('tg'))} | {fmt_pct(it['ch'])}\n"
             if i == 2:
                 text += "------------------------------\n"
+        return text
+
+    titles = (("gainers", "🚀 Top Gainers"), ("losers", "🔻 Top Losers"), ("whales", "🐋 Whales"))
+    blocks: List[str] = []
+    for key, title in titles:
+        arr = sections.get(key) or []
+        if not arr:
+            continue
+        lines = [f"<b>{title}</b>"]
+        for i, it in enumerate(arr):
+            lines.append(f"{num(i)} - {sym_link(it['sym'], it.get('tg'))} | {fmt_pct(it['ch'])}")
+        blocks.append("\n".join(lines))
+
+    if not blocks:
+        return text + "(No data yet)"
+    return text + "\n\n".join(blocks) + "\n"
 
-    try:
-        await context.bot.edit_message_text(
-            chat_id=CHANNEL_ID,
-            message_id=lb_id,
-            text=text,
-            parse_mode="HTML",
-            disable_web_page_preview=True,
-            reply_markup=leaderboard_button(),
-        )
-    except Exception:
-        pass
+
+def leaderboard_boards() -> List[Dict[str, Any]]:
+    """Configured leaderboard messages: [{chat_id, message_id, view}].
+    A legacy single leaderboard_msg_id is migrated as the channel's default view.
+    """
+    boards = STATE.get("leaderboards")
+    if not isinstance(boards, list):
+        boards = []
+        if STATE.get("leaderboard_msg_id"):
+            boards.append({"chat_id": CHANNEL_ID, "message_id": STATE["leaderboard_msg_id"], "view": "default"})
+        STATE["leaderboards"] = boards
+    return [
+        b for b in boards
+        if isinstance(b, dict) and b.get("chat_id") and b.get("message_id") and b.get("view") in LB_VIEWS
+    ]
+
+def leaderboard_sections(table: PairTable, view: str, tf: str = "h6") -> Dict[str, List[Dict[str, Any]]]:
+    """Sections for one board view, selected from the shared table (no network)."""
+    if view == "volume":
+        return {"volume": table.volume_board(LB_VOLUME_TF, LB_MIN_LIQ_USD, LB_MIN_MC_USD, LB_MAX_VOLUME)}
+    if view in TIMEFRAMES:
+        tf = view
+    split = True if view == "split" else (False if view == "movers" else LB_SPLIT_SECTIONS)
+    return table.sections(
+        tf=tf,
+        fallback="h1" if tf == "h6" else None,
+        min_liq=LB_MIN_LIQ_USD,
+        min_mc=LB_MIN_MC_USD,
+        whale_mc=LB_WHALE_MC_USD,
+        split=split,
+        whales=LB_SHOW_WHALES,
+        max_gainers=LB_MAX_GAINERS,
+        max_losers=LB_MAX_LOSERS,
+        max_whales=LB_MAX_WHALES,
+    )
+
+def _lb_hash(text: str, markup: InlineKeyboardMarkup) -> str:
+    payload = text + "\x00" + json.dumps(markup.to_dict(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def _lb_order_sig(sections: Dict[str, List[Dict[str, Any]]]) -> str:
+    """What counts as a meaningful ranking change: the order of the top
+    LB_EARLY_TOP per section, or a pair entering / leaving the board."""
+    parts = []
+    for name in sorted(sections):
+        ids = [it["pair_id"] for it in sections[name]]
+        parts.append(f"{name}:{','.join(ids[:LB_EARLY_TOP])}|{','.join(sorted(ids))}")
+    return hashlib.sha1(";".join(parts).encode("utf-8")).hexdigest()
+
+async def update_leaderboard(context: ContextTypes.DEFAULT_TYPE):
+    """Publish every configured leaderboard from one table build.
+
+    Runs every LB_CHECK_INTERVAL. A board is edited only if its rendered
+    text/buttons changed, and then either LB_UPDATE_INTERVAL has passed or
+    the ranking order changed meaningfully (at most every LB_MIN_EDIT_GAP).
+    """
+    boards = leaderboard_boards()
+    if not boards:
+        return
+
+    load_data()
+    TF_PRIMARY = "h6"
+
+    table = await _to_thread(build_leaderboard_table)
+
+    # Render each view once, however many boards show it
+    rendered: Dict[str, Tuple[str, InlineKeyboardMarkup, str, str]] = {}
+    now = time.time()
+
+    for board in boards:
+        chat_id, msg_id, view = board["chat_id"], board["message_id"], board["view"]
+        if view not in rendered:
+            sections = leaderboard_sections(table, view, TF_PRIMARY)
+            text = render_leaderboard(sections, view)
+            markup = leaderboard_button()
+            rendered[view] = (text, markup, _lb_hash(text, markup), _lb_order_sig(sections))
+        text, markup, h, order = rendered[view]
+
+        pub = LB_PUBLISHED.setdefault((chat_id, msg_id), {"hash": None, "order": None, "ts": 0.0, "retry_at": 0.0})
+        if h == pub["hash"]:
+            LB_STATS["skipped"] += 1
+            continue
+        if pub["retry_at"] > now:
+            continue
+        since = now - pub["ts"]
+        due = since >= LB_UPDATE_INTERVAL
+        early = order != pub["order"] and since >= LB_MIN_EDIT_GAP
+        if not (due or early):
+            continue
+
+        try:
+            await tg_call("edit_message_text", context.bot.edit_message_text(
+                chat_id=chat_id,
+                message_id=msg_id,
+                text=text,
+                parse_mode="HTML",
+                disable_web_page_preview=True,
+                reply_markup=markup,
+            ))
+            LB_STATS["edits"] += 1
+            if early and not due:
+                LB_STATS["early"] += 1
+        except RetryAfter as e:
+            pub["retry_at"] = now + float(getattr(e, "retry_after", 30) or 30)
+            LB_STATS["errors"] += 1
+            continue
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                LB_STATS["errors"] += 1
+                pub["ts"] = now  # e.g. message deleted: don't hammer it every tick
+                continue
+        except Exception:
+            LB_STATS["errors"] += 1
+            continue
+
+        pub.update({"hash": h, "order": order, "ts": now})
 
 
 # ===================== JOB: MEMEPAD AUTO-ACTIVATION =====================
+def memepad_check_interval(rec: Dict[str, Any], now: Optional[float] = None) -> float:
+    """Per-entry recheck interval: MEMEPAD_CHECK_MIN right after adding,
+    doubling every MEMEPAD_BACKOFF_STEP of age, capped at MEMEPAD_CHECK_MAX.
+    """
+    now = time.time() if now is None else now
+    base_ts = safe_int(rec.get("check_base_ts")) or safe_int(rec.get("added_ts")) or int(now)
+    steps = max(0, int((now - base_ts) // max(1, MEMEPAD_BACKOFF_STEP)))
+    return float(min(MEMEPAD_CHECK_MAX, MEMEPAD_CHECK_MIN * (2 ** min(steps, 30))))
+
+def memepad_reset_schedule(watch_id: str, rec: Optional[Dict[str, Any]] = None):
+    """Admin touched this entry: check it soon and restart the backoff."""
+    MEMEPAD_NEXT_CHECK.pop(watch_id, None)
+    if isinstance(rec, dict):
+        rec["check_base_ts"] = int(time.time())
+
 async def memepad_activation_job(context: ContextTypes.DEFAULT_TYPE):
     if not MEMEPAD_ACTIVATION_ENABLED:
         return
@@ -1978,58 +2980,84 @@ async def memepad_activation_job(context: ContextTypes.DEFAULT_TYPE):
     if not isinstance(watch, dict) or not watch:
         return
 
-    changed = False
-    to_remove: List[str] = []
-
+    now = time.time()
+    due: List[Tuple[str, Dict[str, Any], str]] = []
     for watch_id, rec in watch.items():
         if not isinstance(rec, dict):
             continue
-
         token_address = (rec.get("token_address") or "").strip()
-        symbol = (rec.get("symbol") or "?").strip().upper()
-        tg_link = rec.get("telegram")
-        source = rec.get("source") or "memepad"
-
         if not token_address:
             continue
+        if MEMEPAD_NEXT_CHECK.get(watch_id, 0.0) > now:
+            continue
+        MEMEPAD_NEXT_CHECK[watch_id] = now + memepad_check_interval(rec, now)
+        due.append((watch_id, rec, token_address))
 
-        pair_id = await _to_thread(find_stonfi_ton_pair_for_token, token_address)
-        dex = "stonfi"
-        if not pair_id:
-            pair_id = await _to_thread(find_dedust_ton_pair_for_token, token_address)
-            dex = "dedust"
+    for wid in [w for w in MEMEPAD_NEXT_CHECK if w not in watch]:
+        MEMEPAD_NEXT_CHECK.pop(wid, None)
 
-        if not pair_id:
+    if not due:
+        return
+
+    # One token-endpoint request per entry, run concurrently (bounded)
+    sem = asyncio.Semaphore(MEMEPAD_CONCURRENCY)
+
+    async def _check(token_address: str):
+        async with sem:
+            return await _to_thread(find_ton_pairs_for_token, token_address)
+
+    results = await asyncio.gather(*[_check(t) for _w, _r, t in due], return_exceptions=True)
+    load_state()
+
+    changed = False
+    to_remove: List[str] = []
+
+    for (watch_id, rec, token_address), found in zip(due, results):
+        if isinstance(found, Exception):
+            continue
+        pair_id, dex, info = pick_listing(found)
+        if not pair_id or not info:
             continue
 
-        old = DATA["pairs"].get(pair_id, {})
-        meta = await _to_thread(fetch_pair_meta, pair_id)
-        dex_label = None
-        if dex == "dedust":
-            dex_label = "DeDust"
-        elif isinstance(meta, dict):
-            dex_label = dex_label_from_dex_id(meta.get("dex_id") or "")
-        DATA["pairs"][pair_id] = {
-            "symbol": symbol or old.get("symbol", "?"),
-            "token_address": token_address,
-            "telegram": tg_link or old.get("telegram"),
-            "dex": dex,
-            "dex_label": dex_label or old.get("dex_label") or ("DeDust" if dex == "dedust" else "STON.fi"),
-            "buyers": old.get("buyers", {}) if isinstance(old.get("buyers"), dict) else {},
-        }
+        symbol = (rec.get("symbol") or "?").strip().upper()
+        tg_link = rec.get("telegram")
+        source = rec.get("source") or "memepad"
+
+        early: Dict[str, int] = {}
+        if (source or "").lower() == "blum":
+            # carry early holders + cursor over so "New Holder!" and the first DEX buy stay right
+            early = await blum_handoff(context, watch_id, rec, token_address, pair_id, dex)
+
+        pmeta = store_pair_meta_from_info(info, dex)
+        dex_label = pmeta.get("dex_label")
+        with STORE.edit() as d:
+            old = d["pairs"].get(pair_id, {})
+            buyers = dict(old.get("buyers", {})) if isinstance(old.get("buyers"), dict) else {}
+            for b, n in early.items():
+                buyers[b] = int(buyers.get(b, 0)) + int(n or 0)
+            d["pairs"][pair_id] = {
+                "symbol": symbol or old.get("symbol", "?"),
+                "token_address": token_address,
+                "telegram": tg_link or old.get("telegram"),
+                "dex": dex,
+                "dex_label": dex_label or old.get("dex_label") or ("DeDust" if dex == "dedust" else "STON.fi"),
+                "ton_leg": pmeta.get("ton_leg"),
+                "buyers": buyers,
+            }
 
-        # Update any group mirrors watching this token
-        mirrors = DATA.get("group_mirrors", {})
-        if isinstance(mirrors, dict):
-            for _cid, cfg in mirrors.items():
+            # Update any group mirrors watching this token
+            for _cid, cfg in d["group_mirrors"].items():
                 if not isinstance(cfg, dict):
                     continue
                 if (cfg.get("token_address") or "").strip() == token_address:
                     cfg["pair_id"] = pair_id
                     cfg["dex"] = dex
                     cfg["updated_ts"] = int(time.time())
-        
+
+            d["watch"].pop(watch_id, None)
+
         to_remove.append(watch_id)
+        MEMEPAD_NEXT_CHECK.pop(watch_id, None)
         changed = True
 
         try:
@@ -2049,18 +3077,196 @@ async def memepad_activation_job(context: ContextTypes.DEFAULT_TYPE):
         except Exception:
             pass
 
-    for k in to_remove:
-        watch.pop(k, None)
-
     if changed:
         save_data()
+        # decimals for the new pools (TonAPI bulk), off the detection path
+        await _to_thread(prefetch_jetton_meta, [t for w, _r, t in due if w in to_remove])
+
+# ===================== JOB: METADATA WARM-UP =====================
+def _collect_missing_meta() -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Tracked jettons / pairs that META does not cover yet."""
+    jettons = META.get("jettons", {})
+    pmeta = META.get("pairs", {})
+    want_j: Dict[str, None] = dict.fromkeys(META_PENDING_JETTONS)  # ordered set
+    want_p: Dict[str, str] = {}  # pair -> dex
+
+    for pid, rec in DATA.get("pairs", {}).items():
+        if not isinstance(rec, dict):
+            continue
+        tok = (rec.get("token_address") or "").strip()
+        if tok and tok not in jettons:
+            want_j[tok] = None
+        if _pair_meta_missing(pmeta.get(pid)):
+            want_p[pid] = str(rec.get("dex") or "")
+
+    for _wid, w in DATA.get("watch", {}).items():
+        if not isinstance(w, dict):
+            continue
+        tok = (w.get("token_address") or "").strip()
+        if tok and tok not in jettons:
+            want_j[tok] = None
+
+    for pid in list(META_PENDING_PAIRS):
+        if pid not in want_p and _pair_meta_missing(pmeta.get(pid)):
+            want_p[pid] = ""
+    return list(want_j), list(want_p.items())
+
+def warm_meta_cache() -> int:
+    """Blocking: fetch metadata for everything tracked but not cached yet."""
+    want_j, want_p = _collect_missing_meta()
+    n = prefetch_jetton_meta(want_j) if want_j else 0
+    for pid, dex in want_p:
+        pm = prefetch_pair_meta(pid, dex=dex)
+        rec = DATA.get("pairs", {}).get(pid)
+        if isinstance(rec, dict) and pm.get("ton_leg") in (0, 1) and rec.get("ton_leg") not in (0, 1):
+            STORE.set(("pairs", pid, "ton_leg"), pm["ton_leg"], require=2)
+            n += 1
+    return n
+
+async def meta_warm_job(context: ContextTypes.DEFAULT_TYPE):
+    """Keep meta.json covering every tracked token/pair (hot path never fetches)."""
+    try:
+        load_data()
+        await _to_thread(warm_meta_cache)
+    except Exception:
+        return
 
 # ===================== JOB: BLUM EARLY TRACKER (NEW) =====================
+async def _process_blum_txs(
+    context: ContextTypes.DEFAULT_TYPE,
+    watch_id: str,
+    rec: Dict[str, Any],
+    token_addr: str,
+    txs: List[Dict[str, Any]],
+    via: str = "poll",
+):
+    """Post early buys found in jetton-master txs and advance blum_last_lt.
+
+    Buyers / last_buy_ts go to DATA["watch"][watch_id] through STORE.
+    """
+    blum_last_lt = STATE.get("blum_last_lt", {})
+    if not isinstance(blum_last_lt, dict):
+        blum_last_lt = {}
+        STATE["blum_last_lt"] = blum_last_lt
+    blum_last_utime = STATE.setdefault("blum_last_utime", {})
+
+    sym = (rec.get("symbol") or "?").strip().upper()
+    last_lt = safe_int(blum_last_lt.get(token_addr))
+    if last_lt is None:
+        # re-added after graduation: continue from the handed-off cursor instead of replaying
+        grad = (STATE.get("blum_graduated") or {}).get(token_addr)
+        last_lt = safe_int(grad.get("last_lt")) if isinstance(grad, dict) else None
+    last_lt = last_lt or 0
+    newest_utime = 0
+
+    parsed: List[Tuple[int, str, Dict[str, Any]]] = []
+    for tx in txs:
+        lt = tx.get("lt")
+        if isinstance(lt, str) and lt.isdigit():
+            lt_i = int(lt)
+        elif isinstance(lt, int):
+            lt_i = lt
+        else:
+            tid = tx.get("transaction_id")
+            lt_i = int(tid.get("lt")) if isinstance(tid, dict) and str(tid.get("lt", "")).isdigit() else 0
+
+        h = (tx.get("hash") or "")
+        if not h:
+            tid = tx.get("transaction_id")
+            if isinstance(tid, dict):
+                h = tid.get("hash") or ""
+        parsed.append((lt_i, str(h), tx))
+
+    parsed.sort(key=lambda x: x[0])
+
+    newest_seen_lt = last_lt
+
+    for lt_i, h, tx in parsed:
+        if lt_i <= last_lt:
+            continue
+        newest_utime = max(newest_utime, safe_int(tx.get("utime")) or 0)
+
+        key = f"BLUM:{token_addr}:{h or lt_i}"
+        if key in SEEN_TX_BLUM:
+            continue
+        deduped_at = SEEN_TX_BLUM[key] = time.time()
+
+        if BLUM_DEBUG:
+            print(f"[BLUM] jetton={token_addr} lt={lt_i} hash={h}")
+
+        buys = blum_extract_buys_from_jetton_master_tx(tx)
+        if not buys:
+            newest_seen_lt = max(newest_seen_lt, lt_i)
+            continue
+        parsed_at = time.time()
+
+        for b in buys:
+            buyer = (b.get("buyer") or "").strip()
+            token_amt = float(b.get("token_amt") or 0.0)
+            ton_amt = float(b.get("ton") or 0.0)
+            tx_hash = (b.get("tx") or h or "").strip()
+
+            if not buyer or token_amt <= 0:
+                continue
+
+            # buyers tracking under WATCH record
+            pos_txt = "New Holder!" if record_buyer("watch", watch_id, buyer) else "Existing Holder"
+
+            trace = BUY_TRACER.start("blum", via, tx.get("utime"), lt_i, tx.get("_fetched"))
+            trace_mark(trace, "deduped", deduped_at)
+            trace_mark(trace, "parsed", parsed_at)
+            # post (pair_id is token_addr for early mode)
+            await post_buy_message(
+                context=context,
+                sym=sym,
+                token_addr=token_addr,
+                pair_id=token_addr,
+                buyer=buyer,
+                tx_hash=tx_hash,
+                ton_amt=ton_amt,
+                token_amt=token_amt,
+                pos_txt=pos_txt,
+                source_label="Blum",
+                trace=trace,
+            )
+
+            STORE.set(("watch", watch_id, "last_buy_ts"), int(time.time()), require=2)
+
+        newest_seen_lt = max(newest_seen_lt, lt_i)
+
+    if newest_seen_lt > last_lt:
+        blum_last_lt[token_addr] = newest_seen_lt
+        STATE["blum_last_lt"] = blum_last_lt
+        if newest_utime:
+            blum_last_utime[token_addr] = newest_utime
+        save_state()
+
+def _blum_early_entries() -> List[Tuple[str, Dict[str, Any], str]]:
+    """Approved Blum WATCH entries with a jetton master: (watch_id, rec, token_addr)."""
+    out: List[Tuple[str, Dict[str, Any], str]] = []
+    watch = DATA.get("watch", {})
+    if not isinstance(watch, dict):
+        return out
+    for wid, rec in watch.items():
+        if not isinstance(rec, dict):
+            continue
+        if (rec.get("source") or "").lower() != "blum":
+            continue
+        if not rec.get("approved_early", False):
+            continue
+        token_addr = (rec.get("token_address") or "").strip()
+        if not token_addr:
+            continue
+        out.append((wid, rec, token_addr))
+    return out
+
 async def blum_early_tracker_job(context: ContextTypes.DEFAULT_TYPE):
     if not BLUM_EARLY_ENABLED:
         return
     if not TONAPI_KEY:
         return
+    if DETECTION_MODE == "blocks" and SHARD_ROLE == "single":
+        return  # covered by block_scan_job (which does not route Blum when sharded)
 
     cleanup_seen()
     load_data()
@@ -2070,119 +3276,438 @@ async def blum_early_tracker_job(context: ContextTypes.DEFAULT_TYPE):
     if not isinstance(watch, dict) or not watch:
         return
 
-    blum_last_lt = STATE.get("blum_last_lt", {})
-    if not isinstance(blum_last_lt, dict):
-        blum_last_lt = {}
-        STATE["blum_last_lt"] = blum_last_lt
+    # Scan only approved blum watch entries
+    entries = _blum_early_entries()
+    if DETECTION_MODE == "stream":
+        entries = [e for e in entries if not stream_covers(e[2])]
+    if not entries:
+        return
 
-    changed = False
+    sem = asyncio.Semaphore(BLUM_CONCURRENCY)
 
-    # Scan only approved blum watch entries
-    for wid, rec in watch.items():
+    async def _fetch(token_addr: str):
+        async with sem:
+            return await _to_thread(tonapi_account_transactions, token_addr, BLUM_POLL_LIMIT)
+
+    results = await asyncio.gather(*[_fetch(e[2]) for e in entries], return_exceptions=True)
+
+    # post sequentially (stable order for cursors)
+    for (wid, rec, token_addr), txs in zip(entries, results):
+        if isinstance(txs, Exception) or not txs:
+            continue
+        await _process_blum_txs(context, wid, rec, token_addr, txs)
+
+async def blum_handoff(context: ContextTypes.DEFAULT_TYPE, watch_id: str, rec: Dict[str, Any], token_addr: str, pool: str, dex: str) -> Dict[str, int]:
+    """Blum token graduated to a DEX pool: drain the jetton master one last
+    time, then move its cursor to STATE["blum_graduated"] and set the pool's
+    floor utime so the first DEX poll starts exactly where Blum stopped.
+
+    Returns the WATCH buyers map (merged into the pair record by the caller).
+    """
+    if BLUM_EARLY_ENABLED and TONAPI_KEY and rec.get("approved_early", False):
+        txs = await _to_thread(tonapi_account_transactions, token_addr, BLUM_HANDOFF_LIMIT)
+        if txs:
+            await _process_blum_txs(context, watch_id, rec, token_addr, txs)
+
+    last_lt = safe_int((STATE.get("blum_last_lt") or {}).pop(token_addr, None))
+    last_utime = safe_int((STATE.get("blum_last_utime") or {}).pop(token_addr, None))
+    STATE.setdefault("blum_graduated", {})[token_addr] = {
+        "last_lt": last_lt,
+        "last_utime": last_utime,
+        "pool": pool,
+        "dex": dex,
+        "ts": int(time.time()),
+    }
+    if last_utime and not (STATE.get("ston_last_lt_map") or {}).get(pool):
+        STATE.setdefault("pool_floor_utime", {})[pool] = last_utime
+    save_state()
+
+    buyers = STORE.get("watch", watch_id, "buyers")
+    return buyers if isinstance(buyers, dict) else {}
+
+# ===================== JOB: SHARED-BLOCK SCANNER =====================
+def tonapi_masterchain_head() -> Optional[int]:
+    js = tonapi_get(f"{TONAPI_BASE.rstrip('/')}/v2/blockchain/masterchain-head")
+    return safe_int(js.get("seqno")) if js else None
+
+def tonapi_masterchain_block_txs(seqno: int) -> Optional[List[Dict[str, Any]]]:
+    """All txs of a masterchain block and its shard blocks (one request).
+
+    Returns None if the block is not available yet (caller retries it).
+    """
+    js = tonapi_get(f"{TONAPI_BASE.rstrip('/')}/v2/blockchain/masterchain/{seqno}/transactions")
+    if js is None:
+        return None
+    txs = js.get("transactions")
+    if isinstance(txs, list):
+        return [t for t in txs if isinstance(t, dict)]
+    return []
+
+_RAW_ADDR_MEMO: Dict[str, str] = {}
+
+def _raw_addr_cached(addr: str) -> str:
+    r = _RAW_ADDR_MEMO.get(addr)
+    if r is None:
+        r = to_raw_address(addr)
+        _RAW_ADDR_MEMO[addr] = r
+    return r
+
+def build_block_scan_index() -> Dict[str, Tuple[str, str]]:
+    """{ raw_address: (kind, key) } for every account the block scanner routes.
+
+    kind "ston" -> key is the pool (DATA["pairs"]); kind "blum" -> key is the
+    jetton master of an approved Blum WATCH entry. DeDust pools stay on the
+    DeDust trades API (different cursor/dedup keys).
+    """
+    index: Dict[str, Tuple[str, str]] = {}
+    for pool, rec in DATA.get("pairs", {}).items():
         if not isinstance(rec, dict):
             continue
-        if (rec.get("source") or "").lower() != "blum":
+        if str(rec.get("dex", "")).lower() != "stonfi":
             continue
-        if not rec.get("approved_early", False):
+        if not (rec.get("token_address") or "").strip() or not owns_pool(pool):
             continue
-
-        token_addr = (rec.get("token_address") or "").strip()
-        if not token_addr:
+        raw = _raw_addr_cached(pool)
+        if raw:
+            index[raw] = ("ston", pool)
+    if BLUM_EARLY_ENABLED and SHARD_ROLE != "worker":  # Blum stays with the poster
+        for _wid, _rec, token_addr in _blum_early_entries():
+            raw = _raw_addr_cached(token_addr)
+            if raw:
+                index[raw] = ("blum", token_addr)
+    return index
+
+def match_block_txs(txs: List[Dict[str, Any]], index: Dict[str, Tuple[str, str]]) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+    """Group block txs by tracked account; everything else is dropped."""
+    out: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for tx in txs:
+        acc = tx.get("account")
+        addr = acc.get("address") if isinstance(acc, dict) else acc
+        if not isinstance(addr, str) or not addr:
             continue
+        # TonAPI returns raw lowercase addresses here; no per-tx decode needed
+        hit = index.get(addr.lower())
+        if hit:
+            out.setdefault(hit, []).append(tx)
+    return out
 
-        sym = (rec.get("symbol") or "?").strip().upper()
-        tg_link = rec.get("telegram")
+async def block_scan_job(context: ContextTypes.DEFAULT_TYPE):
+    """Follow new masterchain blocks and route matching txs to the existing parsers.
 
-        txs = await _to_thread(tonapi_account_transactions, token_addr, BLUM_POLL_LIMIT)
-        if not txs:
-            continue
+    Cost is one request per masterchain block, independent of how many
+    pools/jettons are tracked.
+    """
+    if DETECTION_MODE != "blocks":
+        return
+    try:
+        cleanup_seen()
+        load_data()
+        load_state()
 
-        last_lt = safe_int(blum_last_lt.get(token_addr)) or 0
+        head = await _to_thread(tonapi_masterchain_head)
+        if not head:
+            return
 
-        parsed: List[Tuple[int, str, Dict[str, Any]]] = []
-        for tx in txs:
-            lt = tx.get("lt")
-            if isinstance(lt, str) and lt.isdigit():
-                lt_i = int(lt)
-            elif isinstance(lt, int):
-                lt_i = lt
-            else:
-                tid = tx.get("transaction_id")
-                lt_i = int(tid.get("lt")) if isinstance(tid, dict) and str(tid.get("lt", "")).isdigit() else 0
+        last = safe_int(STATE.get("block_last_seqno"))
+        if not last or last <= 0 or head - last > BLOCK_SCAN_MAX_LAG:
+            # First run (or far behind): start at the tip so we don't spam old history
+            last = head - 1
+            STATE["block_last_seqno"] = last
+            save_state()
+        if head <= last:
+            return
 
-            h = (tx.get("hash") or "")
-            if not h:
-                tid = tx.get("transaction_id")
-                if isinstance(tid, dict):
-                    h = tid.get("hash") or ""
-            parsed.append((lt_i, str(h), tx))
+        index = build_block_scan_index()
+        if not index:
+            STATE["block_last_seqno"] = head
+            save_state()
+            return
 
-        parsed.sort(key=lambda x: x[0])
+        seqnos = list(range(last + 1, min(head, last + BLOCK_SCAN_MAX_BLOCKS) + 1))
+        sem = asyncio.Semaphore(BLOCK_SCAN_CONCURRENCY)
 
-        newest_seen_lt = last_lt
+        async def _fetch_block(seqno: int):
+            async with sem:
+                txs = await _to_thread(tonapi_masterchain_block_txs, seqno)
+                return txs, time.time()
+
+        results = await asyncio.gather(*[_fetch_block(n) for n in seqnos], return_exceptions=True)
+
+        matched: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        done_to = last
+        for seqno, r in zip(seqnos, results):
+            if isinstance(r, Exception) or r[0] is None:
+                break  # not available yet: retry from here next tick
+            txs, fetched_at = r
+            for hit, arr in match_block_txs(txs, index).items():
+                for tx in arr:
+                    tx["_fetched"] = fetched_at  # latency trace
+                matched.setdefault(hit, []).extend(arr)
+            done_to = seqno
+
+        if done_to > last:
+            STATE["block_last_seqno"] = done_to
+            save_state()
 
-        for lt_i, h, tx in parsed:
-            if lt_i <= last_lt:
-                continue
+        if not matched:
+            return
 
-            key = f"BLUM:{token_addr}:{h or lt_i}"
-            if key in SEEN_TX_BLUM:
-                continue
-            SEEN_TX_BLUM[key] = time.time()
+        last_lt_map = STATE.get("ston_last_lt_map")
+        if not isinstance(last_lt_map, dict):
+            last_lt_map = {}
+            STATE["ston_last_lt_map"] = last_lt_map
 
-            if BLUM_DEBUG:
-                print(f"[BLUM] jetton={token_addr} lt={lt_i} hash={h}")
+        watch_by_token = {t: (w, r) for w, r, t in _blum_early_entries()}
+        for (kind, key), txs in matched.items():
+            if kind == "ston":
+                rec = DATA.get("pairs", {}).get(key)
+                if not isinstance(rec, dict):
+                    continue
+                token_addr = (rec.get("token_address") or "").strip()
+                fresh = _ston_pool_fresh_txs(key, txs, last_lt_map)
+                if fresh:
+                    await _post_ston_tonapi_txs(context, key, rec, token_addr, fresh, via="blocks")
+            elif kind == "blum":
+                entry = watch_by_token.get(key)
+                if entry is not None:
+                    await _process_blum_txs(context, entry[0], entry[1], key, txs, via="blocks")
+    except Exception as e:
+        log.exception("block_scan_job error: %s", e)
+
+# ===================== JOB: STREAMING (TONAPI SSE) =====================
+# Reader threads keep one SSE connection per bucket of accounts and push
+# (account, tx_hash, lt, received_ts) into STREAM_QUEUE. stream_dispatch_job
+# fetches the full txs and hands them to the same parsers as polling. Polling
+# dedup (SEEN_TX_*) is shared, so a tx seen by both paths posts once.
+STREAM_QUEUE: "queue.Queue[Tuple[str, str, int, float]]" = queue.Queue()
+STREAM_CONNS: Dict[int, Dict[str, Any]] = {}
+STREAM_DELIVERED: Dict[str, float] = {}   # tx_hash(hex) -> ts delivered by the stream
+STREAM_STALLED: set = set()               # raw accounts forced back to polling until reconnect
+STREAM_VERIFIED_LT: Dict[str, int] = {}   # pool -> newest lt covered by its last verify pass
+STREAM_STATS: Dict[str, Any] = {"events": 0, "missed": 0, "reconnects": 0, "last_verify": 0.0, "polled_pools": 0}
+
+def _stream_bucket(raw: str) -> int:
+    return zlib.crc32(raw.encode()) % max(1, STREAM_CONNECTIONS)
+
+def stream_covers(addr: str) -> bool:
+    """True if this account's stream is connected, fresh, subscribed and not stalled."""
+    raw = _raw_addr_cached(addr)
+    if not raw or raw in STREAM_STALLED:
+        return False
+    st = STREAM_CONNS.get(_stream_bucket(raw))
+    if not st or not st.get("connected"):
+        return False
+    if time.time() - st.get("last_beat", 0.0) > STREAM_STALL_SECONDS:
+        return False
+    return raw in st.get("accounts", ())
 
-            buys = blum_extract_buys_from_jetton_master_tx(tx)
-            if not buys:
-                newest_seen_lt = max(newest_seen_lt, lt_i)
-                continue
+def stream_check_missed(addr: str, txs: List[Dict[str, Any]], cursor: int) -> List[Dict[str, Any]]:
+    """Verify pass over the polled txs since the previous pass (the first pass
+    starts at the cursor). Returns the ones the stream never delivered, oldest
+    first; any such tx marks the account stalled and reconnects its stream.
 
-            # buyers tracking under WATCH record
-            buyers_map = rec.get("buyers")
-            if not isinstance(buyers_map, dict):
-                buyers_map = {}
-                rec["buyers"] = buyers_map
-
-            for b in buys:
-                buyer = (b.get("buyer") or "").strip()
-                token_amt = float(b.get("token_amt") or 0.0)
-                ton_amt = float(b.get("ton") or 0.0)
-                tx_hash = (b.get("tx") or h or "").strip()
-
-                if not buyer or token_amt <= 0:
-                    continue
+    The stream advances the pool cursor, so missed txs can lie below it.
+    """
+    now = time.time()
+    floor = STREAM_VERIFIED_LT.get(addr, cursor)
+    newest = floor
+    missed: List[Dict[str, Any]] = []
+    for tx in txs:
+        lt = _tx_lt(tx)
+        ut = safe_int(tx.get("utime")) or 0
+        if lt <= floor or (ut and now - ut < STREAM_GRACE_SECONDS):
+            continue  # checked already / may still be on its way
+        newest = max(newest, lt)
+        h = _to_hex_tx_hash(_tx_hash(tx))
+        if h and h not in STREAM_DELIVERED:
+            missed.append(tx)
+    STREAM_VERIFIED_LT[addr] = newest
+    if missed:
+        STREAM_STATS["missed"] += len(missed)
+        raw = _raw_addr_cached(addr)
+        STREAM_STALLED.add(raw)
+        st = STREAM_CONNS.get(_stream_bucket(raw))
+        if st is not None:
+            st["resubscribe"] = True  # reconnect clears the stall
+    missed.sort(key=_tx_lt)
+    return missed
+
+def _iter_sse_lines(res) -> Any:
+    """Yield SSE lines as soon as they arrive, Content-Encoding undone and UTF-8
+    decoded incrementally. iter_lines() waits for 512-byte chunks and
+    iter_content(None) for EOF on a non-chunked stream, so chunks come from
+    urllib3's read1(); without it (urllib3 < 2) one byte at a time."""
+    if not res.encoding:
+        res.encoding = "utf-8"  # text/event-stream is UTF-8
+    raw = res.raw
+
+    def _chunks():
+        while True:
+            chunk = raw.read1(65536, decode_content=True)
+            if not chunk:
+                return
+            yield chunk
+
+    chunks = _chunks() if hasattr(raw, "read1") else res.iter_content(chunk_size=1)
+    buf = ""
+    for text in requests.utils.stream_decode_response_unicode(chunks, res):
+        buf += text
+        while "\n" in buf:
+            line, buf = buf.split("\n", 1)
+            yield line.rstrip("\r")
+
+def _stream_reader(bucket: int):
+    st = STREAM_CONNS[bucket]
+    url = f"{TONAPI_BASE.rstrip('/')}/v2/sse/accounts/transactions"
+    backoff = 1.0
+    while not st["stop"]:
+        want = st["want"]
+        if not want:
+            time.sleep(1)
+            continue
+        try:
+            with requests.get(
+                url,
+                params={"accounts": ",".join(sorted(want))},
+                headers=tonapi_headers(),
+                stream=True,
+                timeout=(10, STREAM_STALL_SECONDS),
+            ) as res:
+                HTTP_REQUESTS.inc("tonapi_sse", str(res.status_code))
+                if res.status_code != 200:
+                    raise RuntimeError(f"sse status={res.status_code}")
+                st["accounts"] = set(want)
+                st["connected"] = True
+                st["resubscribe"] = False
+                st["last_beat"] = time.time()
+                STREAM_STALLED.difference_update(want)
+                STREAM_STATS["reconnects"] += 1
+                backoff = 1.0
+                event = ""
+                for line in _iter_sse_lines(res):
+                    if st["stop"] or st["want"] != st["accounts"] or st.get("resubscribe"):
+                        break  # subscription set changed / account stalled -> reconnect
+                    st["last_beat"] = time.time()
+                    if not line:
+                        event = ""
+                        continue
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:") and event != "heartbeat":
+                        try:
+                            js = json.loads(line[5:].strip())
+                        except Exception:
+                            continue
+                        if isinstance(js, dict) and js.get("tx_hash"):
+                            STREAM_QUEUE.put((
+                                str(js.get("account_id") or "").lower(),
+                                str(js["tx_hash"]),
+                                safe_int(js.get("lt")) or 0,
+                                time.time(),
+                            ))
+        except Exception:
+            pass
+        st["connected"] = False
+        if not st["stop"] and st["want"] == st["accounts"] and not st.get("resubscribe"):
+            time.sleep(backoff)
+            backoff = min(30.0, backoff * 2)
+
+def stream_sync_subscriptions(index: Dict[str, Tuple[str, str]]):
+    """Start/resize reader threads so every indexed account has a subscription."""
+    buckets: Dict[int, set] = {}
+    for raw in index:
+        buckets.setdefault(_stream_bucket(raw), set()).add(raw)
+    for b in range(max(1, STREAM_CONNECTIONS)):
+        want = frozenset(buckets.get(b, ()))
+        st = STREAM_CONNS.get(b)
+        if st is None:
+            st = {"want": want, "accounts": set(), "connected": False, "last_beat": 0.0, "stop": False}
+            STREAM_CONNS[b] = st
+            threading.Thread(target=_stream_reader, args=(b,), daemon=True).start()
+        elif st["want"] != want:
+            st["want"] = want
+
+def tonapi_transaction(tx_hash: str) -> Optional[Dict[str, Any]]:
+    tx = tonapi_get(f"{TONAPI_BASE.rstrip('/')}/v2/blockchain/transactions/{tx_hash}")
+    if isinstance(tx, dict):
+        tx["_fetched"] = time.time()
+    return tx
+
+async def stream_dispatch_job(context: ContextTypes.DEFAULT_TYPE):
+    """Drain stream notifications, fetch the txs and post buys."""
+    if DETECTION_MODE != "stream":
+        return
+    try:
+        cleanup_seen()
+        load_data()
+        load_state()
 
-                is_new = buyer not in buyers_map
-                buyers_map[buyer] = int(buyers_map.get(buyer, 0)) + 1
-                pos_txt = "New Holder!" if is_new else "Existing Holder"
+        index = build_block_scan_index()
+        stream_sync_subscriptions(index)
 
-                # post (pair_id is token_addr for early mode)
-                await post_buy_message(
-                    context=context,
-                    sym=sym,
-                    token_addr=token_addr,
-                    pair_id=token_addr,
-                    buyer=buyer,
-                    tx_hash=tx_hash,
-                    ton_amt=ton_amt,
-                    token_amt=token_amt,
-                    pos_txt=pos_txt,
-                    source_label="Blum",
-                )
+        notes: List[Tuple[str, str, int, float]] = []
+        while True:
+            try:
+                notes.append(STREAM_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        if not notes:
+            return
+        STREAM_STATS["events"] += len(notes)
 
-                rec["last_buy_ts"] = int(time.time())
-                changed = True
+        sem = asyncio.Semaphore(int(os.getenv("STON_CONCURRENCY", "16")))
 
-            newest_seen_lt = max(newest_seen_lt, lt_i)
+        async def _fetch(note: Tuple[str, str, int, float]):
+            async with sem:
+                return note, await _to_thread(tonapi_transaction, note[1])
 
-        if newest_seen_lt > last_lt:
-            blum_last_lt[token_addr] = newest_seen_lt
-            STATE["blum_last_lt"] = blum_last_lt
-            save_state()
+        results = await asyncio.gather(*[_fetch(n) for n in notes], return_exceptions=True)
 
-    if changed:
-        save_data()
+        by_hit: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for r in results:
+            if isinstance(r, Exception):
+                continue
+            (raw, txh, _lt, _ts), tx = r
+            if not isinstance(tx, dict):
+                continue
+            hit = index.get(raw)
+            if not hit:
+                continue
+            hx = _to_hex_tx_hash(txh)
+            if hx:
+                STREAM_DELIVERED[hx] = time.time()
+            by_hit.setdefault(hit, []).append(tx)
+
+        watch_by_token = {t: (w, r) for w, r, t in _blum_early_entries()}
+        for (kind, key), txs in by_hit.items():
+            txs.sort(key=_tx_lt)
+            if kind == "ston":
+                rec = DATA.get("pairs", {}).get(key)
+                if not isinstance(rec, dict):
+                    continue
+                token_addr = (rec.get("token_address") or "").strip()
+                await _post_ston_tonapi_txs(context, key, rec, token_addr, txs, via="stream")
+                # streamed txs are handled: the verify poll only has to look past them
+                last_lt_map = STATE.setdefault("ston_last_lt_map", {})
+                newest = max(_tx_lt(t) for t in txs)
+                if newest > (safe_int(last_lt_map.get(key)) or 0):
+                    last_lt_map[key] = newest
+                    save_state()
+            elif kind == "blum":
+                entry = watch_by_token.get(key)
+                if entry is not None:
+                    await _process_blum_txs(context, entry[0], entry[1], key, txs, via="stream")
+    except Exception as e:
+        log.exception("stream_dispatch_job error: %s", e)
+
+def stream_status_line() -> str:
+    total = sum(len(st.get("accounts", ())) for st in STREAM_CONNS.values())
+    live = sum(1 for st in STREAM_CONNS.values() if st.get("connected"))
+    return (
+        f"{live}/{len(STREAM_CONNS)} conns, {total} accounts, "
+        f"events {STREAM_STATS['events']}, missed {STREAM_STATS['missed']}, "
+        f"stalled {len(STREAM_STALLED)}, polled {STREAM_STATS['polled_pools']}"
+    )
 
 # ===================== COMMANDS =====================
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -2199,7 +3724,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Edit TG:\n"
         "/edittg <PAIR_ID> <TELEGRAM_LINK>\n\n"
         "Leaderboard:\n"
-        "/setleaderboard (creates leaderboard post, then pin it)\n\n"
+        "/setleaderboard [view] [chat] (creates leaderboard post, then pin it)\n"
+        "/delleaderboard [N] (lists boards / removes board N)\n\n"
+        "Buy filter:\n"
+        "/setminbuy <USD|default> (in a group: that group only)\n\n"
         "Other:\n"
         "/listpairs\n"
         "/delpair <PAIR_ID>\n"
@@ -2212,9 +3740,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # =========================
 
 def get_forced_rank(symbol: str) -> Optional[int]:
-    """Return forced rank for a symbol if set."""
+    """Return forced rank for a symbol if set (in-memory DATA; trackers keep it fresh)."""
     try:
-        load_data()
         fr = DATA.get("forced_ranks", {})
         if isinstance(fr, dict):
             v = fr.get(symbol.upper())
@@ -2226,25 +3753,21 @@ def get_forced_rank(symbol: str) -> Optional[int]:
 
 def set_forced_rank(symbol: str, rank: int):
     load_data()
-    DATA.setdefault("forced_ranks", {})
-    DATA["forced_ranks"][symbol.upper()] = int(rank)
+    STORE.set(("forced_ranks", symbol.upper()), int(rank))
     save_data()
 
 
-def refresh_auto_ranks(force: bool = False) -> Dict[str, int]:
-    """Compute ranks from 6H USD volume across all tracked pairs.
-    Rank 1 = highest volume.
-    Cached for AUTO_RANK_TTL seconds.
+def reconcile_auto_ranks() -> int:
+    """Blocking (call in a thread): hand DexScreener's 6H volume per symbol to
+    VOLUME, which ranks by max(local, external) so the part our own buy
+    detection did not see counts too. Returns the number of symbols updated.
     """
-    global AUTO_RANKS, AUTO_RANK_TS
-
-    now = time.time()
-    if (not force) and AUTO_RANKS and (now - AUTO_RANK_TS < AUTO_RANK_TTL):
-        return AUTO_RANKS
+    ton_usd = ton_price_cache_value()
+    if ton_usd <= 0:
+        return 0
 
     load_data()
-    vol_by_sym: Dict[str, float] = {}
-
+    ext_ton: Dict[str, float] = {}
     for pid, rec in DATA.get("pairs", {}).items():
         if not isinstance(rec, dict):
             continue
@@ -2255,27 +3778,23 @@ def refresh_auto_ranks(force: bool = False) -> Dict[str, int]:
         v = safe_float(stats.get("volume_h6_usd"))
         if v is None or v <= 0:
             continue
-        vol_by_sym[sym] = vol_by_sym.get(sym, 0.0) + float(v)
+        ext_ton[sym] = ext_ton.get(sym, 0.0) + float(v) / ton_usd
 
-    ranked = sorted(vol_by_sym.items(), key=lambda x: x[1], reverse=True)
-    AUTO_RANKS = {sym: i + 1 for i, (sym, _v) in enumerate(ranked)}
-    AUTO_RANK_TS = now
-    return AUTO_RANKS
+    for sym, ton in ext_ton.items():
+        VOLUME.set_external(sym, ton)
+    return len(ext_ton)
 
 
 def get_auto_rank(symbol: str) -> Optional[int]:
     try:
-        refresh_auto_ranks(force=False)
-        return AUTO_RANKS.get(symbol.upper())
+        return VOLUME.rank(symbol.upper())
     except:
         return None
 
 
 def clear_forced_rank(symbol: str):
     load_data()
-    fr = DATA.get("forced_ranks", {})
-    if isinstance(fr, dict) and symbol.upper() in fr:
-        del fr[symbol.upper()]
+    if STORE.delete(("forced_ranks", symbol.upper())):
         save_data()
 
 def list_forced_ranks() -> dict:
@@ -2371,6 +3890,9 @@ async def addtoken(update: Update, context: ContextTypes.DEFAULT_TYPE):
     token_address = parsed.get("token_address")
     source = parsed.get("source", "unknown")
     blum_slug = parsed.get("blum_slug")
+    if token_address:
+        # admin (re)configured this token: forget earlier "not found" results
+        TG_MISSES.clear(token_address)
 
     load_data()
 
@@ -2381,8 +3903,7 @@ async def addtoken(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ In groups, please use the Jetton master address.\nUsage: /addtoken <JETTON_ADDRESS> <SYMBOL> [TELEGRAM_LINK]")
             return
         watch_id = f"{source}:{blum_slug or raw_input}"
-        DATA.setdefault("watch", {})
-        DATA["watch"][watch_id] = {
+        STORE.set(("watch", watch_id), {
             "source": source,
             "symbol": symbol,
             "token_address": None,
@@ -2391,7 +3912,7 @@ async def addtoken(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "raw": raw_input,
             "approved_early": False,  # NEW
             "added_ts": int(time.time()),
-        }
+        })
         save_data()
 
         extra = ""
@@ -2417,41 +3938,39 @@ async def addtoken(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    # Token address was provided: try find DEX pair now
-    pair_id = find_stonfi_ton_pair_for_token(token_address)
-    dex = "stonfi"
-    if not pair_id:
-        pair_id = find_dedust_ton_pair_for_token(token_address)
-        dex = "dedust"
+    # Token address was provided: try find DEX pair now (one DexScreener call for both DEXes)
+    found = await _to_thread(find_ton_pairs_for_token, token_address)
+    pair_id, dex, pair_info = pick_listing(found)
 
     # Not yet on DEX => WATCH (pending)
     if not pair_id:
         watch_id = f"{source}:{token_address}"
-        DATA.setdefault("watch", {})
-        DATA["watch"][watch_id] = {
-            "source": source,
-            "symbol": symbol,
-            "token_address": token_address,
-            "blum_slug": blum_slug,
-            "telegram": tg_link,
-            "raw": raw_input,
-            "approved_early": False,  # NEW (approve once for early blum)
-            "added_ts": int(time.time()),
-        }
-        save_data()
-
-        # If configured inside a group, store mirror settings now (pair_id will be filled when activated)
-        if chat and chat.type in ("group", "supergroup"):
-            DATA.setdefault("group_mirrors", {})
-            DATA["group_mirrors"][str(chat.id)] = {
+        with STORE.edit() as d:
+            d["watch"][watch_id] = {
+                "source": source,
                 "symbol": symbol,
                 "token_address": token_address,
-                "pair_id": None,
-                "dex": None,
+                "blum_slug": blum_slug,
                 "telegram": tg_link,
-                "updated_ts": int(time.time()),
+                "raw": raw_input,
+                "approved_early": False,  # NEW (approve once for early blum)
+                "added_ts": int(time.time()),
             }
-            save_data()
+            memepad_reset_schedule(watch_id)
+
+            # If configured inside a group, store mirror settings now (pair_id will be filled when activated)
+            if chat and chat.type in ("group", "supergroup"):
+                old_cfg = d["group_mirrors"].get(str(chat.id)) or {}
+                d["group_mirrors"][str(chat.id)] = {
+                    "symbol": symbol,
+                    "token_address": token_address,
+                    "pair_id": None,
+                    "dex": None,
+                    "telegram": tg_link,
+                    "min_usd": old_cfg.get("min_usd"),
+                    "updated_ts": int(time.time()),
+                }
+        save_data()
 
         note = ""
         if source == "blum":
@@ -2474,36 +3993,36 @@ async def addtoken(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # On DEX => add to pairs
-    old = DATA["pairs"].get(pair_id, {})
-    ton_leg = ensure_pair_ton_leg(pair_id)
-    meta = fetch_pair_meta(pair_id)
-    dex_label = None
-    if dex == "dedust":
-        dex_label = "DeDust"
-    elif isinstance(meta, dict):
-        dex_label = dex_label_from_dex_id(meta.get("dex_id") or "")
-    DATA["pairs"][pair_id] = {
-        "symbol": symbol,
-        "token_address": token_address,
-        "telegram": tg_link or old.get("telegram"),
-        "dex": dex,
-        "dex_label": dex_label or old.get("dex_label") or ("DeDust" if dex == "dedust" else "STON.fi"),
-        "ton_leg": ton_leg,
-        "pool": pair_id,
-        "buyers": old.get("buyers", {}) if isinstance(old.get("buyers"), dict) else {},
-    }
-    # If configured inside a group, store mirror settings for that group
-    if chat and chat.type in ("group", "supergroup"):
-        DATA.setdefault("group_mirrors", {})
-        DATA["group_mirrors"][str(chat.id)] = {
+    # Warm decimals / TON leg / label now so the trackers never have to look them up
+    store_pair_meta_from_info(pair_info, dex)
+    await _to_thread(prefetch_jetton_meta, [token_address])
+    pmeta = META.get("pairs", {}).get(pair_id) or {}
+    ton_leg = pmeta.get("ton_leg")
+    dex_label = pmeta.get("dex_label")
+    with STORE.edit() as d:
+        old = d["pairs"].get(pair_id, {})
+        d["pairs"][pair_id] = {
             "symbol": symbol,
             "token_address": token_address,
-            "pair_id": pair_id,
+            "telegram": tg_link or old.get("telegram"),
             "dex": dex,
-            "telegram": tg_link,
-            "updated_ts": int(time.time()),
+            "dex_label": dex_label or old.get("dex_label") or ("DeDust" if dex == "dedust" else "STON.fi"),
+            "ton_leg": ton_leg,
+            "pool": pair_id,
+            "buyers": old.get("buyers", {}) if isinstance(old.get("buyers"), dict) else {},
         }
-        save_data()
+        # If configured inside a group, store mirror settings for that group
+        if chat and chat.type in ("group", "supergroup"):
+            old_cfg = d["group_mirrors"].get(str(chat.id)) or {}
+            d["group_mirrors"][str(chat.id)] = {
+                "symbol": symbol,
+                "token_address": token_address,
+                "pair_id": pair_id,
+                "dex": dex,
+                "telegram": tg_link,
+                "min_usd": old_cfg.get("min_usd"),
+                "updated_ts": int(time.time()),
+            }
 
     save_data()
 
@@ -2560,19 +4079,18 @@ async def approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ WATCH_ID not found. Use /watchlist", disable_web_page_preview=True)
         return
 
+    STORE.set(("watch", wid, "approved_early"), True, require=2)
+    save_data()
     rec = watch[wid]
-    rec["approved_early"] = True
 
     # must have token_address for early tracking
     if not (rec.get("token_address") or "").strip():
-        save_data()
         await update.message.reply_text(
             "✅ Approved.\n⚠️ But token_address is missing.\nUse /setaddr first:\n/setaddr <WATCH_ID> <JETTON_ADDRESS>",
             disable_web_page_preview=True
         )
         return
 
-    save_data()
     await update.message.reply_text(
         f"✅ Approved {rec.get('symbol','?')} for early posting.\n"
         f"Bot will now post buys automatically (no more approval prompts).",
@@ -2623,8 +4141,14 @@ async def setaddr(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Could not find that watch entry. Use /watchlist", disable_web_page_preview=True)
         return
 
-    watch[target_wid]["token_address"] = jetton
+    with STORE.edit() as d:
+        rec = d["watch"].get(target_wid)
+        if isinstance(rec, dict):
+            rec["token_address"] = jetton
+        memepad_reset_schedule(target_wid, rec)
     save_data()
+    TG_MISSES.clear(jetton)
+    await _to_thread(prefetch_jetton_meta, [jetton])
 
     await update.message.reply_text(
         f"✅ Set token address\n"
@@ -2651,10 +4175,59 @@ async def edittg(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Pair not found. Use /listpairs.")
         return
 
-    DATA["pairs"][pair_id]["telegram"] = tg_link
+    STORE.set(("pairs", pair_id, "telegram"), tg_link, require=2)
     save_data()
+    TG_MISSES.clear((DATA["pairs"][pair_id].get("token_address") or "").strip())
     await update.message.reply_text(f"✅ Updated TG for {pair_id}\n{tg_link}", disable_web_page_preview=True)
 
+async def setminbuy(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/setminbuy <USD>  — in a group: that group's minimum (group admins); in DM: global minimum (admin).
+    /setminbuy default  — drop the override."""
+    chat = update.effective_chat
+    uid = update.effective_user.id if update.effective_user else 0
+    in_group = bool(chat and chat.type in ("group", "supergroup"))
+    if in_group:
+        if not is_admin(uid) and not await is_chat_admin(context, chat.id, uid):
+            return
+    elif not is_admin(uid):
+        return
+
+    if len(context.args) != 1:
+        await update.message.reply_text("Usage: /setminbuy <USD> | default")
+        return
+    arg = context.args[0].strip().lstrip("$").lower()
+    value: Optional[float] = None
+    if arg != "default":
+        try:
+            value = float(arg)
+            if not math.isfinite(value):
+                raise ValueError(arg)  # nan never filters, inf mutes the chat
+        except ValueError:
+            await update.message.reply_text("Usage: /setminbuy <USD> | default")
+            return
+        if value < 0:
+            await update.message.reply_text("❌ Minimum must be >= 0.")
+            return
+
+    load_data()
+    if in_group:
+        cfg = DATA.get("group_mirrors", {}).get(str(chat.id))
+        if not isinstance(cfg, dict):
+            await update.message.reply_text("❌ No token configured for this group. Use /addtoken here first.")
+            return
+        STORE.set(("group_mirrors", str(chat.id), "min_usd"), value, require=2)
+        save_data()
+        shown = f"${value:,.2f}" if value is not None else f"default (${global_min_usd():,.2f})"
+        await update.message.reply_text(f"✅ Minimum buy for this group: {shown}")
+        return
+
+    if value is None:
+        STORE.delete(("min_usd_buy",))
+    else:
+        STORE.set(("min_usd_buy",), value)
+    save_data()
+    await update.message.reply_text(f"✅ Global minimum buy: ${global_min_usd():,.2f}")
+
 async def delpair(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         return
@@ -2663,8 +4236,7 @@ async def delpair(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     pair_id = context.args[0].strip()
     load_data()
-    if pair_id in DATA.get("pairs", {}):
-        DATA["pairs"].pop(pair_id, None)
+    if STORE.delete(("pairs", pair_id)):
         save_data()
         await update.message.reply_text("✅ Removed pair.", disable_web_page_preview=True)
     else:
@@ -2690,19 +4262,163 @@ async def listpairs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(text, parse_mode="HTML", disable_web_page_preview=True)
 
 async def setleaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/setleaderboard [view] [chat]  (Admin only) — view: default | split | movers | m5 | h1 | h6 | h24 | volume; chat: id or @channel (default: main channel)."""
+    if not _is_admin(update):
+        return
     load_state()
-    msg = await context.bot.send_message(
-        chat_id=CHANNEL_ID,
-        text="🟢 <b>SPYTON TRENDING</b> 💎\n\n(No data yet)",
-        parse_mode="HTML",
-        reply_markup=leaderboard_button(),
-        disable_web_page_preview=True
-    )
-    STATE["leaderboard_msg_id"] = msg.message_id
+    view = "default"
+    chat_id: Any = CHANNEL_ID
+    for a in (context.args or []):
+        a = a.strip()
+        if a.lower() in LB_VIEWS:
+            view = a.lower()
+        elif a.lstrip("-").isdigit():
+            chat_id = int(a)
+        elif a.startswith("@"):
+            chat_id = a
+        else:
+            await update.message.reply_text(f"Usage: /setleaderboard [{'|'.join(LB_VIEWS)}] [chat_id|@channel]")
+            return
+
+    boards = leaderboard_boards()
+    replaces = any(b["chat_id"] == chat_id and b["view"] == view for b in boards)
+    if not replaces and len(boards) >= LB_MAX_BOARDS:
+        await update.message.reply_text(
+            f"Already {LB_MAX_BOARDS} leaderboards (LB_MAX_BOARDS). Remove one with /delleaderboard first."
+        )
+        return
+
+    try:
+        msg = await context.bot.send_message(
+            chat_id=chat_id,
+            text="🟢 <b>SPYTON TRENDING</b> 💎\n\n(No data yet)",
+            parse_mode="HTML",
+            reply_markup=leaderboard_button(),
+            disable_web_page_preview=True
+        )
+    except TelegramError as e:
+        await update.message.reply_text(f"❌ Cannot post to {chat_id}: {e}", disable_web_page_preview=True)
+        return
+    chat_id = msg.chat_id
+
+    # One board per (chat, view): a new one replaces the old entry
+    boards = [b for b in leaderboard_boards() if not (b["chat_id"] == chat_id and b["view"] == view)]
+    boards.append({"chat_id": chat_id, "message_id": msg.message_id, "view": view})
+    STATE["leaderboards"] = boards
+    if chat_id == CHANNEL_ID and view == "default":
+        STATE["leaderboard_msg_id"] = msg.message_id
     save_state()
-    await update.message.reply_text("✅ Leaderboard created. Pin it in the channel.", disable_web_page_preview=True)
+    await update.message.reply_text(
+        f"✅ Leaderboard ({view}) created. Pin it in the channel. Boards: {len(boards)}",
+        disable_web_page_preview=True,
+    )
     await update_leaderboard(context)
 
+async def delleaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/delleaderboard [N]  (Admin only) — list the leaderboards, or stop updating board N and delete its message."""
+    if not _is_admin(update):
+        return
+    load_state()
+    boards = leaderboard_boards()
+    if not context.args:
+        lines = [f"{i}. {b['view']} in {b['chat_id']} (msg {b['message_id']})" for i, b in enumerate(boards, 1)]
+        await update.message.reply_text(
+            ("\n".join(lines) + "\n\n/delleaderboard <N> removes one.") if lines else "No leaderboards.",
+            disable_web_page_preview=True,
+        )
+        return
+    try:
+        n = int(context.args[0])
+        if not 1 <= n <= len(boards):
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(f"Usage: /delleaderboard [N]  (N = 1..{len(boards)}, see /delleaderboard)")
+        return
+
+    board = boards.pop(n - 1)
+    STATE["leaderboards"] = boards
+    if board["chat_id"] == CHANNEL_ID and board["message_id"] == STATE.get("leaderboard_msg_id"):
+        STATE["leaderboard_msg_id"] = None
+    LB_PUBLISHED.pop((board["chat_id"], board["message_id"]), None)
+    save_state()
+    try:
+        await context.bot.delete_message(chat_id=board["chat_id"], message_id=board["message_id"])
+        note = "message deleted"
+    except TelegramError as e:
+        note = f"message left in place: {e}"
+    await update.message.reply_text(f"✅ Leaderboard {n} ({board['view']}) removed, {note}.", disable_web_page_preview=True)
+
+async def racestats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/racestats  (Admin only) — which STON feed sees each pool's buys first."""
+    if not _is_admin(update):
+        return
+    if STON_SOURCE_MODE != "race":
+        await update.message.reply_text("Race mode is off (STON_SOURCE_MODE=race to enable).")
+        return
+    await update.message.reply_text(
+        "🏁 STON source race\n\n"
+        f"All pools: {race_summary()}\n\n"
+        f"{race_summary(per_pool=True)}",
+        disable_web_page_preview=True,
+    )
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [seconds]  (Admin only) — sample every thread's stack, reply with top functions + collapsed stacks."""
+    if not _is_admin(update):
+        return
+    try:
+        seconds = int(context.args[0]) if context.args else 10
+    except ValueError:
+        await update.message.reply_text("Usage: /profile [seconds]")
+        return
+    seconds = max(1, min(PROFILE_MAX_SECONDS, seconds))
+    if PROFILER.running:
+        await update.message.reply_text("A profile is already running.")
+        return
+
+    PROFILER.start()
+    await update.message.reply_text(f"⏱ Profiling for {seconds}s…")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        result = PROFILER.stop()
+
+    await update.message.reply_text(f"<pre>{html_escape(result.summary(15))}</pre>", parse_mode="HTML")
+    await update.message.reply_document(
+        document=io.BytesIO(result.collapsed().encode("utf-8")),
+        filename=f"profile-{int(time.time())}.collapsed",
+        caption="Collapsed stacks (flamegraph.pl / speedscope)",
+    )
+
+def memory_sizes() -> str:
+    """Entry counts of the structures that grow with traffic."""
+    buyers = sum(
+        len(r.get("buyers") or {})
+        for sec in ("pairs", "watch")
+        for r in DATA.get(sec, {}).values()
+        if isinstance(r, dict)
+    )
+    caches = ", ".join(f"{c.name} {len(c)}" for c in CACHES)
+    return (
+        f"buyers {buyers} | {caches} | "
+        f"seen ston {len(SEEN_TX_STON)} dedust {len(SEEN_TX_DEDUST)} blum {len(SEEN_TX_BLUM)} | "
+        f"stream delivered {len(STREAM_DELIVERED)} | bursts {len(BUY_BURSTS)} | volume {len(VOLUME)}"
+    )
+
+async def memprofile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/memprofile [stop]  (Admin only) — tracemalloc growth since the previous call."""
+    if not _is_admin(update):
+        return
+    if context.args and context.args[0].lower() == "stop":
+        MEM_PROFILER.stop()
+        await update.message.reply_text("tracemalloc stopped.")
+        return
+    report = await _to_thread(MEM_PROFILER.snapshot, 15)
+    await update.message.reply_text(
+        f"<pre>{html_escape(report)}\n\n{html_escape(memory_sizes())}</pre>",
+        parse_mode="HTML",
+    )
+
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     load_data()
     load_state()
@@ -2717,12 +4433,28 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Tracked pairs: {len(DATA.get('pairs',{}))}\n"
         f"Watchlist: {watch_count}\n"
         f"Blum approved: {approved_blum}\n"
-        f"Leaderboard: {'SET' if STATE.get('leaderboard_msg_id') else 'NOT SET'}\n"
+        f"Leaderboard: {len(leaderboard_boards()) or 'NOT SET'} board(s) — "
+        f"{LB_STATS['edits']} edits ({LB_STATS['early']} early), {LB_STATS['skipped']} unchanged skipped, {LB_STATS['errors']} errors\n"
         f"STON last block: {STATE.get('ston_last_block') if STATE.get('ston_last_block') is not None else 'NOT SET'}\n"
         f"Events pulled last: {LAST_EVENTS_COUNT}\n"
         f"HTTP: {LAST_HTTP_INFO}\n"
+        f"Upstreams: {http_summary()}\n"
         f"Header image: {'FOUND' if file_exists(HEADER_IMAGE_PATH) else 'MISSING'} ({HEADER_IMAGE_PATH})\n"
         f"TONAPI_KEY: {'SET' if TONAPI_KEY else 'NOT SET'}\n"
+        f"Detection mode: {DETECTION_MODE}"
+        f"{(' (block ' + str(STATE.get('block_last_seqno')) + ')') if DETECTION_MODE == 'blocks' else ''}\n"
+        f"{('Stream: ' + stream_status_line() + chr(10)) if DETECTION_MODE == 'stream' else ''}"
+        f"Swap → alert latency: {BUY_TRACER.summary()}\n"
+        f"Data: {STORE.summary()}\n"
+        f"{('Capture: ' + CAPTURE.summary() + chr(10)) if CAPTURE.enabled else ''}"
+        f"{('Shards: ' + SHARDS.summary(list(DATA.get('pairs', {}))) + chr(10)) if SHARDS else ''}"
+        f"Min buy: ${global_min_usd():,.2f} — {BUY_FILTER_STATS['dropped']} dust buys dropped, {BUY_FILTER_STATS['trimmed']} sent to fewer chats\n"
+        f"{('Buy coalescing: ' + str(int(BUY_COALESCE_SECONDS)) + 's — ' + str(BURST_STATS['merged']) + ' merged into ' + str(BURST_STATS['bursts']) + ' bursts, ' + str(BURST_STATS['whales']) + ' whales alone' + chr(10)) if BUY_COALESCE_SECONDS > 0 else ''}"
+        f"Caches: {' | '.join(c.summary() for c in (PAIR_CACHE, TOKEN_STATS_CACHE, PAIR_META_CACHE, JETTON_DECIMALS_CACHE))}\n"
+        f"Not-found memory: {TG_MISSES.summary()} | {JETTON_META_MISSES.summary()} | memepad {len(MEMEPAD_NEXT_CHECK)} scheduled\n"
+        f"Trend volume: {VOLUME.summary()}{' (+DexScreener reconcile)' if AUTO_RANK_RECONCILE else ''}\n"
+        f"STON sources: {STON_SOURCE_MODE}"
+        f"{(' — ' + race_summary()) if STON_SOURCE_MODE == 'race' else ''}\n"
         f"DeDust enabled: {'YES' if DEDUST_ENABLED else 'NO'}\n"
         f"DeDust pools tracked: {sum(1 for _pid, rec in DATA.get('pairs', {}).items() if str(rec.get('dex','')).lower()=='dedust')}\n"
         f"Blum early enabled: {'YES' if BLUM_EARLY_ENABLED else 'NO'}\n"
@@ -2730,11 +4462,176 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"LB_MIN_LIQ_USD: {LB_MIN_LIQ_USD}\n"
         f"LB_MIN_MC_USD: {LB_MIN_MC_USD}\n"
         f"LB_WHALE_MC_USD: {LB_WHALE_MC_USD}\n"
-        f"LB_SPLIT_SECTIONS: {'YES' if LB_SPLIT_SECTIONS else 'NO'}\n",
+        f"LB_SPLIT_SECTIONS: {'YES' if LB_SPLIT_SECTIONS else 'NO'}\n"
+        f"\nJobs:\n{jobs_summary()}\n",
         disable_web_page_preview=True
     )
 
+# ===================== METRICS (scrape-time values) =====================
+CACHES = (PAIR_CACHE, TOKEN_STATS_CACHE, PAIR_META_CACHE, JETTON_DECIMALS_CACHE)
+
+REGISTRY.gauge_fn("cache_hit_ratio", "Cache hit ratio since start", lambda: {(c.name,): c.stats()["hit_ratio"] for c in CACHES}, ("cache",))
+REGISTRY.gauge_fn("cache_entries", "Cache entries", lambda: {(c.name,): len(c) for c in CACHES}, ("cache",))
+REGISTRY.counter_fn("cache_hits_total", "Cache hits", lambda: {(c.name,): c.hits for c in CACHES}, ("cache",))
+REGISTRY.counter_fn("cache_misses_total", "Cache misses", lambda: {(c.name,): c.misses for c in CACHES}, ("cache",))
+REGISTRY.counter_fn("cache_evictions_total", "Cache evictions", lambda: {(c.name,): c.evictions for c in CACHES}, ("cache",))
+REGISTRY.gauge_fn(
+    "queue_depth",
+    "Items waiting: stream tx events, open buy bursts",
+    lambda: {("stream",): STREAM_QUEUE.qsize(), ("bursts",): len(BUY_BURSTS)},
+    ("queue",),
+)
+REGISTRY.gauge_fn("job_running", "1 while the job is running", lambda: {(k,): int(r.running) for k, r in JOB_RUNNERS.items()}, ("job",))
+REGISTRY.gauge_fn("ton_price_usd", "Cached TON price", lambda: ton_price_cache_value())
+REGISTRY.gauge_fn("volume_ranked_tokens", "Tokens in the trend-rank window", lambda: len(VOLUME))
+REGISTRY.gauge_fn("data_version", "DATA snapshot version", lambda: STORE.version)
+REGISTRY.gauge_fn("data_unsaved_commits", "DATA commits not written to data.json yet", lambda: STORE.version - STORE.stats()["saved_version"])
+REGISTRY.counter_fn("data_commits_total", "DATA commits", lambda: STORE.commits)
+REGISTRY.counter_fn("data_writes_total", "data.json writes", lambda: STORE.flushes)
+REGISTRY.gauge_fn("shard_workers_connected", "Shard workers connected to the poster", lambda: len(SHARDS.ring.nodes) if SHARDS else 0)
+REGISTRY.counter_fn("shard_buys_total", "Buys received from shard workers", lambda: SHARDS.buys if SHARDS else 0)
+REGISTRY.gauge_fn("shard_buys_queued", "Worker buys waiting for a poster task", lambda: SHARDS.queued() if SHARDS else 0)
+
+# ===================== SHARDING =====================
+# Per-pool tracker cursors handed from a pool's old owner to its new one
+SHARD_CURSORS = ("ston_last_lt_map", "dedust_last_id")
+SHARD_WORKER = ShardWorker(SHARD_INDEX, SHARD_SOCKET) if SHARD_ROLE == "worker" else None
+SHARDS: Optional[ShardCoordinator] = None
+
+def owns_pool(pool: str) -> bool:
+    """False for pools another shard worker tracks (always True unsharded)."""
+    return SHARD_WORKER is None or SHARD_WORKER.owns(pool)
+
+def _spawn_shard_worker(i: int) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SPYTON_ROLE="worker",
+        SHARD_INDEX=str(i),
+        SHARD_SOCKET=SHARD_SOCKET,
+        STATE_FILE=f"state.shard{i}.json",
+        CAPTURE_PATH="",  # one writer per capture file; workers are not captured
+    )
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+
+async def post_shard_buy(context: ContextTypes.DEFAULT_TYPE, b: Dict[str, Any]):
+    """A buy from a shard worker: dedup across workers (a pool moving between
+    workers can be seen twice), holder count, then the normal post."""
+    pair_id = b.get("pair_id") or ""
+    rec = DATA.get("pairs", {}).get(pair_id)
+    if not isinstance(rec, dict):
+        return  # pool removed meanwhile
+    buyer = b.get("buyer") or ""
+    ton_amt = safe_float(b.get("ton_amt"))
+    token_amt = safe_float(b.get("token_amt"))
+    tx = (b.get("tx_hash") or "").strip()
+    key = _to_hex_tx_hash(tx) or tx or f"{pair_id}:{buyer}:{ton_amt}:{token_amt}"
+    if key in SEEN_TX_SHARD:
+        return
+    SEEN_TX_SHARD[key] = time.time()
+    trace = b.get("trace") if isinstance(b.get("trace"), dict) else None
+    pos_txt = "New Holder!" if record_buyer("pairs", pair_id, buyer) else "Existing Holder"
+    await post_buy_message(
+        context=context,
+        sym=b.get("sym") or "?",
+        token_addr=b.get("token_addr") or "",
+        pair_id=pair_id,
+        buyer=buyer,
+        tx_hash=tx,
+        ton_amt=ton_amt,
+        token_amt=token_amt,
+        pos_txt=pos_txt,
+        source_label=b.get("source_label") or "DEX",
+        trace=trace,
+    )
+
+def _save_shard_cursors(cursors: Dict[str, Dict[str, Any]]):
+    STATE["shard_cursors"] = cursors
+    save_state()
+
+async def start_shards(app):
+    """post_init of the poster: socket, workers, supervisor."""
+    global SHARDS
+    context = app.context_types.context(application=app)
+    SHARDS = ShardCoordinator(
+        SHARD_WORKERS,
+        SHARD_SOCKET,
+        _spawn_shard_worker,
+        lambda b: post_shard_buy(context, b),
+        on_cursors=_save_shard_cursors,
+        cursors=STATE.get("shard_cursors"),
+        posters=SHARD_POSTERS,
+        queue_size=SHARD_POST_QUEUE,
+    )
+    await SHARDS.start()
+
+async def stop_shards(app):
+    if SHARDS is not None:
+        await SHARDS.stop()
+
+def _take_shard_cursors(cursors: Dict[str, Any]):
+    """New member list: resume pools this worker just gained from their last owner's cursor."""
+    changed = False
+    for name in SHARD_CURSORS:
+        sent = cursors.get(name)
+        if not isinstance(sent, dict):
+            continue
+        local = STATE.get(name)
+        if not isinstance(local, dict):
+            local = STATE[name] = {}
+        for pool, cur in sent.items():
+            if not SHARD_WORKER.gained(pool):
+                continue
+            if name == "ston_last_lt_map":
+                cur = max(safe_int(cur) or 0, safe_int(local.get(pool)) or 0)
+            if local.get(pool) != cur:
+                local[pool] = cur
+                changed = True
+    if changed:
+        save_state()
+
+async def shard_cursor_job(context: ContextTypes.DEFAULT_TYPE):
+    """Report this worker's cursors for the pools it owns."""
+    cursors = {
+        name: {p: c for p, c in (STATE.get(name) or {}).items() if SHARD_WORKER.owns(p)}
+        for name in SHARD_CURSORS
+    }
+    await SHARD_WORKER.send({"op": "cursors", "cursors": cursors})
+
+async def _shard_worker_loop():
+    load_data()
+    load_state()
+    load_meta()
+    await SHARD_WORKER.connect()
+    # no Telegram here: post_buy_message hands every buy to the poster
+    context = SimpleNamespace(bot=None, application=None, job=None)
+    jobs = [
+        (ston_tracker_job, STON_POLL_INTERVAL, 2),
+        (dedust_tracker_job, DEDUST_POLL_INTERVAL, 2),
+        (shard_cursor_job, SHARD_CURSOR_INTERVAL, SHARD_CURSOR_INTERVAL),
+    ]
+    tasks = []
+    for fn, interval, first in jobs:
+        runner = JOB_RUNNERS[fn.__name__] = JobRunner(fn.__name__, fn, interval, JOB_METRICS)
+        tasks.append(asyncio.create_task(repeat(runner, context, interval, first)))
+    try:
+        await SHARD_WORKER.listen(_take_shard_cursors)  # returns when the poster goes away
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def run_shard_worker():
+    """SPYTON_ROLE=worker: trackers for this worker's share of the pools."""
+    log.info("shard worker %d (pid %d) connecting to %s", SHARD_INDEX, os.getpid(), SHARD_SOCKET)
+    asyncio.run(_shard_worker_loop())
+
 # ===================== MAIN =====================
+def application_builder() -> ApplicationBuilder:
+    builder = ApplicationBuilder().token(BOT_TOKEN)
+    if TELEGRAM_API_BASE:
+        builder = builder.base_url(f"{TELEGRAM_API_BASE}/bot").base_file_url(f"{TELEGRAM_API_BASE}/file/bot")
+    return builder
+
 
 # ===================== JOBS =====================
 async def ton_price_cache_job(context: ContextTypes.DEFAULT_TYPE):
@@ -2747,25 +4644,54 @@ async def ton_price_cache_job(context: ContextTypes.DEFAULT_TYPE):
         return
 
 async def auto_ranks_job(context: ContextTypes.DEFAULT_TYPE):
+    """Persist the volume window; optionally reconcile it with DexScreener."""
+    global _AUTO_RANK_RECONCILE_TS
     try:
-        await _to_thread(refresh_auto_ranks, True)
+        await _to_thread(save_volume)
+        if AUTO_RANK_RECONCILE and time.time() - _AUTO_RANK_RECONCILE_TS >= AUTO_RANK_RECONCILE_INTERVAL:
+            _AUTO_RANK_RECONCILE_TS = time.time()
+            await _to_thread(reconcile_auto_ranks)
     except Exception:
         pass
 
 async def ston_tracker_job(context: ContextTypes.DEFAULT_TYPE):
     """Poll STON exported events feed and post BUY-ONLY swaps for tracked STON pairs."""
 
+    # Block scanner covers STON pools in one pass per block
+    if DETECTION_MODE == "blocks":
+        return
+
+    # RACE: TonAPI fast path and export feed together; ston_claim_tx keeps the first copy
+    if STON_SOURCE_MODE == "race" and TONAPI_KEY:
+        cleanup_seen()
+        load_data()
+        load_state()
+        # one shared DATA/STATE for both sources (no reload in between)
+        await asyncio.gather(
+            ston_tracker_job_fast(context, reload=False),
+            ston_export_poll(context, reload=False),
+        )
+        return
+
     # FAST PATH: TonAPI pool tx polling (lower latency than export feed)
     if TONAPI_KEY:
         try:
             await ston_tracker_job_fast(context)
             return
         except Exception as e:
+            if SHARD_ROLE == "worker":
+                log.exception("ston_tracker_job_fast failed: %s", e)
+                return  # no export fallback: the feed is global, every worker would read it
             log.exception("ston_tracker_job_fast failed, falling back: %s", e)
+    await ston_export_poll(context)
+
+async def ston_export_poll(context: ContextTypes.DEFAULT_TYPE, reload: bool = True):
+    """One pass over the STON exported events feed (latest-block cursor)."""
     try:
-        cleanup_seen()
-        load_data()
-        load_state()
+        if reload:
+            cleanup_seen()
+            load_data()
+            load_state()
 
         latest = await _to_thread(ston_latest_block)
         if not latest:
@@ -2799,12 +4725,16 @@ async def ston_tracker_job(context: ContextTypes.DEFAULT_TYPE):
             buy = extract_buy_from_ston_event(ev)
             if not buy:
                 continue
+            parsed_at = time.time()
 
             tx = buy.get("tx") or ""
-            if not tx or tx in SEEN_TX_STON:
+            pair_id = buy["pair_id"]
+            if not tx or not owns_pool(pair_id) or not ston_claim_tx(pair_id, tx, "export"):
                 continue
+            trace = BUY_TRACER.start("ston_export", "poll", event_utime(ev), None, ev.get("_fetched"))
+            trace_mark(trace, "parsed", parsed_at)
+            trace_mark(trace, "deduped")
 
-            pair_id = buy["pair_id"]
             rec = DATA["pairs"].get(pair_id, {})
             sym = (rec.get("symbol") or "?").strip().upper()
             token_addr = (rec.get("token_address") or "").strip()
@@ -2814,17 +4744,7 @@ async def ston_tracker_job(context: ContextTypes.DEFAULT_TYPE):
             token_amt = safe_float(buy.get("token_amt"))
 
             # Position = New/Existing holder (based on seen buyers)
-            buyers_map = rec.get("buyers")
-            if not isinstance(buyers_map, dict):
-                buyers_map = {}
-                rec["buyers"] = buyers_map
-
-            pos_txt = "New Holder!" if buyer and buyer not in buyers_map else "Existing Holder"
-            if buyer:
-                buyers_map[buyer] = int(buyers_map.get(buyer, 0)) + 1
-                save_data()
-
-            SEEN_TX_STON[tx] = time.time()
+            pos_txt = "New Holder!" if record_buyer("pairs", pair_id, buyer) else "Existing Holder"
 
             # Post message with header
             await post_buy_message(
@@ -2838,6 +4758,7 @@ async def ston_tracker_job(context: ContextTypes.DEFAULT_TYPE):
                 token_amt=token_amt,
                 pos_txt=pos_txt,
                 source_label=(rec.get("dex_label") or "STON.fi"),
+                trace=trace,
             )
     except Exception as e:
         log.exception("ston_tracker_job error: %s", e)
@@ -2876,7 +4797,7 @@ async def dedust_tracker_job(context: ContextTypes.DEFAULT_TYPE):
                 continue
             sym = (rec.get("symbol") or "?").strip().upper()
             token_addr = (rec.get("token_address") or "").strip()
-            if not token_addr:
+            if not token_addr or not owns_pool(pool):
                 continue
             pools.append((pool, rec, sym, token_addr))
 
@@ -2899,6 +4820,8 @@ async def dedust_tracker_job(context: ContextTypes.DEFAULT_TYPE):
             if isinstance(pool_addr, str) and isinstance(trades, list):
                 trades_by_pool[pool_addr] = [t for t in trades if isinstance(t, dict)]
 
+        await ensure_jetton_decimals([t for p, _r, _s, t in pools if trades_by_pool.get(p)])
+
         for pool, rec, sym, token_addr in pools:
             last_id = str(last_id_map.get(pool, "") or "").strip()
             trades = trades_by_pool.get(pool) or []
@@ -2954,6 +4877,7 @@ async def dedust_tracker_job(context: ContextTypes.DEFAULT_TYPE):
                 if token_amt > 10 ** (dec + 1):
                     token_amt = token_amt / (10 ** dec)
 
+                parsed_at = time.time()
                 h = _trade_cursor_id(t)
                 if not h:
                     ts = t.get("timestamp") or t.get("time") or t.get("createdAt") or t.get("created_at") or ""
@@ -2961,18 +4885,13 @@ async def dedust_tracker_job(context: ContextTypes.DEFAULT_TYPE):
                 txh = _trade_tx_hash(t)
                 if h in SEEN_TX_DEDUST:
                     continue
+                trace = BUY_TRACER.start("dedust", "poll", event_utime(t), t.get("lt"), t.get("_fetched"))
+                trace_mark(trace, "parsed", parsed_at)
+                trace_mark(trace, "deduped")
 
                 buyer = (t.get("sender") or t.get("trader") or t.get("buyer") or t.get("from") or "").strip()
 
-                buyers_map = rec.get("buyers")
-                if not isinstance(buyers_map, dict):
-                    buyers_map = {}
-                    rec["buyers"] = buyers_map
-
-                pos_txt = "New Holder!" if buyer and buyer not in buyers_map else "Existing Holder"
-                if buyer:
-                    buyers_map[buyer] = int(buyers_map.get(buyer, 0)) + 1
-                    save_data()
+                pos_txt = "New Holder!" if record_buyer("pairs", pool, buyer) else "Existing Holder"
 
                 SEEN_TX_DEDUST[h] = __import__('time').time()
 
@@ -2987,6 +4906,7 @@ async def dedust_tracker_job(context: ContextTypes.DEFAULT_TYPE):
                     token_amt=token_amt,
                     pos_txt=pos_txt,
                     source_label=(rec.get("dex_label") or "DeDust"),
+                    trace=trace,
                 )
 
     except Exception as e:
@@ -2994,12 +4914,22 @@ async def dedust_tracker_job(context: ContextTypes.DEFAULT_TYPE):
 
 
 def main():
+    if SHARD_ROLE == "worker":
+        run_shard_worker()
+        return
     if not BOT_TOKEN:
         raise RuntimeError("Missing BOT_TOKEN")
     if CHANNEL_ID == 0:
         raise RuntimeError("Missing CHANNEL_ID")
     if ADMIN_ID == 0:
         raise RuntimeError("Missing ADMIN_ID")
+    if SHARD_WORKERS > 0 and DETECTION_MODE != "poll":
+        raise RuntimeError(f"DETECTION_MODE={DETECTION_MODE} does not work with SHARD_WORKERS > 0; use poll")
+    if SHARD_WORKERS > 0 and (not TONAPI_KEY or STON_SOURCE_MODE == "race"):
+        raise RuntimeError(
+            "SHARD_WORKERS > 0 needs TONAPI_KEY and STON_SOURCE_MODE other than race: "
+            "every worker would poll the whole STON export feed"
+        )
 
     # Start web server once (for UptimeRobot / Replit public URL)
     global _WEB_STARTED
@@ -3045,8 +4975,14 @@ def main():
         try:
             load_data()
             load_state()
+            load_meta()
+            load_volume()
+            capture_snapshot()
 
-            bot = ApplicationBuilder().token(BOT_TOKEN).build()
+            builder = application_builder()
+            if SHARD_ROLE == "poster":
+                builder = builder.post_init(start_shards).post_shutdown(stop_shards)
+            bot = builder.build()
 
             bot.add_handler(CommandHandler("start", start))
             bot.add_handler(CommandHandler("addtoken", addtoken))
@@ -3058,27 +4994,44 @@ def main():
             bot.add_handler(CommandHandler("setaddr", setaddr))
             bot.add_handler(CommandHandler("edittg", edittg))
             bot.add_handler(CommandHandler("delpair", delpair))
+            bot.add_handler(CommandHandler("setminbuy", setminbuy))
             bot.add_handler(CommandHandler("listpairs", listpairs))
             bot.add_handler(CommandHandler("setleaderboard", setleaderboard))
+            bot.add_handler(CommandHandler("delleaderboard", delleaderboard))
             bot.add_handler(CommandHandler("status", status))
+            bot.add_handler(CommandHandler("racestats", racestats))
+            bot.add_handler(CommandHandler("profile", profile, block=False))  # sleeps for the sample window
+            bot.add_handler(CommandHandler("memprofile", memprofile))
+
+            # Persist DATA changes (buyer counts, links, ...) in batches
+            run_job(bot, data_flush_job, interval=DATA_FLUSH_INTERVAL, first=DATA_FLUSH_INTERVAL)
 
             # Warm TON price cache (so posts are instant)
-            bot.job_queue.run_repeating(ton_price_cache_job, interval=60, first=1)
+            run_job(bot, ton_price_cache_job, interval=60, first=1)
+
+            # Warm jetton/pair metadata (decimals, TON leg, DEX label)
+            run_job(bot, meta_warm_job, interval=META_WARM_INTERVAL, first=1)
 
             # Auto ranks (volume-based)
-            bot.job_queue.run_repeating(auto_ranks_job, interval=AUTO_RANK_INTERVAL, first=3)
+            run_job(bot, auto_ranks_job, interval=AUTO_RANK_INTERVAL, first=3)
 
             # Leaderboard auto-update
-            bot.job_queue.run_repeating(update_leaderboard, interval=LB_UPDATE_INTERVAL, first=10)
-
-            # Trackers
-            bot.job_queue.run_repeating(ston_tracker_job, interval=STON_POLL_INTERVAL, first=2)
-            bot.job_queue.run_repeating(dedust_tracker_job, interval=DEDUST_POLL_INTERVAL, first=5)
-            bot.job_queue.run_repeating(memepad_activation_job, interval=MEMEPAD_ACTIVATION_INTERVAL, first=10)
-            bot.job_queue.run_repeating(blum_early_tracker_job, interval=BLUM_POLL_INTERVAL, first=12)
+            run_job(bot, update_leaderboard, interval=LB_CHECK_INTERVAL, first=10)
+
+            # Trackers (pool trackers run in the shard workers when sharded)
+            if SHARD_ROLE == "single":
+                run_job(bot, ston_tracker_job, interval=STON_POLL_INTERVAL, first=2)
+                run_job(bot, dedust_tracker_job, interval=DEDUST_POLL_INTERVAL, first=5)
+            run_job(bot, memepad_activation_job, interval=MEMEPAD_ACTIVATION_INTERVAL, first=10)
+            run_job(bot, blum_early_tracker_job, interval=BLUM_POLL_INTERVAL, first=12)
+            if DETECTION_MODE == "blocks" and SHARD_ROLE == "single":
+                run_job(bot, block_scan_job, interval=BLOCK_SCAN_INTERVAL, first=2)
+            if DETECTION_MODE == "stream" and SHARD_ROLE == "single":
+                run_job(bot, stream_dispatch_job, interval=STREAM_DISPATCH_INTERVAL, first=2)
 
             print("🟢 SpyTON Detector running…")
             bot.run_polling()
+            save_data()
             break
         except KeyboardInterrupt:
             raise
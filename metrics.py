@@ -0,0 +1,248 @@
+"""In-process metrics registry with Prometheus text exposition.
+
+Counters and histograms are sharded per thread: each thread writes only
+its own dict (created on first use), so the hot path is a thread-local
+lookup plus one dict update and takes no lock. render() sums the shards at
+scrape time. Values that already live elsewhere (cache stats, queue sizes)
+are exported through callbacks evaluated at scrape time.
+
+Labels are positional: Counter("x", "...", ("upstream", "status")).inc("tonapi", "200").
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# seconds; covers fast cache-backed calls up to slow upstream timeouts
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Sharded:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._local = threading.local()
+        self._shards: List[Dict[LabelValues, Any]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict[LabelValues, Any]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: Dict[LabelValues, Any] = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _snapshots(self) -> List[Dict[LabelValues, Any]]:
+        with self._lock:
+            shards = list(self._shards)
+        return [dict(s) for s in shards]
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, *labels: str, n: float = 1.0) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + n
+
+    def values(self) -> Dict[LabelValues, float]:
+        out: Dict[LabelValues, float] = {}
+        for snap in self._snapshots():
+            for k, v in snap.items():
+                out[k] = out.get(k, 0.0) + v
+        return out
+
+    def value(self, *labels: str) -> float:
+        return self.values().get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for k, v in sorted(self.values().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}")
+        return lines
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        cell = shard.get(labels)
+        if cell is None:
+            # per-bucket counts (+Inf last), then sum
+            cell = [0] * (len(self.buckets) + 1) + [0.0]
+            shard[labels] = cell
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def values(self) -> Dict[LabelValues, List[float]]:
+        """labels -> [count per bucket..., count in +Inf, sum] (not cumulative)."""
+        out: Dict[LabelValues, List[float]] = {}
+        for snap in self._snapshots():
+            for k, cell in snap.items():
+                cell = list(cell)
+                acc = out.get(k)
+                if acc is None:
+                    out[k] = cell
+                else:
+                    for i, v in enumerate(cell):
+                        acc[i] += v
+        return out
+
+    def count(self, *labels: str) -> int:
+        cell = self.values().get(labels)
+        return int(sum(cell[:-1])) if cell else 0
+
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        """Estimate from bucket counts (linear inside the bucket), like histogram_quantile()."""
+        cell = self.values().get(labels)
+        if not cell:
+            return None
+        counts = cell[:-1]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0.0
+        for i, c in enumerate(counts):
+            if seen + c >= rank and c:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                if i >= len(self.buckets):
+                    return self.buckets[-1] if self.buckets else lo
+                hi = self.buckets[i]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1] if self.buckets else None
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        bounds = self.buckets + (math.inf,)
+        for k, cell in sorted(self.values().items()):
+            acc = 0
+            for le, c in zip(bounds, cell):
+                acc += c
+                le_label = 'le="' + _fmt(le) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, k, le_label)} {_fmt(acc)}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_fmt(cell[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, k)} {_fmt(acc)}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist: Histogram, labels: LabelValues):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels)
+
+
+class Callback:
+    """Gauge / counter whose value is read at scrape time.
+
+    fn() returns a number, or {label values tuple: number}."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Any], labels: Sequence[str] = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labels)
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        try:
+            v = self.fn()
+        except Exception:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if isinstance(v, dict):
+            for k, x in sorted(v.items()):
+                k = k if isinstance(k, tuple) else (k,)
+                lines.append(f"{self.name}{_labels(self.labelnames, k)} {_fmt(float(x))}")
+        elif v is not None:
+            lines.append(f"{self.name} {_fmt(float(v))}")
+        return lines
+
+
+class Registry:
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, m: Any) -> Any:
+        with self._lock:
+            if m.name in self._metrics:
+                raise ValueError(f"metric already registered: {m.name}")
+            self._metrics[m.name] = m
+        return m
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self.prefix + name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help, labels, buckets))
+
+    def gauge_fn(self, name: str, help: str, fn: Callable[[], Any], labels: Sequence[str] = ()) -> Callback:
+        return self._add(Callback(self.prefix + name, help, fn, labels, "gauge"))
+
+    def counter_fn(self, name: str, help: str, fn: Callable[[], Any], labels: Sequence[str] = ()) -> Callback:
+        return self._add(Callback(self.prefix + name, help, fn, labels, "counter"))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry("spyton_")
@@ -0,0 +1,219 @@
+"""On-demand profilers for the running bot (admin /profile, /memprofile).
+
+SamplingProfiler is a wall-clock sampler: a background thread reads
+sys._current_frames() every `interval` seconds and counts each thread's
+Python stack. Nothing is hooked into the interpreter, so overhead is one
+stack walk per thread per sample and zero when it is not running. The
+event loop thread shows whichever task is running (its coroutine chain is
+on the stack), to_thread workers show the blocking call they are in.
+
+Results come as collapsed stacks ("thread;outer;...;leaf count" lines, the
+input format of flamegraph.pl / speedscope) and a top-N table of self and
+inclusive samples per function. Samples whose leaf is a known wait (select,
+queue.get, Condition.wait, socket reads) count as idle and are left out of
+the table so it shows where CPU time went.
+
+MemProfiler wraps tracemalloc: the first call starts tracing and takes a
+baseline, every later call diffs a new snapshot against the previous one.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+Frame = str
+Stack = Tuple[Frame, ...]
+
+# (file basename, function) leaves that mean "blocked, not working"
+IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("socket.py", "readinto"),
+    ("socket.py", "accept"),
+    ("ssl.py", "read"),
+    ("ssl.py", "recv_into"),
+    ("socketserver.py", "serve_forever"),
+    ("thread.py", "_worker"),  # executor worker waiting for work
+}
+
+
+def _label(code) -> Frame:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class ProfileResult:
+    def __init__(self, stacks: Counter, idle: int, samples: int, duration: float, interval: float):
+        self.stacks = stacks
+        self.idle = idle
+        self.samples = samples
+        self.duration = duration
+        self.interval = interval
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, n: int = 15) -> List[Tuple[Frame, int, int]]:
+        """[(function, self samples, inclusive samples)] over busy samples, by self."""
+        own: Counter = Counter()
+        incl: Counter = Counter()
+        for stack, c in self.stacks.items():
+            frames = stack[1:]  # drop thread name
+            if not frames or stack[-1].startswith("[idle]"):
+                continue
+            own[frames[-1]] += c
+            for f in set(frames):
+                incl[f] += c
+        return [(f, s, incl[f]) for f, s in own.most_common(n)]
+
+    def summary(self, n: int = 15) -> str:
+        total = sum(self.stacks.values()) or 1
+        busy = total - self.idle
+        lines = [
+            f"{self.samples} samples in {self.duration:.1f}s (every {self.interval * 1000:g}ms), "
+            f"{busy} busy thread-samples, {self.idle} idle",
+        ]
+        by_thread: Counter = Counter()
+        for stack, c in self.stacks.items():
+            if not stack[-1].startswith("[idle]"):
+                by_thread[stack[0]] += c
+        if by_thread:
+            lines.append("busy by thread: " + ", ".join(f"{t} {c * 100 / max(1, busy):.0f}%" for t, c in by_thread.most_common(6)))
+        lines.append("")
+        lines.append(" self%  incl%  function")
+        for f, s, i in self.top(n):
+            lines.append(f"{s * 100 / max(1, busy):5.1f}  {i * 100 / max(1, busy):5.1f}  {f}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = max(0.001, float(interval))
+        self.max_depth = max_depth
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: Counter = Counter()
+        self._idle = 0
+        self._samples = 0
+        self._t0 = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            raise RuntimeError("profiler already running")
+        self._stacks = Counter()
+        self._idle = 0
+        self._samples = 0
+        self._stop.clear()
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> ProfileResult:
+        if self._thread is None:
+            raise RuntimeError("profiler not running")
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return ProfileResult(self._stacks, self._idle, self._samples, time.perf_counter() - self._t0, self.interval)
+
+    def _loop(self) -> None:
+        me = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if any(ident not in names for ident in frames):
+                names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+            self._samples += 1
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                self._sample(names.get(ident, f"thread-{ident}"), frame)
+
+    def _sample(self, thread_name: str, frame) -> None:
+        leaf = frame.f_code
+        stack: List[Frame] = []
+        f = frame
+        while f is not None and len(stack) < self.max_depth:
+            stack.append(_label(f.f_code))
+            f = f.f_back
+        stack.append(thread_name)
+        stack.reverse()
+        if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES:
+            stack[-1] = "[idle] " + stack[-1]
+            self._idle += 1
+        self._stacks[tuple(stack)] += 1
+
+
+class MemProfiler:
+    def __init__(self, frames: int = 1):
+        self.frames = max(1, int(frames))
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._started_here = False
+        self._taken_at = 0.0
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing() and self._baseline is not None
+
+    def _take(self) -> tracemalloc.Snapshot:
+        self._taken_at = time.time()
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def snapshot(self, n: int = 15) -> str:
+        """Start tracing (first call) or report growth since the previous call."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_here = True
+            self._baseline = None
+        if self._baseline is None:
+            self._baseline = self._take()
+            return "tracemalloc started, baseline taken. Run again later to see growth."
+
+        prev_at = self._taken_at
+        snap = self._take()
+        diff = snap.compare_to(self._baseline, "lineno")
+        self._baseline = snap
+        cur, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced {_size(cur)} (peak {_size(peak)}), growth over {time.time() - prev_at:.0f}s:"]
+        for st in [d for d in diff if d.size_diff > 0][:n]:
+            fr = st.traceback[0]
+            lines.append(
+                f"{_size(st.size_diff, sign=True)} ({st.count_diff:+,} blocks) "
+                f"{os.path.basename(fr.filename)}:{fr.lineno} — now {_size(st.size)}"
+            )
+        if len(lines) == 1:
+            lines.append("no growth")
+        return "\n".join(lines)
+
+    def stop(self) -> None:
+        self._baseline = None
+        if self._started_here and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_here = False
+
+
+def _size(n: float, sign: bool = False) -> str:
+    prefix = ("+" if n >= 0 else "-") if sign else ""
+    n = abs(n)
+    for unit in ("B", "KiB", "MiB"):
+        if n < 1024:
+            return f"{prefix}{n:.0f} {unit}" if unit == "B" else f"{prefix}{n:.1f} {unit}"
+        n /= 1024
+    return f"{prefix}{n:.1f} GiB"
@@ -0,0 +1,321 @@
+"""Horizontal sharding of the pool trackers over worker processes.
+
+With SHARD_WORKERS > 0 the normal bot process becomes the poster and
+coordinator. It spawns that many copies of main.py with
+SPYTON_ROLE=worker. Each worker connects back over a Unix socket and
+tracks only the pools of DATA["pairs"] that a consistent-hash ring over
+the connected workers maps to it. Every buy a worker detects goes back
+to the poster as one JSON line. The poster is the only process that
+dedups across workers, counts holders, writes data.json and talks to
+Telegram.
+
+Rebalancing: the coordinator pushes the member list whenever a worker
+connects or goes away, and each worker rebuilds the ring from it. Pools
+added to or removed from data.json are picked up by every worker's own
+reload. Consistent hashing means a pool changes owner only when it has
+to.
+
+Posting: buys are not posted from the connection's read loop. They are
+hashed by pool onto one of `posters` bounded queues, each drained by its
+own task. Buys of different pools post concurrently, as they do in a
+single process, and each pool's buys keep their order. A full queue stops
+reading from that worker until there is room.
+
+Per-pool cursors travel with the pools: workers report the cursors
+of the pools they own, and the coordinator sends the merged set out with
+each member list. The new owner of a pool starts where the old one
+stopped, and whatever overlaps is dropped by the poster's dedup.
+
+Wire format, one JSON object per line:
+  worker -> poster  {"op": "hello", "worker": i, "pid": n}
+                    {"op": "buy", <post_buy_message arguments>, "trace": {...}}
+                    {"op": "cursors", "cursors": {name: {pool: cursor}}}
+  poster -> worker  {"op": "members", "epoch": n, "members": [i, ...], "cursors": {...}}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+LINE_LIMIT = 16 * 1024 * 1024  # cursor messages carry every pool
+SUPERVISE_INTERVAL = 2.0
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _line(msg: Dict[str, Any]) -> bytes:
+    return json.dumps(msg, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+
+
+async def _read(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Next message, None at EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    msg = json.loads(line)
+    return msg if isinstance(msg, dict) else {}
+
+
+class HashRing:
+    """Consistent hashing of keys (pool addresses) onto nodes (worker ids)."""
+
+    def __init__(self, nodes: Iterable[int] = (), vnodes: int = 128):
+        self.vnodes = max(1, int(vnodes))
+        self.nodes: Tuple[int, ...] = tuple(sorted(set(nodes)))
+        points = sorted((_hash(f"{n}#{v}"), n) for n in self.nodes for v in range(self.vnodes))
+        self._points = [p for p, _ in points]
+        self._owners = [n for _, n in points]
+
+    def owner(self, key: str) -> Optional[int]:
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, _hash(key))
+        return self._owners[i % len(self._points)]
+
+    def assign(self, keys: Iterable[str]) -> Dict[int, List[str]]:
+        out: Dict[int, List[str]] = {n: [] for n in self.nodes}
+        for k in keys:
+            n = self.owner(k)
+            if n is not None:
+                out[n].append(k)
+        return out
+
+
+class ShardCoordinator:
+    """Poster side: worker processes, membership, cursor hand-off, incoming buys."""
+
+    def __init__(
+        self,
+        workers: int,
+        socket_path: str,
+        spawn: Callable[[int], subprocess.Popen],
+        on_buy: Callable[[Dict[str, Any]], Awaitable[None]],
+        on_cursors: Optional[Callable[[Dict[str, Dict[str, Any]]], None]] = None,
+        cursors: Optional[Dict[str, Any]] = None,
+        vnodes: int = 128,
+        posters: int = 8,
+        queue_size: int = 1000,
+    ):
+        self.workers = int(workers)
+        self.socket_path = socket_path
+        self.spawn = spawn
+        self.on_buy = on_buy
+        self.on_cursors = on_cursors
+        self.vnodes = vnodes
+        self.cursors: Dict[str, Dict[str, Any]] = {
+            k: dict(v) for k, v in (cursors or {}).items() if isinstance(v, dict)
+        }
+        self.ring = HashRing((), vnodes)
+        self.epoch = 0
+        self._procs: Dict[int, subprocess.Popen] = {}
+        self._conns: Dict[int, asyncio.StreamWriter] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._supervisor: Optional[asyncio.Task] = None
+        self.posters = max(1, int(posters))
+        self.queue_size = max(1, int(queue_size))
+        self._queues: List[asyncio.Queue] = []
+        self._post_tasks: List[asyncio.Task] = []
+        self.buys = 0
+        self.buys_by: Dict[int, int] = {}
+        self.post_errors = 0
+        self.restarts = 0
+        self.rebalances = 0
+
+    async def start(self) -> None:
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        self._queues = [asyncio.Queue(self.queue_size) for _ in range(self.posters)]
+        self._post_tasks = [asyncio.create_task(self._post_loop(q)) for q in self._queues]
+        self._server = await asyncio.start_unix_server(self._serve, path=self.socket_path, limit=LINE_LIMIT)
+        for i in range(self.workers):
+            self._procs[i] = self.spawn(i)
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop(self) -> None:
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for w in list(self._conns.values()):
+            w.close()
+        self._conns.clear()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), 5)
+        except asyncio.TimeoutError:
+            log.warning("shard poster: %d buys not posted at shutdown", self.queued())
+        for t in self._post_tasks:
+            t.cancel()
+        await asyncio.gather(*self._post_tasks, return_exceptions=True)
+        self._post_tasks = []
+        for p in self._procs.values():
+            if p.poll() is None:
+                p.terminate()
+        deadline = time.monotonic() + 5
+        for p in self._procs.values():
+            while p.poll() is None and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            if p.poll() is None:
+                p.kill()
+        self._procs.clear()
+
+    async def _supervise(self) -> None:
+        while True:
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+            for i, p in list(self._procs.items()):
+                if p.poll() is not None:
+                    log.warning("shard worker %d exited with %s, restarting", i, p.returncode)
+                    self.restarts += 1
+                    self._procs[i] = self.spawn(i)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        idx: Optional[int] = None
+        try:
+            hello = await _read(reader)
+            if not hello or hello.get("op") != "hello":
+                return
+            idx = int(hello["worker"])
+            old = self._conns.get(idx)
+            if old is not None:
+                old.close()
+            self._conns[idx] = writer
+            await self._rebalance()
+            while True:
+                msg = await _read(reader)
+                if msg is None:
+                    break
+                op = msg.get("op")
+                if op == "buy":
+                    self.buys += 1
+                    self.buys_by[idx] = self.buys_by.get(idx, 0) + 1
+                    q = self._queues[_hash(str(msg.get("pair_id") or "")) % len(self._queues)]
+                    await q.put((idx, msg))
+                elif op == "cursors":
+                    self._merge_cursors(idx, msg.get("cursors"))
+        except (ConnectionError, ValueError, KeyError) as e:
+            log.warning("shard worker %s connection: %s", idx, e)
+        finally:
+            if idx is not None and self._conns.get(idx) is writer:
+                del self._conns[idx]
+                await self._rebalance()
+            writer.close()
+
+    async def _post_loop(self, q: asyncio.Queue) -> None:
+        while True:
+            idx, msg = await q.get()
+            try:
+                await self.on_buy(msg)
+            except Exception:
+                self.post_errors += 1
+                log.exception("shard buy from worker %d failed", idx)
+            finally:
+                q.task_done()
+
+    def queued(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def _merge_cursors(self, idx: int, cursors: Any) -> None:
+        """Keep a worker's cursors for the pools it owns now; a late report from a previous owner is ignored."""
+        if not isinstance(cursors, dict):
+            return
+        for name, per_pool in cursors.items():
+            if not isinstance(per_pool, dict):
+                continue
+            dst = self.cursors.setdefault(name, {})
+            for pool, cur in per_pool.items():
+                if self.ring.owner(pool) == idx:
+                    dst[pool] = cur
+        if self.on_cursors:
+            self.on_cursors(self.cursors)
+
+    async def _rebalance(self) -> None:
+        self.epoch += 1
+        self.rebalances += 1
+        self.ring = HashRing(self._conns, self.vnodes)
+        data = _line({"op": "members", "epoch": self.epoch, "members": list(self.ring.nodes), "cursors": self.cursors})
+        for i, w in list(self._conns.items()):
+            try:
+                w.write(data)
+                await w.drain()
+            except ConnectionError as e:
+                log.warning("shard worker %d: members not sent: %s", i, e)
+
+    def summary(self, pools: Iterable[str]) -> str:
+        counts = {i: len(ps) for i, ps in self.ring.assign(pools).items()}
+        per = " ".join(f"#{i}:{counts.get(i, 0)}p/{self.buys_by.get(i, 0)}b" for i in range(self.workers))
+        line = f"{len(self._conns)}/{self.workers} up (epoch {self.epoch}), {self.buys} buys, {self.queued()} queued — {per}"
+        if self.restarts:
+            line += f", {self.restarts} restarts"
+        if self.post_errors:
+            line += f", {self.post_errors} post errors"
+        return line
+
+
+class ShardWorker:
+    """Worker side: connection to the poster and the current ring."""
+
+    def __init__(self, index: int, socket_path: str, vnodes: int = 128):
+        self.index = int(index)
+        self.socket_path = socket_path
+        self.vnodes = vnodes
+        self.ring = HashRing((), vnodes)
+        self._prev = self.ring
+        self.epoch = 0
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+        self.sent = 0
+
+    def owns(self, key: str) -> bool:
+        return self.ring.owner(key) == self.index
+
+    def gained(self, key: str) -> bool:
+        """Owned now but not under the previous member list."""
+        return self.owns(key) and self._prev.owner(key) != self.index
+
+    async def connect(self, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path, limit=LINE_LIMIT)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.5)
+        await self.send({"op": "hello", "worker": self.index, "pid": os.getpid()})
+
+    async def send(self, msg: Dict[str, Any]) -> None:
+        if self._writer is None:
+            raise ConnectionError("not connected to the poster")
+        async with self._lock:
+            self._writer.write(_line(msg))
+            await self._writer.drain()
+        self.sent += 1
+
+    async def listen(self, on_members: Callable[[Dict[str, Any]], None]) -> None:
+        """Apply member lists until the poster goes away; on_members(cursors) after each."""
+        assert self._reader is not None
+        while True:
+            msg = await _read(self._reader)
+            if msg is None:
+                return
+            if msg.get("op") == "members":
+                self._prev, self.ring = self.ring, HashRing(msg.get("members") or (), self.vnodes)
+                self.epoch = int(msg.get("epoch") or 0)
+                on_members(msg.get("cursors") or {})
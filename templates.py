@@ -0,0 +1,262 @@
+"""Buy-alert templates, prepared once and rendered per buy.
+
+Template prepares a str.format source once: static fields (custom-emoji
+tags, listing / trending links, ...) are substituted at construction, with
+their format spec applied, so a render is one format_map over the short
+per-buy fields.
+
+BuyAlertTemplates holds the master-channel and group layouts used by
+main.post_buy_message (single buys and bursts). The custom-emoji tags are
+resolved once and all 28 strength bars are precomputed. formatter.py
+builds its layout on the same Template class.
+"""
+
+from __future__ import annotations
+
+from string import Formatter
+from typing import Any, Dict, List, Mapping, Optional
+
+MAX_STRENGTH = 28
+STRENGTH_PER_LINE = 14
+
+_FORMATTER = Formatter()
+
+
+def emoji_tag(emoji_id: str, fallback: str) -> str:
+    """Telegram custom emoji HTML tag for a valid numeric id, else the fallback."""
+    emoji_id = (emoji_id or "").strip()
+    if not emoji_id.isdigit():
+        return fallback
+    return f"<tg-emoji emoji-id=\"{emoji_id}\">{fallback}</tg-emoji>"
+
+
+def _escape(s: str) -> str:
+    return s.replace("{", "{{").replace("}", "}}")
+
+
+class Template:
+    def __init__(self, source: str, **static: Any):
+        parts: List[str] = []
+        for literal, field, spec, conv in _FORMATTER.parse(source):
+            parts.append(_escape(literal))
+            if field is None:
+                continue
+            if field in static:
+                value = static[field]
+                if conv:
+                    value = _FORMATTER.convert_field(value, conv)
+                parts.append(_escape(format(value, spec or "")))
+            else:
+                parts.append("{" + field + (f"!{conv}" if conv else "") + (f":{spec}" if spec else "") + "}")
+        self.source = source
+        self.compiled = "".join(parts)
+
+    def render(self, fields: Mapping[str, Any]) -> str:
+        return self.compiled.format_map(fields)
+
+
+def strength_bars(icon: str, max_icons: int = MAX_STRENGTH, per_line: int = STRENGTH_PER_LINE) -> List[str]:
+    """bars[n] = two-line bar of n icons (n = 1..max_icons); bars[0] = ""."""
+    bars = [""]
+    for n in range(1, max_icons + 1):
+        line1 = icon * min(n, per_line)
+        line2 = icon * max(0, n - per_line)
+        bars.append(f"{line1}\n{line2}\n" if line2 else f"{line1}\n")
+    return bars
+
+
+def strength_count(ton_amt: float) -> int:
+    """TON amount -> 1..28 strength icons (one per 2 TON)."""
+    try:
+        t = float(ton_amt or 0.0)
+    except (TypeError, ValueError):
+        t = 0.0
+    return max(1, min(MAX_STRENGTH, int(t // 2) + 1))
+
+
+class BuyAlertTemplates:
+    # icon name -> unicode fallback
+    ICONS = {
+        "swap": "🔁",
+        "wallet": "👤",
+        "txn": "🔗",
+        "pos": "⬆️",
+        "holders": "👥",
+        "mcap": "💸",
+        "liq": "🌊",
+        "pin": "📌",
+        "chart": "📊",
+        "trend": "🔥",
+        "pools": "🆕",
+    }
+
+    MASTER_HEAD = (
+        "{title}\n"
+        "{bar}\n"
+        "{ton_line}"
+        "{token_line}"
+        "{i_wallet} <a href='{buyer_url}'>{buyer_short}</a> | {i_txn} <a href='{tx_url}'>Txn</a>\n"
+        "{i_pos} Position: <b>{pos_txt}</b>\n"
+        "{holders_line}"
+    )
+    MASTER_DEX_FOOT = (
+        "{i_mcap} Market Cap <b>{mc_txt}</b>\n"
+        "{i_liq} Liquidity <b>{liq_txt}</b>\n\n"
+        "{i_pin} <a href='{listing_url}'>Ton Listing</a>\n"
+        "{i_chart} <a href='{chart_url}'>Chart</a> | "
+        "{i_trend} <a href='{trending_url}'>Trending</a> | "
+        "{i_pools} <a href='{pools_url}'>Pools</a>"
+        "{rank_line}"
+    )
+    MASTER_BLUM_FOOT = (
+        "\n{i_pin} <a href='{listing_url}'>Ton Listing</a>\n"
+        "{i_chart} <a href='{chart_url}'>Chart</a> | "
+        "{i_trend} <a href='{trending_url}'>Trending</a>"
+        "{rank_line}"
+    )
+    GROUP = (
+        "🚀 {sym} TOKEN Buy! — {dex_lbl}\n"
+        "✅ LISTED!\n\n"
+        "{bulbs}\n\n"
+        "💰 {ton_amt:.2f} TON ({usd_group})\n"
+        "📦 {token_amt:,.2f} {sym}\n"
+        "👤 {buyer_short} | {grp_pos}\n"
+        "💵 Price: ${price_txt}\n"
+        "🏦 MarketCap: ${mc_group}\n\n"
+        "❤️ <a href='{listing_url}'>TonListing</a> | 📊 <a href='{chart_url}'>Chart</a>"
+    )
+    BURST_MASTER = (
+        "{title}\n"
+        "{bar}\n"
+        "{i_swap} <b>{count} buys</b> | <b>{total_ton:.2f} TON</b>{usd_part}\n"
+        "{i_swap} <b>{total_tokens:,.2f} {sym}</b>\n"
+        "{i_wallet} Buyers <b>{buyers}</b> | New holders <b>{new_holders}</b>\n"
+        "{big_badge} Largest <b>{big_ton:.2f} TON</b> by <a href='{big_url}'>{big_short}</a> | "
+        "{i_txn} <a href='{big_tx_url}'>Txn</a>\n\n"
+        "{i_pin} <a href='{listing_url}'>Ton Listing</a>\n"
+        "{i_chart} <a href='{chart_url}'>Chart</a> | "
+        "{i_trend} <a href='{trending_url}'>Trending</a>"
+        "{rank_line}"
+    )
+    BURST_GROUP = (
+        "🔥 {sym} TOKEN Buy burst! — {dex_lbl}\n\n"
+        "💰 {count} buys | {total_ton:.2f} TON ({usd_group})\n"
+        "👥 {buyers} buyers | {new_holders} new\n"
+        "🐳 Largest: {big_ton:.2f} TON by {big_short}\n\n"
+        "❤️ <a href='{listing_url}'>TonListing</a> | 📊 <a href='{chart_url}'>Chart</a>"
+    )
+
+    def __init__(
+        self,
+        icon_ids: Mapping[str, str],
+        spy_icon_id: str,
+        listing_url: str,
+        trending_url: str,
+    ):
+        static: Dict[str, Any] = {f"i_{name}": emoji_tag(icon_ids.get(name, ""), fb) for name, fb in self.ICONS.items()}
+        static.update(listing_url=listing_url, trending_url=trending_url, bulbs="💡" * 10)
+        self.static = static
+        self.bars = strength_bars(emoji_tag(spy_icon_id, "🟢"))
+        self.i_swap = static["i_swap"]
+        self.i_holders = static["i_holders"]
+        self.rank_fmt = "\n\n🟢 <b>#{}</b> On <a href='" + _escape(trending_url) + "'>SpyTON Trending</a>"
+
+        self.master_dex = Template(self.MASTER_HEAD + self.MASTER_DEX_FOOT, **static)
+        self.master_blum = Template(self.MASTER_HEAD + self.MASTER_BLUM_FOOT, **static)
+        self.group = Template(self.GROUP, **static)
+        self.burst_master = Template(self.BURST_MASTER, **static)
+        self.burst_group = Template(self.BURST_GROUP, **static)
+
+    def bar(self, ton_amt: float) -> str:
+        return self.bars[strength_count(ton_amt)]
+
+    def rank_line(self, rank: Optional[int]) -> str:
+        return self.rank_fmt.format(rank) if rank else ""
+
+    @staticmethod
+    def title(core: str, tg_url: Optional[str]) -> str:
+        return f"<a href='{tg_url}'><b>{core}</b></a>" if tg_url else f"<b>{core}</b>"
+
+    def render_master(
+        self,
+        *,
+        sym: str,
+        badge: str,
+        lbl: str,
+        tg_url: Optional[str],
+        ton_amt: float,
+        usd_val: float,
+        token_amt: float,
+        buyer_url: str,
+        buyer_short: str,
+        tx_url: str,
+        pos_txt: str,
+        holders_count: Optional[int],
+        mc_txt: str,
+        liq_txt: str,
+        chart_url: str,
+        pools_url: str,
+        rank: Optional[int],
+        is_blum: bool,
+    ) -> str:
+        usd_part = f" (${usd_val:,.2f})" if usd_val else ""
+        fields = {
+            "title": self.title(f"{badge} {sym} Buy! — {lbl}" if lbl else f"{badge} {sym} Buy!", tg_url),
+            "bar": self.bar(ton_amt),
+            "ton_line": f"{self.i_swap} <b>{ton_amt:.2f} TON</b>{usd_part}\n" if ton_amt > 0 else "",
+            "token_line": f"{self.i_swap} <b>{token_amt:,.6f} {sym}</b>\n" if token_amt > 0 else "",
+            "buyer_url": buyer_url,
+            "buyer_short": buyer_short,
+            "tx_url": tx_url,
+            "pos_txt": pos_txt,
+            "holders_line": f"{self.i_holders} Holders <b>{holders_count}</b>\n" if isinstance(holders_count, int) else "",
+            "mc_txt": mc_txt,
+            "liq_txt": liq_txt,
+            "chart_url": chart_url,
+            "pools_url": pools_url,
+            "rank_line": self.rank_line(rank),
+        }
+        return (self.master_blum if is_blum else self.master_dex).render(fields)
+
+    def render_group(
+        self,
+        *,
+        sym: str,
+        dex_lbl: str,
+        ton_amt: float,
+        usd_val: float,
+        token_amt: float,
+        buyer_short: str,
+        pos_txt: str,
+        price_usd: Any,
+        mc_usd: Any,
+        chart_url: str,
+    ) -> str:
+        return self.group.render({
+            "sym": sym,
+            "dex_lbl": dex_lbl,
+            "ton_amt": ton_amt,
+            "usd_group": f"${usd_val:,.2f}" if usd_val else "$0",
+            "token_amt": token_amt,
+            "buyer_short": buyer_short,
+            "grp_pos": "New!" if "new" in (pos_txt or "").lower() else "Old!",
+            "price_txt": f"{price_usd:.6f}".rstrip("0").rstrip(".") if isinstance(price_usd, (int, float)) and price_usd > 0 else "—",
+            "mc_group": f"{mc_usd:,.0f}" if isinstance(mc_usd, (int, float)) and mc_usd > 0 else "—",
+            "chart_url": chart_url,
+        })
+
+    def render_burst(self, fields: Dict[str, Any], tg_url: Optional[str], rank: Optional[int]) -> Dict[str, str]:
+        """fields: sym, lbl, count, total_ton, usd_val, total_tokens, buyers,
+        new_holders, big_ton, big_badge, big_url, big_short, big_tx_url, chart_url."""
+        lbl = fields.get("lbl") or ""
+        usd_val = fields.get("usd_val") or 0.0
+        f = dict(fields)
+        f.update({
+            "title": self.title(f"🔥 {f['sym']} Buy burst! — {lbl}" if lbl else f"🔥 {f['sym']} Buy burst!", tg_url),
+            "bar": self.bar(f["total_ton"]),
+            "usd_part": f" (${usd_val:,.2f})" if usd_val else "",
+            "usd_group": f"${usd_val:,.2f}" if usd_val else "$0",
+            "dex_lbl": lbl or "DEX",
+            "rank_line": self.rank_line(rank),
+        })
+        return {"master": self.burst_master.render(f), "group": self.burst_group.render(f)}
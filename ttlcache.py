@@ -0,0 +1,164 @@
+"""Bounded in-memory caches for the detector.
+
+TTLCache is an LRU dict with a per-entry TTL:
+- get() only returns fresh entries and moves them to the most-recent end
+- set(..., negative=True) stores a "no data" result with its own (usually
+  different) TTL, so failed lookups are neither hammered nor kept forever
+- when full, the least recently used entry is evicted
+- hits / misses / evictions / expirations are counted for /status
+
+All methods are thread-safe (fetch helpers run in asyncio.to_thread workers).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float, negative_ttl: Optional[float] = None):
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self.negative_ttl = float(ttl if negative_ttl is None else negative_ttl)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value, negative)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.negative_hits = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value, negative = item
+            if expires_at <= now:
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            if negative:
+                self.negative_hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, negative: bool = False, ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            ttl = self.negative_ttl if negative else self.ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value, negative)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def purge(self) -> int:
+        """Drop expired entries now (get() also drops them lazily). Returns count."""
+        now = time.monotonic()
+        with self._lock:
+            dead = [k for k, (exp, _v, _n) in self._data.items() if exp <= now]
+            for k in dead:
+                del self._data[k]
+            self.expired += len(dead)
+        return len(dead)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_ratio": (self.hits / total) if total else 0.0,
+        }
+
+    def summary(self) -> str:
+        st = self.stats()
+        return (
+            f"{st['name']} {st['size']}/{st['maxsize']} "
+            f"hit {100.0 * st['hit_ratio']:.0f}% ev {st['evictions']}"
+        )
+
+
+class MissBackoff:
+    """Remembers "not found" lookups and spaces out rechecks exponentially.
+
+    After the n-th consecutive miss a key is rechecked no sooner than
+    min(maximum, base * factor ** (n - 1)) seconds later. clear() forgets
+    the key (e.g. when an admin edits the record or the lookup succeeds).
+    """
+
+    def __init__(self, name: str, base: float, maximum: float, factor: float = 2.0, maxsize: int = 10000):
+        self.name = name
+        self.base = float(base)
+        self.maximum = float(maximum)
+        self.factor = float(factor)
+        self.maxsize = max(1, int(maxsize))
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (misses, next_check_at)
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.misses = 0
+
+    def due(self, key: Hashable) -> bool:
+        """True if the lookup should run now (never missed, or backoff elapsed)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= time.monotonic():
+                return True
+            self.skipped += 1
+            return False
+
+    def miss(self, key: Hashable) -> float:
+        """Record a miss; returns seconds until the next recheck."""
+        with self._lock:
+            n = self._data.get(key, (0, 0.0))[0] + 1
+            wait = min(self.maximum, self.base * (self.factor ** min(n - 1, 64)))  # float pow overflows past ~1024
+            self._data[key] = (n, time.monotonic() + wait)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            self.misses += 1
+            return wait
+
+    def clear(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "tracked": len(self._data), "misses": self.misses, "skipped": self.skipped}
+
+    def summary(self) -> str:
+        return f"{self.name} {len(self._data)} remembered, {self.skipped} lookups skipped"
@@ -0,0 +1,244 @@
+"""Sliding-window buy volume and trend ranks, fed by the buys we detect.
+
+VolumeWindow keeps, per key (token symbol), a ring buffer of per-bucket
+(default: per-minute) TON and USD buy volume covering the last `window`
+seconds:
+- add() bumps the current bucket and the running totals in O(1) and
+  pushes the key's new score onto a max-heap, O(log n); superseded heap
+  entries are skipped when read and compacted away in bulk
+- buckets leaving the window are subtracted once, via a per-bucket index of
+  the keys that traded in it (no per-key scans when time advances)
+- the rank map of the top `top_k` keys is rebuilt (O(k log n)) only when an
+  update can change it: a ranked key moved, or another key reached the
+  k-th score. rank() is a dict read
+
+Ranking uses TON volume (always known); USD is tracked for display. An
+external window total (set_external(), e.g. DexScreener) raises a key's
+score to max(local, external), so local buys made after the external
+figure was taken are not counted twice.
+
+All methods are thread-safe (leaderboard code reads it from worker threads).
+"""
+
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+
+class _Series:
+    __slots__ = ("slot_bucket", "ton", "usd", "total_ton", "total_usd", "ext_ton")
+
+    def __init__(self, n: int):
+        self.slot_bucket: List[int] = [-1] * n
+        self.ton: List[float] = [0.0] * n
+        self.usd: List[float] = [0.0] * n
+        self.total_ton = 0.0
+        self.total_usd = 0.0
+        self.ext_ton = 0.0   # external window total (reconciliation), includes our own buys
+
+    def score(self) -> float:
+        # local + max(0, external - local): the external total already counts our buys
+        return max(self.total_ton, self.ext_ton)
+
+
+class VolumeWindow:
+    def __init__(self, window: float = 6 * 3600, bucket: float = 60, top_k: int = 100):
+        self.bucket = float(bucket)
+        self.window = float(window)
+        self.n = max(1, int(round(self.window / self.bucket)))
+        self.top_k = max(1, int(top_k))
+        self._series: Dict[Hashable, _Series] = {}
+        self._expiry: Dict[int, Set[Hashable]] = {}   # bucket -> keys with volume in it
+        self._heap: List[Tuple[float, str, Hashable]] = []  # (-score, str(key), key), stale entries included
+        self._scores: Dict[Hashable, float] = {}       # key -> current score (heap entries that differ are stale)
+        self._ranks: Dict[Hashable, int] = {}
+        self._kth = 0.0   # score of the top_k-th key at the last rank rebuild (0 with fewer keys)
+        self._ranks_dirty = False
+        self._cur = int(time.time() // self.bucket)
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.expired = 0
+
+    # ---------- internals (lock held) ----------
+    def _reposition(self, key: Hashable, s: Optional[_Series]) -> None:
+        self._scores.pop(key, None)
+        score = s.score() if s is not None else 0.0
+        if score > 1e-9:
+            self._scores[key] = score
+            heapq.heappush(self._heap, (-score, str(key), key))
+            if score >= self._kth:
+                self._ranks_dirty = True
+        elif s is not None and not s.ext_ton and all(b < 0 for b in s.slot_bucket):
+            self._series.pop(key, None)
+        if key in self._ranks:
+            self._ranks_dirty = True
+        if len(self._heap) > 2 * len(self._scores) + 64:
+            self._heap = [(-sc, str(k), k) for k, sc in self._scores.items()]
+            heapq.heapify(self._heap)
+
+    def _head(self, k: int) -> List[Tuple[float, str, Hashable]]:
+        """The k highest live heap entries, highest first; stale ones met on the way are dropped."""
+        out: List[Tuple[float, str, Hashable]] = []
+        taken: Set[Hashable] = set()
+        heap = self._heap
+        while heap and len(out) < k:
+            e = heapq.heappop(heap)
+            key = e[2]
+            if key in taken or self._scores.get(key) != -e[0]:
+                continue
+            taken.add(key)
+            out.append(e)
+        for e in out:
+            heapq.heappush(heap, e)
+        return out
+
+    def _advance(self, b: int) -> None:
+        if b <= self._cur:
+            return
+        cutoff = b - self.n  # buckets <= cutoff left the window
+        for old in [k for k in self._expiry if k <= cutoff]:
+            slot = old % self.n
+            for key in self._expiry.pop(old):
+                s = self._series.get(key)
+                if s is None or s.slot_bucket[slot] != old:
+                    continue
+                s.total_ton = max(0.0, s.total_ton - s.ton[slot])
+                s.total_usd = max(0.0, s.total_usd - s.usd[slot])
+                s.ton[slot] = 0.0
+                s.usd[slot] = 0.0
+                s.slot_bucket[slot] = -1
+                self.expired += 1
+                self._reposition(key, s)
+        self._cur = b
+
+    def _rebuild_ranks(self) -> None:
+        head = self._head(self.top_k)
+        self._ranks = {e[2]: i + 1 for i, e in enumerate(head)}
+        self._kth = -head[-1][0] if len(head) >= self.top_k else 0.0
+        self._ranks_dirty = False
+
+    # ---------- public ----------
+    def add(self, key: Hashable, ton: float, usd: float = 0.0, ts: Optional[float] = None) -> None:
+        now = time.time()
+        ts = now if ts is None else min(float(ts), now)
+        b = int(ts // self.bucket)
+        with self._lock:
+            self._advance(int(now // self.bucket))
+            if b <= self._cur - self.n:
+                return  # older than the window
+            s = self._series.get(key)
+            if s is None:
+                s = _Series(self.n)
+                self._series[key] = s
+            slot = b % self.n
+            if s.slot_bucket[slot] != b:
+                # stale slot (not expired through the index yet): drop it first
+                s.total_ton = max(0.0, s.total_ton - s.ton[slot])
+                s.total_usd = max(0.0, s.total_usd - s.usd[slot])
+                s.ton[slot] = 0.0
+                s.usd[slot] = 0.0
+                s.slot_bucket[slot] = b
+                self._expiry.setdefault(b, set()).add(key)
+            ton = max(0.0, float(ton or 0.0))
+            usd = max(0.0, float(usd or 0.0))
+            s.ton[slot] += ton
+            s.usd[slot] += usd
+            s.total_ton += ton
+            s.total_usd += usd
+            self.updates += 1
+            self._reposition(key, s)
+
+    def set_external(self, key: Hashable, ton: float) -> None:
+        """External TON volume over the window (e.g. DexScreener), our buys included;
+        ranking uses whichever of it and the local volume is higher."""
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                if not ton or ton <= 0:
+                    return
+                s = _Series(self.n)
+                self._series[key] = s
+            s.ext_ton = max(0.0, float(ton or 0.0))
+            self._reposition(key, s)
+
+    def rank(self, key: Hashable) -> Optional[int]:
+        with self._lock:
+            self._advance(int(time.time() // self.bucket))
+            if self._ranks_dirty:
+                self._rebuild_ranks()
+            return self._ranks.get(key)
+
+    def ranks(self) -> Dict[Hashable, int]:
+        with self._lock:
+            self._advance(int(time.time() // self.bucket))
+            if self._ranks_dirty:
+                self._rebuild_ranks()
+            return dict(self._ranks)
+
+    def top(self, k: Optional[int] = None) -> List[Tuple[Hashable, float, float]]:
+        """[(key, ton, usd)] by window volume, highest first."""
+        with self._lock:
+            self._advance(int(time.time() // self.bucket))
+            out = []
+            for _neg, _sk, key in self._head(k or self.top_k):
+                s = self._series[key]
+                out.append((key, s.total_ton, s.total_usd))
+            return out
+
+    def volume(self, key: Hashable) -> Tuple[float, float]:
+        """(ton, usd) bought in the window, local buys only."""
+        with self._lock:
+            self._advance(int(time.time() // self.bucket))
+            s = self._series.get(key)
+            return (s.total_ton, s.total_usd) if s else (0.0, 0.0)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    # ---------- persistence ----------
+    def dump(self) -> Dict[str, Any]:
+        """JSON-able snapshot: {"bucket": sec, "series": {key: [[bucket, ton, usd], ...]}}."""
+        with self._lock:
+            self._advance(int(time.time() // self.bucket))
+            series: Dict[str, List[List[float]]] = {}
+            for key, s in self._series.items():
+                rows = [[b, s.ton[i], s.usd[i]] for i, b in enumerate(s.slot_bucket) if b >= 0]
+                if rows:
+                    series[str(key)] = rows
+            return {"bucket": self.bucket, "series": series}
+
+    def load(self, snap: Dict[str, Any]) -> int:
+        """Restore a dump() (same bucket size only). Returns buckets restored."""
+        if not isinstance(snap, dict) or float(snap.get("bucket") or 0) != self.bucket:
+            return 0
+        series = snap.get("series")
+        if not isinstance(series, dict):
+            return 0
+        n = 0
+        for key, rows in series.items():
+            if not isinstance(rows, list):
+                continue
+            for row in rows:
+                try:
+                    b, ton, usd = int(row[0]), float(row[1]), float(row[2])
+                except (TypeError, ValueError, IndexError):
+                    continue
+                self.add(key, ton, usd, ts=b * self.bucket)
+                n += 1
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._scores),
+            "updates": self.updates,
+            "expired": self.expired,
+            "window_s": self.window,
+            "bucket_s": self.bucket,
+        }
+
+    def summary(self) -> str:
+        st = self.stats()
+        return f"{st['keys']} ranked, {st['updates']} buys in, window {st['window_s'] / 3600:.0f}h"